@@ -3,7 +3,8 @@ AI Pictionary - FastAPI Backend
 Main application entry point with TensorFlow model serving
 """
 
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import tensorflow as tf
@@ -18,6 +19,15 @@ import firebase_admin
 from firebase_admin import credentials, auth
 from middleware.rate_limit import RateLimitMiddleware
 from routers import admin, games
+from services.drawing_buffer import drawing_buffer
+from services.drawing_codec import DRAWING_FORMAT, canvas_to_bytes
+from services.game_cache import game_cache
+from services.game_engine import game_engine, GameOwnedElsewhere
+from services.lobby_directory import lobby_directory
+from services.presence_service import heartbeat_batcher, presence_tracker
+from services.scheduler import scheduler
+from services.round_deadlines import round_deadlines
+from services.retrain_jobs import retrain_jobs
 from config import CATEGORIES, MODEL_VERSION
 
 # Load environment variables
@@ -153,6 +163,105 @@ async def load_model():
         print(f"❌ Error loading model: {e}")
 
 
+@app.on_event("startup")
+async def start_drawing_buffer():
+    """Start the write-behind buffer that batches active learning drawings"""
+    drawing_buffer.start()
+
+
+@app.on_event("shutdown")
+async def stop_drawing_buffer():
+    """Flush queued drawings (or spill them to disk) before exiting"""
+    await drawing_buffer.stop()
+
+
+@app.on_event("shutdown")
+async def stop_game_cache():
+    """Tear down the game document and lobby snapshot listeners"""
+    game_cache.clear()
+    lobby_directory.stop()
+
+
+@app.on_event("startup")
+async def start_game_engine():
+    """Start the in-memory game engine checkpoint timer (GAME_ENGINE=memory)"""
+    game_engine.start()
+
+
+@app.on_event("shutdown")
+async def stop_game_engine():
+    """Checkpoint every live game to Firestore before exiting"""
+    await game_engine.stop()
+
+
+@app.on_event("startup")
+async def start_heartbeat_batcher():
+    """Start the batched heartbeat flusher and the presence timeout tracker"""
+    heartbeat_batcher.start()
+    presence_tracker.start()
+
+
+@app.on_event("shutdown")
+async def stop_heartbeat_batcher():
+    """Write the last pending heartbeats to RTDB"""
+    await presence_tracker.stop()
+    await heartbeat_batcher.stop()
+
+
+@app.on_event("startup")
+async def start_scheduler():
+    """Start the lifecycle sweeps (run only by the lease-holding instance)"""
+    scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    """Stop the sweeps and hand the leader lease over"""
+    await scheduler.stop()
+
+
+@app.on_event("startup")
+async def start_round_deadlines():
+    """Schedule the end of the current round of every playing game"""
+    round_deadlines.start()
+    try:
+        await round_deadlines.rehydrate()
+    except Exception as e:
+        print(f"⚠️  Could not restore round deadlines: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_round_deadlines():
+    """Stop the deadline timer (rounds are restored by the next startup)"""
+    await round_deadlines.stop()
+
+
+@app.on_event("startup")
+async def fail_orphaned_retrain_jobs():
+    """Jobs left running by a crashed instance would report running forever"""
+    try:
+        orphaned = await retrain_jobs.mark_orphaned()
+        if orphaned:
+            print(f"⚠️  Marked {orphaned} orphaned retraining job(s) as failed")
+    except Exception as e:
+        print(f"⚠️  Could not check for orphaned retraining jobs: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_retrain_jobs():
+    """Kill a running retraining process rather than leave it orphaned"""
+    await retrain_jobs.stop()
+
+
+@app.exception_handler(GameOwnedElsewhere)
+async def redirect_to_game_owner(request: Request, exc: GameOwnedElsewhere):
+    """Send game actions to the instance that owns the game (307 keeps the body)"""
+    url = exc.owner_url + request.url.path
+    if request.url.query:
+        url += "?" + request.url.query
+    return RedirectResponse(url, status_code=307)
+
+
 def preprocess_canvas_image(base64_image: str) -> np.ndarray:
     """
     Preprocess Canvas image for CNN inference
@@ -410,46 +519,6 @@ class SaveDrawingResponse(BaseModel):
     message: str
 
 
-def resize_to_28x28(base64_image: str) -> str:
-    """
-    Resize image to 28x28 (Quick Draw format) for training.
-
-    Args:
-        base64_image: Base64 encoded image
-
-    Returns:
-        Base64 encoded 28x28 grayscale image (inverted colors)
-    """
-    try:
-        # Remove data URL prefix if present
-        if "," in base64_image:
-            base64_image = base64_image.split(",")[1]
-
-        # Decode base64
-        image_bytes = base64.b64decode(base64_image)
-        image = Image.open(BytesIO(image_bytes))
-
-        # Convert to grayscale
-        image = image.convert("L")
-
-        # Resize to 28x28
-        image = image.resize((28, 28), Image.LANCZOS)
-
-        # Invert colors (Canvas: white bg → Dataset: black bg)
-        img_array = np.array(image)
-        img_array = 255 - img_array
-        image = Image.fromarray(img_array.astype(np.uint8))
-
-        # Convert back to base64
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-    except Exception as e:
-        print(f"Error resizing image: {e}")
-        return None
-
-
 @app.post("/drawings/save", response_model=SaveDrawingResponse)
 async def save_drawing_for_training(request: SaveDrawingRequest):
     """
@@ -465,13 +534,14 @@ async def save_drawing_for_training(request: SaveDrawingRequest):
 
     **No authentication required** to maximize data collection.
     Rate limiting is applied at middleware level.
-    """
-    from services.firestore_service import FirestoreService
 
+    The drawing is queued in the write-behind buffer and written to Firestore
+    in a batch a few seconds later; the returned ID is final.
+    """
     try:
-        # Resize to 28x28
-        resized_image = resize_to_28x28(request.image_data)
-        if not resized_image:
+        # Resize to 28x28 raw bytes
+        image_bytes = canvas_to_bytes(request.image_data)
+        if not image_bytes:
             raise HTTPException(status_code=400, detail="Failed to process image")
 
         # Determine if AI was correct
@@ -481,7 +551,8 @@ async def save_drawing_for_training(request: SaveDrawingRequest):
         )
 
         drawing_doc = {
-            "imageBase64": resized_image,
+            "imageBytes": image_bytes,
+            "imageFormat": DRAWING_FORMAT,
             "targetCategory": request.target_category.lower(),
             "aiPrediction": request.ai_prediction.lower(),
             "aiConfidence": request.ai_confidence,
@@ -491,8 +562,7 @@ async def save_drawing_for_training(request: SaveDrawingRequest):
             "userId": request.user_id,
         }
 
-        firestore_svc = FirestoreService()
-        doc_id = await firestore_svc.save_user_drawing(drawing_doc)
+        doc_id = drawing_buffer.enqueue(drawing_doc)
 
         return SaveDrawingResponse(
             status="success",
@@ -67,6 +67,19 @@ class MetricsCollector:
             "corrections": {"total": 0, "by_category": {}},
             "games": {"created": 0, "completed": 0, "active": 0},
             "retraining": {"triggered": 0, "success": 0, "failures": 0},
+            # Per action: bytes actually written vs. a full document rewrite
+            "game_writes": {},
+            # Guessing game canvas sync (stroke deltas vs. full canvases)
+            "canvas": {
+                "rounds": 0,
+                "strokes": 0,
+                "stroke_bytes": 0,
+                "canvas_updates": 0,
+                "canvas_bytes": 0,
+                "broadcast_bytes": 0,
+                "snapshot_bytes": 0,
+                "snapshot_failures": 0,
+            },
         }
 
     def record_prediction(
@@ -116,6 +129,40 @@ class MetricsCollector:
         else:
             self.metrics["retraining"]["failures"] += 1
 
+    def record_game_write(
+        self, action: str, bytes_written: int, full_document_bytes: int
+    ):
+        """Record the size of a game update next to a full-document rewrite"""
+        stats = self.metrics["game_writes"].setdefault(
+            action, {"count": 0, "bytes_written": 0, "full_rewrite_bytes": 0}
+        )
+        stats["count"] += 1
+        stats["bytes_written"] += bytes_written
+        stats["full_rewrite_bytes"] += full_document_bytes
+
+    def record_canvas_round(
+        self,
+        strokes: int,
+        stroke_bytes: int,
+        canvas_updates: int,
+        canvas_bytes: int,
+        broadcast_bytes: int,
+        snapshot_bytes: int,
+    ):
+        """Record the canvas traffic of one finished guessing round"""
+        canvas = self.metrics["canvas"]
+        canvas["rounds"] += 1
+        canvas["strokes"] += strokes
+        canvas["stroke_bytes"] += stroke_bytes
+        canvas["canvas_updates"] += canvas_updates
+        canvas["canvas_bytes"] += canvas_bytes
+        canvas["broadcast_bytes"] += broadcast_bytes
+        canvas["snapshot_bytes"] += snapshot_bytes
+
+    def record_canvas_snapshot_failure(self):
+        """Record a round whose canvas snapshot could not be stored"""
+        self.metrics["canvas"]["snapshot_failures"] += 1
+
     def get_metrics(self) -> Dict[str, Any]:
         """Get current metrics snapshot"""
         metrics = self.metrics.copy()
@@ -154,6 +201,20 @@ class MetricsCollector:
             f"{metrics['games']['active']} active, "
             f"{metrics['games']['completed']} completed"
         )
+        for action, stats in metrics["game_writes"].items():
+            logger.info(
+                f"Game writes [{action}]: {stats['count']} writes, "
+                f"{stats['bytes_written'] / stats['count']:.0f} B/write "
+                f"(full rewrite: {stats['full_rewrite_bytes'] / stats['count']:.0f} B)"
+            )
+        canvas = metrics["canvas"]
+        if canvas["rounds"]:
+            logger.info(
+                f"Canvas: {canvas['rounds']} rounds, {canvas['strokes']} strokes "
+                f"({canvas['stroke_bytes']} B in, {canvas['broadcast_bytes']} B pushed), "
+                f"{canvas['rounds']} Firestore writes ({canvas['snapshot_bytes']} B); "
+                f"{canvas['canvas_updates']} legacy full canvases ({canvas['canvas_bytes']} B)"
+            )
         logger.info(
             f"Retraining: {metrics['retraining']['triggered']} triggered, "
             f"{metrics['retraining']['success']} success, "
@@ -3,13 +3,13 @@ Admin routes for AI Pictionary
 Handles model retraining triggers and administrative tasks
 """
 
-from fastapi import APIRouter, HTTPException, Header, BackgroundTasks, Depends
+from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
-import subprocess
+from typing import Dict, Optional
+import json
 import os
 import logging
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -23,10 +23,22 @@ class RetrainResponse(BaseModel):
     job_id: Optional[str] = None
 
 
+class RetrainRequest(BaseModel):
+    min_drawings: Optional[int] = None
+    epochs: Optional[int] = None
+    force: bool = False
+
+
 class RetrainStatus(BaseModel):
     job_id: str
     status: str
-    progress: Optional[str] = None
+    phase: Optional[str] = None
+    progress: float = 0.0
+    metrics: Dict = {}
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
 
 
 def verify_admin_token(authorization: str = Header(None)) -> bool:
@@ -61,47 +73,10 @@ def verify_admin_token(authorization: str = Header(None)) -> bool:
     return True
 
 
-def trigger_retraining_pipeline():
-    """
-    Execute the ML retraining pipeline script
-    This runs as a background task to avoid request timeout
-    """
-    try:
-        script_path = os.getenv(
-            "RETRAIN_SCRIPT_PATH", "/app/ml-training/scripts/retrain_pipeline.py"
-        )
-
-        # Fallback for local development
-        if not os.path.exists(script_path):
-            script_path = "./ml-training/scripts/retrain_pipeline.py"
-
-        if not os.path.exists(script_path):
-            logger.error(f"Retraining script not found at {script_path}")
-            return
-
-        # Run the pipeline script
-        logger.info(f"Starting retraining pipeline: {script_path}")
-        result = subprocess.run(
-            ["python3", script_path],
-            capture_output=True,
-            text=True,
-            timeout=3600,  # 1 hour timeout
-        )
-
-        if result.returncode == 0:
-            logger.info(f"Retraining pipeline completed successfully:\n{result.stdout}")
-        else:
-            logger.error(f"Retraining pipeline failed:\n{result.stderr}")
-
-    except subprocess.TimeoutExpired:
-        logger.error("Retraining pipeline timed out after 1 hour")
-    except Exception as e:
-        logger.error(f"Error running retraining pipeline: {e}")
-
-
 @router.post("/retrain", response_model=RetrainResponse)
 async def trigger_retrain(
-    background_tasks: BackgroundTasks, authorized: bool = Depends(verify_admin_token)
+    request: Optional[RetrainRequest] = None,
+    authorized: bool = Depends(verify_admin_token),
 ):
     """
     Trigger the ML model retraining pipeline
@@ -110,28 +85,32 @@ async def trigger_retrain(
     **Usage**: POST /admin/retrain with "Bearer <ADMIN_API_KEY>" header
     **Process**:
     1. Validates admin token
-    2. Triggers background task to run retrain_pipeline.py
-    3. Returns immediately with job ID
+    2. Starts retrain_pipeline.py in a supervised process (retrain_jobs)
+    3. Returns immediately with job ID (409 if a run is already in progress)
 
     This endpoint is designed to be called by:
     - Cloud Scheduler (automated weekly retraining)
     - Manual admin triggers
     - CI/CD pipelines for model updates
     """
+    from services.retrain_jobs import RetrainJobConflict, retrain_jobs
 
-    # Generate job ID for tracking
-    job_id = f"retrain_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+    options = (request or RetrainRequest()).dict(exclude_none=True)
 
-    # Add retraining to background tasks
-    background_tasks.add_task(trigger_retraining_pipeline)
+    try:
+        job = await retrain_jobs.start(options)
+    except RetrainJobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
-    logger.info(f"Retraining job triggered: {job_id}")
+    logger.info(f"Retraining job triggered: {job.job_id}")
 
     return RetrainResponse(
         status="triggered",
-        message="Model retraining pipeline started in background",
-        triggered_at=datetime.utcnow().isoformat(),
-        job_id=job_id,
+        message="Model retraining pipeline started in a background process",
+        triggered_at=job.created_at,
+        job_id=job.job_id,
     )
 
 
@@ -142,16 +121,51 @@ async def get_retrain_status(
     """
     Get status of a retraining job
 
-    **Note**: In production, this should query a job tracking system
-    (e.g., Firestore, Redis) to get real-time status
+    **Returns**: Status (queued, running, completed, skipped, failed), current
+    pipeline phase, progress (0-1) and metrics reported so far, as stored in
+    retrain_jobs/{job_id}
     """
+    from services.retrain_jobs import retrain_jobs
 
-    # TODO: Implement job status tracking with Firestore
-    # For now, return a placeholder response
-    return RetrainStatus(
-        job_id=job_id,
-        status="running",
-        progress="Check server logs for detailed progress",
+    job = await retrain_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Retraining job not found")
+
+    return RetrainStatus(**job)
+
+
+@router.get("/retrain/stream/{job_id}")
+async def stream_retrain_progress(
+    job_id: str, authorized: bool = Depends(verify_admin_token)
+):
+    """
+    Follow a retraining job with Server-Sent Events
+
+    Events: "log" (pipeline output line), "progress" (job state) and a final
+    "done". A job that already finished, or runs on another instance, sends
+    its stored state as a single "done" event.
+    """
+    from services.retrain_jobs import retrain_jobs
+
+    job = await retrain_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Retraining job not found")
+
+    def sse(event: Dict) -> str:
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    async def stream():
+        live = False
+        async for event in retrain_jobs.stream(job_id):
+            live = True
+            yield sse(event)
+        if not live:
+            yield sse({"type": "done", **job})
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -160,14 +174,12 @@ async def admin_health():
     """
     Admin health check endpoint (no auth required)
     """
+    from services.retrain_jobs import find_retrain_script
+
     return {
         "status": "healthy",
         "admin_api_configured": bool(os.getenv("ADMIN_API_KEY")),
-        "retrain_script_exists": os.path.exists(
-            os.getenv(
-                "RETRAIN_SCRIPT_PATH", "./ml-training/scripts/retrain_pipeline.py"
-            )
-        ),
+        "retrain_script_exists": find_retrain_script() is not None,
     }
 
 
@@ -182,7 +194,7 @@ async def cleanup_abandoned_games(
     Clean up games that have been waiting/abandoned for too long
 
     **Security**: Requires admin API key
-    **Usage**: Called by Cloud Scheduler or manually
+    **Usage**: Run periodically by the background scheduler, or manually
 
     Args:
         max_age_minutes: Games older than this will be deleted (default: 30)
@@ -198,6 +210,27 @@ async def cleanup_abandoned_games(
     return result
 
 
+@router.get("/scheduler/status")
+async def scheduler_status(authorized: bool = Depends(verify_admin_token)):
+    """
+    State of the background lifecycle scheduler
+
+    **Security**: Requires admin API key
+    **Returns**: Leadership, per-job duration and item counts, and the
+    server-side round deadline counters
+    """
+    from services.round_deadlines import round_deadlines
+    from services.scheduler import scheduler
+
+    return {
+        **scheduler.status(),
+        "round_deadlines": {
+            **round_deadlines.stats,
+            "pending": round_deadlines.pending,
+        },
+    }
+
+
 @router.post("/cleanup/sync-presence/{game_id}")
 async def sync_presence_to_firestore(
     game_id: str, authorized: bool = Depends(verify_admin_token)
@@ -227,32 +260,24 @@ async def delete_game(game_id: str, authorized: bool = Depends(verify_admin_toke
     **Use case**: Manual cleanup of problematic games
     """
     from firebase_admin import firestore as fb_firestore
-    from services.presence_service import PresenceService
+    from services.bulk_cleanup import bulk_cleanup
 
     try:
         db = fb_firestore.client()
 
-        # Delete game document
-        game_ref = db.collection("games").document(game_id)
-        game_ref.delete()
-
-        # Delete chat subcollection
-        chat_docs = db.collection("games").document(game_id).collection("chat").stream()
-        for doc in chat_docs:
-            doc.reference.delete()
-
-        # Delete turns subcollection
-        turns_docs = (
-            db.collection("games").document(game_id).collection("turns").stream()
+        # Room code is needed to free it along with the game
+        game_doc = db.collection("games").document(game_id).get(["room_code"])
+        room_code = (
+            (game_doc.to_dict() or {}).get("room_code") if game_doc.exists else None
         )
-        for doc in turns_docs:
-            doc.reference.delete()
 
-        # Clean up RTDB presence
-        await PresenceService.cleanup_game_presence(game_id)
+        # Game, chat and turns subcollections, room code and RTDB presence
+        stats = await bulk_cleanup.delete_games(
+            [{"id": game_id, "room_code": room_code}], reason="admin"
+        )
 
         logger.info(f"Game {game_id} force deleted by admin")
-        return {"status": "deleted", "game_id": game_id}
+        return {"status": "deleted", "game_id": game_id, "stats": stats}
 
     except Exception as e:
         logger.error(f"Error deleting game: {e}")
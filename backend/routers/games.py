@@ -3,18 +3,43 @@ Multiplayer Game Routes for AI Pictionary
 Handles Race Mode and Guessing Game (Humans vs AI)
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Depends,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 from datetime import datetime
-from services.firestore_service import FirestoreService
+from services.firestore_service import FirestoreService, MAX_PAGE_SIZE
 from services.presence_service import PresenceService, GameCleanupService
+from services.drawing_buffer import drawing_buffer
+from services.drawing_codec import DRAWING_FORMAT, canvas_to_bytes
+from services.game_cache import game_cache
+from services.game_engine import game_engine, GameOwnedElsewhere
+from services.game_events import game_events, encode, RESYNC
+from services.canvas_sync import canvas_sync
+from services.category_deck import new_deck
+from services.lobby_directory import lobby_directory
+from services.round_deadlines import round_deadlines
+from services.game_transitions import (
+    GameUpdate,
+    advance_round,
+    ai_reached_threshold,
+    award_race_round,
+    award_team_round,
+    changed_values,
+    record_ai_prediction,
+    record_round_winner,
+    start_round,
+)
 from firebase_admin import firestore
-import random
-import base64
-from io import BytesIO
-from PIL import Image
-import numpy as np
+import asyncio
+import json
 
 # Import categories from config module (loaded dynamically from model metadata)
 from config import CATEGORIES, MODEL_VERSION
@@ -22,54 +47,99 @@ from config import CATEGORIES, MODEL_VERSION
 router = APIRouter(prefix="/games", tags=["multiplayer"])
 firestore_service = FirestoreService()
 
+# Turn documents above this size keep their strokes in Storage (limit: 1 MiB)
+MAX_TURN_DOCUMENT_BYTES = 900 * 1024
 
-# Helper function to generate room codes
-def generate_room_code():
-    """Generate a 4-character room code (uppercase letters and numbers)"""
-    import string
 
-    chars = string.ascii_uppercase + string.digits
-    return "".join(random.choice(chars) for _ in range(4))
+async def load_game(game_id: str) -> Optional[Dict]:
+    """Current game state: from the in-memory engine or the game cache"""
+    if game_engine.enabled:
+        return await game_engine.get_game(game_id)
+    return await game_cache.get_game(game_id)
 
 
-def resize_drawing_to_28x28(base64_image: str) -> str:
+async def apply_game_action(game_id: str, transition, action: str):
     """
-    Resize a drawing to 28x28 pixels (Quick Draw format) and return as base64.
+    Apply a game transition on the configured store
 
-    Args:
-        base64_image: Base64 encoded image (with or without data URL prefix)
-
-    Returns:
-        Base64 encoded 28x28 grayscale image
+    With GAME_ENGINE=memory the owning in-memory actor applies it, otherwise
+    it runs as a Firestore transaction (see run_game_transaction). Once
+    applied, the changed fields are pushed to the game's subscribers.
     """
-    try:
-        # Remove data URL prefix if present
-        if "," in base64_image:
-            base64_image = base64_image.split(",")[1]
+    applied = {}
+
+    def observed(game):
+        fields, result = transition(game)
+        applied["changes"] = changed_values(game, fields) if fields else {}
+        applied["room_code"] = game.get("room_code")
+        applied["game_type"] = game.get("game_type")
+        applied["round_duration"] = game.get("settings", {}).get("round_duration", 60)
+        return fields, result
+
+    if game_engine.enabled:
+        result = await game_engine.run(game_id, observed, action=action)
+    else:
+        result = await firestore_service.run_game_transaction(
+            game_id, observed, action=action
+        )
 
-        # Decode base64
-        image_bytes = base64.b64decode(base64_image)
-        image = Image.open(BytesIO(image_bytes))
+    changes = applied.get("changes") or {}
+    game_events.publish_changes(game_id, action, changes)
+
+    lobby_directory.apply_changes(game_id, changes)
+    if changes.get(("status",), "waiting") != "waiting":
+        # Started games leave the lobby list and free their room code
+        await lobby_directory.close(game_id, applied.get("room_code"))
+
+    if changes.get(("status",)) == "finished":
+        round_deadlines.cancel(game_id)
+    elif ("current_round",) in changes:
+        # New round: the server ends it if no client does
+        round_deadlines.schedule(
+            game_id,
+            applied["game_type"],
+            changes[("current_round",)],
+            applied["round_duration"],
+        )
 
-        # Convert to grayscale
-        image = image.convert("L")
+    if applied.get("game_type") == "guessing" and (
+        ("current_round",) in changes or ("status",) in changes
+    ):
+        # Only guessing rounds have a drawer's canvas to store
+        await save_canvas_snapshot(game_id)
 
-        # Resize to 28x28 with high quality
-        image = image.resize((28, 28), Image.LANCZOS)
+    return result
 
-        # Invert colors (Canvas: white bg, black strokes → Dataset: black bg, white strokes)
-        img_array = np.array(image)
-        img_array = 255 - img_array
-        image = Image.fromarray(img_array.astype(np.uint8))
 
-        # Convert back to base64
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+async def save_canvas_snapshot(game_id: str) -> None:
+    """
+    Store the compacted canvas of a finished guessing round (one write)
 
+    Firestore documents are capped at 1 MiB: a larger round keeps its
+    strokes in Storage and the turn document only points to them.
+    """
+    from monitoring import metrics_collector
+
+    turn = await canvas_sync.end_round(game_id)
+    if turn is None:
+        return
+    try:
+        if len(json.dumps(turn, default=str)) > MAX_TURN_DOCUMENT_BYTES:
+            from services.storage_service import StorageService
+
+            drawing = {
+                key: turn.pop(key) for key in ("strokes", "canvas_state") if key in turn
+            }
+            turn["strokes_path"] = await StorageService.upload_bytes(
+                f"turns/{game_id}/round_{turn['round']}.json",
+                json.dumps(drawing, separators=(",", ":")).encode(),
+                "application/json",
+            )
+        await firestore_service.add_game_turn(game_id, turn)
     except Exception as e:
-        print(f"Error resizing drawing: {e}")
-        return None
+        # The round is already over for the players; keep the loss visible
+        metrics_collector.record_canvas_snapshot_failure()
+        print(f"❌ Error saving canvas snapshot for game {game_id}: {e}")
 
 
 async def save_drawing_for_training(
@@ -81,7 +151,7 @@ async def save_drawing_for_training(
     user_id: str = None,
 ):
     """
-    Save a drawing to Firestore for active learning.
+    Queue a drawing for active learning (batched Firestore write).
 
     Args:
         drawing_data: Base64 encoded image (will be resized to 28x28)
@@ -92,9 +162,9 @@ async def save_drawing_for_training(
         user_id: Optional user identifier
     """
     try:
-        # Resize to 28x28
-        resized_image = resize_drawing_to_28x28(drawing_data)
-        if not resized_image:
+        # Resize to 28x28 raw bytes
+        image_bytes = canvas_to_bytes(drawing_data)
+        if not image_bytes:
             print("Failed to resize drawing, skipping save")
             return None
 
@@ -104,7 +174,8 @@ async def save_drawing_for_training(
         )
 
         drawing_doc = {
-            "imageBase64": resized_image,
+            "imageBytes": image_bytes,
+            "imageFormat": DRAWING_FORMAT,
             "targetCategory": target_category.lower(),
             "aiPrediction": ai_prediction.lower(),
             "aiConfidence": ai_confidence,
@@ -114,8 +185,8 @@ async def save_drawing_for_training(
             "userId": user_id or "anonymous",
         }
 
-        doc_id = await firestore_service.save_user_drawing(drawing_doc)
-        print(f"✅ Drawing saved for training: {doc_id} (category: {target_category})")
+        doc_id = drawing_buffer.enqueue(drawing_doc)
+        print(f"✅ Drawing queued for training: {doc_id} (category: {target_category})")
         return doc_id
 
     except Exception as e:
@@ -144,6 +215,12 @@ class StartGameRequest(BaseModel):
     game_id: str
 
 
+class TimeoutRequest(BaseModel):
+    game_id: str
+    # Round the caller saw expire; a round that already ended is left alone
+    round_number: Optional[int] = None
+
+
 class SubmitDrawingRequest(BaseModel):
     game_id: str
     player_id: str
@@ -155,6 +232,7 @@ class SubmitDrawingRequest(BaseModel):
 
 class GameResponse(BaseModel):
     game_id: str
+    room_code: Optional[str] = None
     game_type: str
     status: str
     players: List[Dict]
@@ -189,13 +267,14 @@ async def create_race_game(request: CreateGameRequest):
         "max_rounds": 5,
         "round_duration": 60,  # seconds
         "target_confidence": 0.85,
-        "categories": CATEGORIES,  # Use all 345 categories from model metadata
+        # "categories" only when custom; the model's classes otherwise
     }
 
     settings = {**default_settings, **(request.settings or {})}
 
-    # Generate room code
-    room_code = generate_room_code()
+    # Reserve a unique room code for the new game
+    game_id = firestore_service.new_game_id()
+    room_code = await lobby_directory.reserve_room_code(game_id, "race")
 
     # Create game in Firestore
     game_data = {
@@ -221,10 +300,17 @@ async def create_race_game(request: CreateGameRequest):
         "current_category": None,
         "round_start_time": None,
         "round_submissions": {},  # Track best confidence per player for current round
-        "used_categories": [],  # Track categories already used to prevent repetition
+        # Shuffled category order: {seed, cursor, size} (no repeats until exhausted)
+        "category_deck": new_deck(len(settings.get("categories") or CATEGORIES)),
     }
 
-    game_id = await firestore_service.create_game(game_data)
+    try:
+        await firestore_service.create_game(game_data, game_id=game_id)
+    except Exception:
+        # No game behind the code: free it for the next lobby
+        await lobby_directory.release_room_code(room_code)
+        raise
+    lobby_directory.add(game_id, game_data)
 
     return {
         "game_id": game_id,
@@ -244,35 +330,35 @@ async def join_race_game(request: JoinGameRequest):
     Join an existing Race Mode lobby
     """
 
-    # Get game from Firestore
-    game = await firestore_service.get_game(request.game_id)
-
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
+    def join(game):
+        if not game:
+            raise HTTPException(status_code=404, detail="Game not found")
 
-    if game["status"] != "waiting":
-        raise HTTPException(status_code=400, detail="Game already started")
+        if game["status"] != "waiting":
+            raise HTTPException(status_code=400, detail="Game already started")
 
-    if len(game["players"]) >= game["max_players"]:
-        raise HTTPException(status_code=400, detail="Game is full")
+        if len(game["players"]) >= game["max_players"]:
+            raise HTTPException(status_code=400, detail="Game is full")
 
-    # Check if player already in game
-    if any(p["player_id"] == request.player_id for p in game["players"]):
-        raise HTTPException(status_code=400, detail="Already in this game")
-
-    # Add player
-    new_player = {
-        "player_id": request.player_id,
-        "player_name": request.player_name,
-        "ready": False,
-        "score": 0,
-        "rounds_won": 0,
-    }
+        # Check if player already in game
+        if any(p["player_id"] == request.player_id for p in game["players"]):
+            raise HTTPException(status_code=400, detail="Already in this game")
 
-    game["players"].append(new_player)
+        # Add player
+        update = GameUpdate(game)
+        update.append(
+            "players",
+            {
+                "player_id": request.player_id,
+                "player_name": request.player_name,
+                "ready": False,
+                "score": 0,
+                "rounds_won": 0,
+            },
+        )
+        return update.fields, game
 
-    # Update Firestore
-    await firestore_service.update_game(request.game_id, {"players": game["players"]})
+    game = await apply_game_action(request.game_id, join, action="race_join")
 
     return {"status": "joined", "game": game}
 
@@ -287,48 +373,28 @@ async def start_race_game(request: StartGameRequest):
     - All players must be ready
     """
 
-    game = await firestore_service.get_game(request.game_id)
+    def start(game):
+        if not game:
+            raise HTTPException(status_code=404, detail="Game not found")
 
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
+        if game["status"] != "waiting":
+            raise HTTPException(status_code=400, detail="Game already started")
 
-    if game["status"] != "waiting":
-        raise HTTPException(status_code=400, detail="Game already started")
-
-    if len(game["players"]) < 2:
-        raise HTTPException(status_code=400, detail="Need at least 2 players")
-
-    # Select first category randomly (excluding already used ones)
-    categories = game["settings"]["categories"]
-    used_categories = game.get("used_categories", [])
-    available_categories = [c for c in categories if c not in used_categories]
-
-    # If all categories have been used, reset the pool
-    if not available_categories:
-        available_categories = categories
-        used_categories = []
-
-    first_category = random.choice(available_categories)
-    used_categories.append(first_category)
-
-    # Update game state
-    update_data = {
-        "status": "playing",
-        "current_round": 1,
-        "current_category": first_category,
-        "round_start_time": firestore.SERVER_TIMESTAMP,
-        "round_submissions": {},  # Reset submissions for new round
-        "used_categories": used_categories,
-    }
+        if len(game["players"]) < 2:
+            raise HTTPException(status_code=400, detail="Need at least 2 players")
 
-    await firestore_service.update_game(request.game_id, update_data)
+        update = GameUpdate(game)
+        update.set("status", "playing")
+        first_category = start_round(update, 1)
 
-    return {
-        "status": "started",
-        "current_round": 1,
-        "category": first_category,
-        "round_duration": game["settings"]["round_duration"],
-    }
+        return update.fields, {
+            "status": "started",
+            "current_round": 1,
+            "category": first_category,
+            "round_duration": game["settings"]["round_duration"],
+        }
+
+    return await apply_game_action(request.game_id, start, action="race_start")
 
 
 @router.post("/race/submit-drawing")
@@ -341,167 +407,117 @@ async def submit_race_drawing(request: SubmitDrawingRequest):
     - If time expires, player with highest confidence wins
     """
 
-    game = await firestore_service.get_game(request.game_id)
-
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
-
-    if game["status"] != "playing":
-        raise HTTPException(status_code=400, detail="Game not in playing state")
+    # Category of the round this drawing won (set inside the transaction)
+    won = {}
 
-    if request.round_number != game["current_round"]:
-        raise HTTPException(status_code=400, detail="Invalid round number")
+    def submit(game):
+        won.clear()
 
-    target_confidence = game["settings"]["target_confidence"]
+        if not game:
+            raise HTTPException(status_code=404, detail="Game not found")
 
-    # Track this player's submission (update if better than previous)
-    round_submissions = game.get("round_submissions", {})
-    current_best = round_submissions.get(request.player_id, {}).get("confidence", 0)
-
-    if (
-        request.prediction.lower() == game["current_category"].lower()
-        and request.confidence > current_best
-    ):
-        round_submissions[request.player_id] = {
-            "player_name": next(
-                (
-                    p["player_name"]
-                    for p in game["players"]
-                    if p["player_id"] == request.player_id
-                ),
-                "Unknown",
-            ),
-            "confidence": request.confidence,
-            "prediction": request.prediction,
-        }
-        # Update submissions in game
-        await firestore_service.update_game(
-            request.game_id, {"round_submissions": round_submissions}
-        )
+        if game["status"] != "playing":
+            raise HTTPException(status_code=400, detail="Game not in playing state")
 
-    # Check if prediction matches current category
-    if request.prediction.lower() != game["current_category"].lower():
-        return {
-            "status": "incorrect_category",
-            "message": f"Draw a {game['current_category']}!",
-            "confidence": request.confidence,
-        }
+        if request.round_number != game["current_round"]:
+            raise HTTPException(status_code=400, detail="Invalid round number")
 
-    # Check if player won this round (reached target confidence)
-    if request.confidence >= target_confidence:
-        # Player wins this round!
-        winner = next(
-            (p for p in game["players"] if p["player_id"] == request.player_id), None
-        )
+        update = GameUpdate(game)
+        target_confidence = game["settings"]["target_confidence"]
+        category = game["current_category"]
+        is_correct = request.prediction.lower() == category.lower()
 
-        if winner:
-            winner["rounds_won"] += 1
-            winner["score"] += 100  # Points for winning a round
-
-            # 🎯 Save winning drawing for active learning
-            await save_drawing_for_training(
-                drawing_data=request.drawing_data,
-                target_category=game["current_category"],
-                ai_prediction=request.prediction,
-                ai_confidence=request.confidence,
-                game_mode="RACE",
-                user_id=request.player_id,
-            )
+        # Track this player's submission (update if better than previous)
+        round_submissions = game.get("round_submissions", {})
+        current_best = round_submissions.get(request.player_id, {}).get("confidence", 0)
 
-            # Record round winner
-            round_winners = game.get("round_winners", [])
-            round_winners.append(
+        if is_correct and request.confidence > current_best:
+            update.set(
+                ("round_submissions", request.player_id),
                 {
-                    "round": game["current_round"],
-                    "winner_id": request.player_id,
-                    "winner_name": winner["player_name"],
+                    "player_name": next(
+                        (
+                            p["player_name"]
+                            for p in game["players"]
+                            if p["player_id"] == request.player_id
+                        ),
+                        "Unknown",
+                    ),
                     "confidence": request.confidence,
-                    "category": game["current_category"],
-                }
+                    "prediction": request.prediction,
+                },
             )
 
-            # Check if game is over
-            if game["current_round"] >= game["max_rounds"]:
-                # Game finished - determine champion
-                champion = max(game["players"], key=lambda p: p["rounds_won"])
-
-                await firestore_service.update_game(
-                    request.game_id,
-                    {
-                        "status": "finished",
-                        "round_winners": round_winners,
-                        "players": game["players"],
-                        "champion": {
-                            "player_id": champion["player_id"],
-                            "player_name": champion["player_name"],
-                            "rounds_won": champion["rounds_won"],
-                        },
-                        "finished_at": firestore.SERVER_TIMESTAMP,
-                    },
-                )
-
-                return {
-                    "status": "game_finished",
-                    "round_winner": winner,
-                    "champion": champion,
-                    "final_standings": sorted(
-                        game["players"], key=lambda p: p["rounds_won"], reverse=True
-                    ),
-                }
-            else:
-                # Start next round
-                next_round = game["current_round"] + 1
-                categories = game["settings"]["categories"]
-                used_categories = game.get("used_categories", [])
-                available_categories = [
-                    c for c in categories if c not in used_categories
-                ]
-
-                # If all categories have been used, reset the pool
-                if not available_categories:
-                    available_categories = categories
-                    used_categories = []
-
-                next_category = random.choice(available_categories)
-                used_categories.append(next_category)
-
-                await firestore_service.update_game(
-                    request.game_id,
-                    {
-                        "current_round": next_round,
-                        "current_category": next_category,
-                        "round_start_time": firestore.SERVER_TIMESTAMP,
-                        "round_winners": round_winners,
-                        "players": game["players"],
-                        "round_submissions": {},  # Reset submissions for new round
-                        "used_categories": used_categories,
-                    },
-                )
-
-                return {
+        # Check if prediction matches current category
+        if not is_correct:
+            return update.fields, {
+                "status": "incorrect_category",
+                "message": f"Draw a {category}!",
+                "confidence": request.confidence,
+            }
+
+        # Check if player won this round (reached target confidence)
+        if request.confidence >= target_confidence:
+            winner = award_race_round(
+                update, request.player_id, 100, request.confidence
+            )
+
+            if winner:
+                won["category"] = category
+                next_category = advance_round(update)
+
+                if next_category is None:
+                    return update.fields, {
+                        "status": "game_finished",
+                        "round_winner": winner,
+                        "champion": max(game["players"], key=lambda p: p["rounds_won"]),
+                        "final_standings": sorted(
+                            game["players"], key=lambda p: p["rounds_won"], reverse=True
+                        ),
+                    }
+
+                return update.fields, {
                     "status": "round_won",
                     "round_winner": winner,
-                    "next_round": next_round,
+                    "next_round": game["current_round"],
                     "next_category": next_category,
                 }
 
-    # Player hasn't won yet, keep trying
-    return {
-        "status": "keep_drawing",
-        "confidence": request.confidence,
-        "target": target_confidence,
-        "message": f"Keep drawing! Target: {int(target_confidence * 100)}%",
-    }
+        # Player hasn't won yet, keep trying
+        return update.fields, {
+            "status": "keep_drawing",
+            "confidence": request.confidence,
+            "target": target_confidence,
+            "message": f"Keep drawing! Target: {int(target_confidence * 100)}%",
+        }
+
+    result = await apply_game_action(request.game_id, submit, action="race_submit")
+
+    if won:
+        # 🎯 Save winning drawing for active learning
+        await save_drawing_for_training(
+            drawing_data=request.drawing_data,
+            target_category=won["category"],
+            ai_prediction=request.prediction,
+            ai_confidence=request.confidence,
+            game_mode="RACE",
+            user_id=request.player_id,
+        )
+
+    return result
 
 
 @router.get("/race/{game_id}")
 async def get_race_game(game_id: str):
     """
     Get current state of a race game
-    Used for real-time updates via polling or WebSocket
+    Used for polling; live clients subscribe to /games/ws/{game_id} instead
+
+    Served from the in-process game cache (no Firestore read while the
+    game's snapshot listener is active).
     """
 
-    game = await firestore_service.get_game(game_id)
+    game = await load_game(game_id)
 
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
@@ -510,136 +526,88 @@ async def get_race_game(game_id: str):
 
 
 @router.post("/race/timeout")
-async def race_timeout(request: StartGameRequest):
+async def race_timeout(request: TimeoutRequest):
     """
     Handle race round timeout - award point to player with highest confidence
-    """
-
-    game = await firestore_service.get_game(request.game_id)
 
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
+    Also fired by the server when the round deadline passes; with
+    round_number set, calls for a round that already ended change nothing.
+    """
 
-    if game["status"] != "playing":
-        raise HTTPException(status_code=400, detail="Game not in playing state")
+    def timeout(game):
+        if not game:
+            raise HTTPException(status_code=404, detail="Game not found")
 
-    round_winners = game.get("round_winners", [])
+        if game["status"] != "playing":
+            raise HTTPException(status_code=400, detail="Game not in playing state")
 
-    # Find player with highest confidence for current category
-    round_submissions = game.get("round_submissions", {})
+        if round_already_ended(game, request):
+            return {}, {"status": "round_ended", "current_round": game["current_round"]}
 
-    best_player = None
-    best_confidence = 0
+        update = GameUpdate(game)
 
-    if round_submissions:
-        # Find submission with highest confidence
-        for player_id, submission in round_submissions.items():
+        # Find player with highest confidence for current category
+        best_player_id = None
+        best_confidence = 0
+        for player_id, submission in game.get("round_submissions", {}).items():
             if submission["confidence"] > best_confidence:
                 best_confidence = submission["confidence"]
-                best_player = next(
-                    (p for p in game["players"] if p["player_id"] == player_id), None
-                )
+                best_player_id = player_id
 
-    # Award point to best player if any submissions exist
-    if best_player and best_confidence > 0:
-        best_player["rounds_won"] += 1
-        best_player["score"] += 50  # Lower score for timeout win
-
-        round_winners.append(
-            {
-                "round": game["current_round"],
-                "winner_id": best_player["player_id"],
-                "winner_name": best_player["player_name"],
-                "confidence": best_confidence,
-                "category": game["current_category"],
-                "timeout": True,
-            }
-        )
-
-    # Check if game is finished
-    if game["current_round"] >= game["max_rounds"]:
-        # Game finished - determine champion
-        player_wins = {}
-        for player in game["players"]:
-            player_wins[player["player_id"]] = player["rounds_won"]
+        # Award point to best player if any submissions exist (lower score)
+        best_player = None
+        if best_player_id and best_confidence > 0:
+            best_player = award_race_round(
+                update, best_player_id, 50, best_confidence, timeout=True
+            )
 
-        champion_id = max(player_wins, key=player_wins.get)
-        champion = next(p for p in game["players"] if p["player_id"] == champion_id)
+        next_category = advance_round(update)
 
-        await firestore_service.update_game(
-            request.game_id,
-            {
-                "status": "finished",
-                "round_winners": round_winners,
-                "players": game["players"],
-                "champion": {
-                    "player_id": champion["player_id"],
-                    "player_name": champion["player_name"],
-                    "rounds_won": champion["rounds_won"],
-                },
-                "finished_at": firestore.SERVER_TIMESTAMP,
-            },
-        )
+        if next_category is None:
+            return update.fields, {
+                "status": "game_finished",
+                "champion": max(game["players"], key=lambda p: p["rounds_won"]),
+                "round_winners": game["round_winners"],
+            }
 
-        return {
-            "status": "game_finished",
-            "champion": champion,
-            "round_winners": round_winners,
+        return update.fields, {
+            "status": "next_round",
+            "current_round": game["current_round"],
+            "category": next_category,
+            "round_winner": {
+                "player_name": best_player["player_name"],
+                "confidence": best_confidence,
+            }
+            if best_player
+            else None,
+            "message": f"Round terminé - {best_player['player_name']} gagne avec {int(best_confidence * 100)}%"
+            if best_player
+            else "Round terminé - aucun gagnant",
         }
 
-    # Start next round
-    next_round = game["current_round"] + 1
-    categories = game["settings"]["categories"]
-    used_categories = game.get("used_categories", [])
-    available_categories = [c for c in categories if c not in used_categories]
-
-    # If all categories have been used, reset the pool
-    if not available_categories:
-        available_categories = categories
-        used_categories = []
-
-    next_category = random.choice(available_categories)
-    used_categories.append(next_category)
-
-    await firestore_service.update_game(
-        request.game_id,
-        {
-            "current_round": next_round,
-            "current_category": next_category,
-            "round_start_time": firestore.SERVER_TIMESTAMP,
-            "round_winners": round_winners,
-            "players": game["players"],
-            "round_submissions": {},  # Reset submissions for new round
-            "used_categories": used_categories,
-        },
-    )
-
-    return {
-        "status": "next_round",
-        "current_round": next_round,
-        "category": next_category,
-        "round_winner": {
-            "player_name": best_player["player_name"],
-            "confidence": best_confidence,
-        }
-        if best_player
-        else None,
-        "message": f"Round terminé - {best_player['player_name']} gagne avec {int(best_confidence * 100)}%"
-        if best_player
-        else "Round terminé - aucun gagnant",
-    }
+    return await apply_game_action(request.game_id, timeout, action="race_timeout")
 
 
 @router.get("/race/lobby/list")
-async def list_race_lobbies():
+async def list_race_lobbies(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None
+):
     """
-    List all available race game lobbies (waiting status)
+    List available race game lobbies (waiting status)
+
+    Served from the in-memory lobby directory (lobby card fields only).
+    Pass the returned `next_cursor` as `cursor` to get the next page.
     """
+    return await lobby_directory.list_lobbies("race", limit=limit, cursor=cursor)
 
-    # Query Firestore for waiting games
-    lobbies = firestore_service.get_games_by_status("waiting", game_type="race")
 
-    return {"lobbies": lobbies}
+@router.get("/room/{room_code}")
+async def resolve_room_code(room_code: str):
+    """Find the game behind a room code (race or guessing)"""
+    room = await lobby_directory.resolve(room_code)
+    if room is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    return room
 
 
 # ==================== Guessing Game Endpoints ====================
@@ -663,6 +631,7 @@ class SendChatMessageRequest(BaseModel):
 class UpdateCanvasRequest(BaseModel):
     game_id: str
     canvas_state: str  # Base64 encoded image
+    round_number: Optional[int] = None  # Defaults to the current round
 
 
 class AiPredictionRequest(BaseModel):
@@ -701,16 +670,21 @@ async def create_guessing_game(request: CreateGameRequest):
         "round_duration": 90,  # seconds
         "ai_confidence_threshold": 0.85,
         "prediction_interval": 500,  # ms
-        "categories": CATEGORIES,  # Use all 345 categories from model metadata
+        # "categories" only when custom; the model's classes otherwise
     }
 
     settings = {**default_settings, **(request.settings or {})}
 
+    # Reserve a unique room code for the new game
+    game_id = firestore_service.new_game_id()
+    room_code = await lobby_directory.reserve_room_code(game_id, "guessing")
+
     game_data = {
         "game_type": "guessing",
         "status": "waiting",
         "created_at": datetime.utcnow(),
         "creator_id": request.creator_id,
+        "room_code": room_code,
         "max_players": min(request.max_players, 5),
         "players": [
             {
@@ -729,14 +703,28 @@ async def create_guessing_game(request: CreateGameRequest):
         "round_start_time": None,
         "round_winners": [],
         "team_humans": {"score": 0, "rounds_won": 0},
-        "team_ai": {"score": 0, "rounds_won": 0, "predictions": []},
-        "used_categories": [],  # Track categories already used to prevent repetition
+        "team_ai": {
+            "score": 0,
+            "rounds_won": 0,
+            "predictions": [],  # Last AI_PREDICTION_HISTORY of the round
+            "best_confidence": 0,
+            "last_prediction": None,
+        },
+        # Shuffled category order: {seed, cursor, size} (no repeats until exhausted)
+        "category_deck": new_deck(len(settings.get("categories") or CATEGORIES)),
     }
 
-    game_id = await firestore_service.create_game(game_data)
+    try:
+        await firestore_service.create_game(game_data, game_id=game_id)
+    except Exception:
+        # No game behind the code: free it for the next lobby
+        await lobby_directory.release_room_code(room_code)
+        raise
+    lobby_directory.add(game_id, game_data)
 
     return {
         "game_id": game_id,
+        "room_code": room_code,
         "game_type": "guessing",
         "status": "waiting",
         "players": game_data["players"],
@@ -748,30 +736,33 @@ async def create_guessing_game(request: CreateGameRequest):
 async def join_guessing_game(request: JoinGameRequest):
     """Join an existing Guessing Game lobby"""
 
-    game = await firestore_service.get_game(request.game_id)
-
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
+    def join(game):
+        if not game:
+            raise HTTPException(status_code=404, detail="Game not found")
 
-    if game["status"] != "waiting":
-        raise HTTPException(status_code=400, detail="Game already started")
+        if game["status"] != "waiting":
+            raise HTTPException(status_code=400, detail="Game already started")
 
-    if len(game["players"]) >= game["max_players"]:
-        raise HTTPException(status_code=400, detail="Game is full")
+        if len(game["players"]) >= game["max_players"]:
+            raise HTTPException(status_code=400, detail="Game is full")
 
-    if any(p["player_id"] == request.player_id for p in game["players"]):
-        raise HTTPException(status_code=400, detail="Already in this game")
+        if any(p["player_id"] == request.player_id for p in game["players"]):
+            raise HTTPException(status_code=400, detail="Already in this game")
 
-    new_player = {
-        "player_id": request.player_id,
-        "player_name": request.player_name,
-        "ready": False,
-        "team_score": 0,
-        "individual_guesses": 0,
-    }
+        update = GameUpdate(game)
+        update.append(
+            "players",
+            {
+                "player_id": request.player_id,
+                "player_name": request.player_name,
+                "ready": False,
+                "team_score": 0,
+                "individual_guesses": 0,
+            },
+        )
+        return update.fields, game
 
-    game["players"].append(new_player)
-    await firestore_service.update_game(request.game_id, {"players": game["players"]})
+    game = await apply_game_action(request.game_id, join, action="guessing_join")
 
     return {"status": "joined", "game": game}
 
@@ -780,53 +771,29 @@ async def join_guessing_game(request: JoinGameRequest):
 async def start_guessing_game(request: StartGameRequest):
     """Start the Guessing Game"""
 
-    game = await firestore_service.get_game(request.game_id)
-
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
-
-    if game["status"] != "waiting":
-        raise HTTPException(status_code=400, detail="Game already started")
-
-    if len(game["players"]) < 2:
-        raise HTTPException(status_code=400, detail="Need at least 2 players")
+    def start(game):
+        if not game:
+            raise HTTPException(status_code=404, detail="Game not found")
 
-    # Select first drawer (random)
-    first_drawer = random.choice(game["players"])
+        if game["status"] != "waiting":
+            raise HTTPException(status_code=400, detail="Game already started")
 
-    # Select first category (excluding already used ones)
-    categories = game["settings"]["categories"]
-    used_categories = game.get("used_categories", [])
-    available_categories = [c for c in categories if c not in used_categories]
+        if len(game["players"]) < 2:
+            raise HTTPException(status_code=400, detail="Need at least 2 players")
 
-    # If all categories have been used, reset the pool
-    if not available_categories:
-        available_categories = categories
-        used_categories = []
+        # First drawer and category are picked by start_round
+        update = GameUpdate(game)
+        update.set("status", "playing")
+        first_category = start_round(update, 1)
 
-    first_category = random.choice(available_categories)
-    used_categories.append(first_category)
-
-    update_data = {
-        "status": "playing",
-        "current_round": 1,
-        "current_category": first_category,
-        "current_drawer": {
-            "player_id": first_drawer["player_id"],
-            "player_name": first_drawer["player_name"],
-        },
-        "round_start_time": firestore.SERVER_TIMESTAMP,
-        "used_categories": used_categories,
-    }
+        return update.fields, {
+            "status": "started",
+            "drawer": game["current_drawer"],
+            "category": first_category,
+            "round_duration": game["settings"]["round_duration"],
+        }
 
-    await firestore_service.update_game(request.game_id, update_data)
-
-    return {
-        "status": "started",
-        "drawer": first_drawer,
-        "category": first_category,
-        "round_duration": game["settings"]["round_duration"],
-    }
+    return await apply_game_action(request.game_id, start, action="guessing_start")
 
 
 @router.post("/guessing/submit-guess")
@@ -838,90 +805,51 @@ async def submit_guess(request: SubmitGuessRequest):
     - If guess is correct and before AI reaches 85%, humans win the round
     """
 
-    game = await firestore_service.get_game(request.game_id)
-
-    if not game or game["status"] != "playing":
-        raise HTTPException(status_code=400, detail="Invalid game state")
-
-    if request.round_number != game["current_round"]:
-        raise HTTPException(status_code=400, detail="Invalid round number")
-
-    # Check if guess is correct
-    if request.guess.lower() == game["current_category"].lower():
-        # Check if AI already won
-        ai_predictions = game["team_ai"].get("predictions", [])
-        ai_won = any(
-            p.get("confidence", 0) >= game["settings"]["ai_confidence_threshold"]
-            for p in ai_predictions
-        )
-
-        if not ai_won:
-            # Humans win this round!
-            game["team_humans"]["score"] += 100
-            game["team_humans"]["rounds_won"] += 1
-
-            # Update player stats
-            for player in game["players"]:
-                if player["player_id"] == request.player_id:
-                    player["individual_guesses"] += 1
-                    player["team_score"] += 50
-
-            round_winner = {
+    def guess(game):
+        if not game or game["status"] != "playing":
+            raise HTTPException(status_code=400, detail="Invalid game state")
+
+        if request.round_number != game["current_round"]:
+            raise HTTPException(status_code=400, detail="Invalid round number")
+
+        # Wrong guess, or the AI already won this round
+        if request.guess.lower() != game[
+            "current_category"
+        ].lower() or ai_reached_threshold(game):
+            return {}, {"status": "incorrect_guess", "message": "Essayez encore !"}
+
+        # Humans win this round!
+        update = GameUpdate(game)
+
+        # Update player stats
+        players = [dict(p) for p in game["players"]]
+        for player in players:
+            if player["player_id"] == request.player_id:
+                player["individual_guesses"] += 1
+                player["team_score"] += 50
+        update.set("players", players)
+
+        award_team_round(
+            update,
+            "humans",
+            100,
+            {
                 "round": game["current_round"],
                 "winner": "humans",
                 "guesser": request.player_name,
-            }
-
-            game["round_winners"].append(round_winner)
-
-            # Check if game over
-            if game["current_round"] >= game["max_rounds"]:
-                game["status"] = "finished"
-                game["winner"] = (
-                    "humans"
-                    if game["team_humans"]["rounds_won"] > game["team_ai"]["rounds_won"]
-                    else "ai"
-                )
-            else:
-                # Next round
-                game["current_round"] += 1
-                next_drawer = random.choice(game["players"])
-
-                # Select next category (excluding already used ones)
-                categories = game["settings"]["categories"]
-                used_categories = game.get("used_categories", [])
-                available_categories = [
-                    c for c in categories if c not in used_categories
-                ]
-
-                # If all categories have been used, reset the pool
-                if not available_categories:
-                    available_categories = categories
-                    used_categories = []
-
-                next_category = random.choice(available_categories)
-                used_categories.append(next_category)
-
-                game["current_drawer"] = {
-                    "player_id": next_drawer["player_id"],
-                    "player_name": next_drawer["player_name"],
-                }
-                game["current_category"] = next_category
-                game["round_start_time"] = firestore.SERVER_TIMESTAMP
-                game["team_ai"]["predictions"] = []
-                game["used_categories"] = used_categories
-
-            await firestore_service.update_game(request.game_id, game)
+            },
+        )
+        advance_round(update)
 
-            return {
-                "status": "correct_guess",
-                "round_winner": "humans",
-                "guesser": request.player_name,
-                "next_round": game.get("current_round"),
-                "game_over": game["status"] == "finished",
-            }
+        return update.fields, {
+            "status": "correct_guess",
+            "round_winner": "humans",
+            "guesser": request.player_name,
+            "next_round": game["current_round"],
+            "game_over": game["status"] == "finished",
+        }
 
-    return {"status": "incorrect_guess", "message": "Essayez encore !"}
+    return await apply_game_action(request.game_id, guess, action="guessing_guess")
 
 
 @router.post("/guessing/chat")
@@ -942,14 +870,87 @@ async def send_chat_message(request: SendChatMessageRequest):
     return {"status": "message_sent"}
 
 
+async def _load_drawing_round(game_id: str, round_number: Optional[int]) -> Dict:
+    """Game of a canvas update, checked to be in its drawing phase"""
+    # Pinned games keep their canvas on the owning instance (else in RTDB)
+    game_engine.ensure_owner(game_id)
+
+    game = await load_game(game_id)
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found")
+    if game["status"] != "playing":
+        raise HTTPException(status_code=400, detail="Game is not in progress")
+    if round_number is not None and round_number != game["current_round"]:
+        raise HTTPException(status_code=409, detail="Round is over")
+    return game
+
+
+@router.post("/guessing/submit-stroke")
+async def submit_stroke(request: SubmitStrokeRequest):
+    """
+    Append one stroke delta to the drawer's canvas
+
+    The stroke is kept in the round's log (see CanvasSync) and pushed to the
+    guessers as a "stroke" event with its sequence number; guessers that
+    missed some call GET /games/guessing/{game_id}/strokes?since=<seq>.
+    """
+    game = await _load_drawing_round(request.game_id, request.round_number)
+    if game["current_drawer"]["player_id"] != request.player_id:
+        raise HTTPException(status_code=403, detail="Only the drawer can draw")
+
+    try:
+        stored = await canvas_sync.append_stroke(
+            request.game_id, request.round_number, request.player_id, request.stroke
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    frame = encode(
+        request.game_id,
+        "stroke",
+        {
+            "round": request.round_number,
+            "seq": stored["seq"],
+            "stroke": request.stroke,
+        },
+    )
+    delivered = game_events.publish_frame(request.game_id, frame)
+    canvas_sync.record_broadcast(request.game_id, len(frame.json) * delivered)
+
+    return {"status": "stroke_added", "seq": stored["seq"]}
+
+
+@router.get("/guessing/{game_id}/strokes")
+async def get_strokes(game_id: str, since: int = Query(0, ge=0)):
+    """Strokes of the current round after sequence number `since`"""
+    game_engine.ensure_owner(game_id)
+    return await canvas_sync.strokes_since(game_id, since)
+
+
 @router.post("/guessing/update-canvas")
 async def update_canvas_state(request: UpdateCanvasRequest):
-    """Update the canvas state so guessers can see the drawer's drawing"""
+    """
+    Update the full canvas image (legacy clients; prefer submit-stroke)
+
+    Kept by canvas_sync and pushed to subscribers; the game document is no
+    longer rewritten on every update.
+    """
+    game = await _load_drawing_round(request.game_id, request.round_number)
+
+    canvas_sync.set_canvas(
+        request.game_id,
+        game["current_round"],
+        game["current_drawer"]["player_id"],
+        request.canvas_state,
+    )
 
-    # Update canvas_state field in game document
-    await firestore_service.update_game(
-        request.game_id, {"canvas_state": request.canvas_state}
+    frame = encode(
+        request.game_id,
+        "canvas",
+        {"round": game["current_round"], "canvas_state": request.canvas_state},
     )
+    delivered = game_events.publish_frame(request.game_id, frame)
+    canvas_sync.record_broadcast(request.game_id, len(frame.json) * delivered)
 
     return {"status": "canvas_updated"}
 
@@ -962,16 +963,6 @@ async def submit_ai_prediction(request: AiPredictionRequest):
     **Win Condition:**
     - If AI prediction confidence >= 85%, AI wins the round
     """
-
-    game = await firestore_service.get_game(request.game_id)
-
-    if not game or game["status"] != "playing":
-        raise HTTPException(status_code=400, detail="Invalid game state")
-
-    if request.round_number != game["current_round"]:
-        return {"status": "ignored", "message": "Old round prediction"}
-
-    # Add prediction to AI's prediction list using arrayUnion
     import time
 
     ai_prediction = {
@@ -980,198 +971,260 @@ async def submit_ai_prediction(request: AiPredictionRequest):
         "confidence": request.confidence,
     }
 
-    # Use Firestore arrayUnion to avoid race conditions
-    from firebase_admin import firestore as fb_firestore
-
-    db = fb_firestore.client()
-    game_ref = db.collection("games").document(request.game_id)
-
-    game_ref.update({"team_ai.predictions": fb_firestore.ArrayUnion([ai_prediction])})
-
-    # Check if AI won (confidence >= threshold and prediction matches category)
-    ai_confidence_threshold = game["settings"].get("ai_confidence_threshold", 0.85)
-
-    if (
-        request.confidence >= ai_confidence_threshold
-        and request.prediction.lower() == game["current_category"].lower()
-    ):
-        # AI wins this round!
-        game["team_ai"]["rounds_won"] += 1
-
-        round_winner = {
-            "round": game["current_round"],
-            "winner": "ai",
-            "confidence": request.confidence,
-        }
-
-        game["round_winners"].append(round_winner)
-
-        # Check if game over
-        if game["current_round"] >= game["max_rounds"]:
-            game["status"] = "finished"
-            game["winner"] = (
-                "humans"
-                if game["team_humans"]["rounds_won"] > game["team_ai"]["rounds_won"]
-                else "ai"
+    def predict(game):
+        if not game or game["status"] != "playing":
+            raise HTTPException(status_code=400, detail="Invalid game state")
+
+        if request.round_number != game["current_round"]:
+            return {}, {"status": "ignored", "message": "Old round prediction"}
+
+        # Round summary + capped history: size no longer grows with the round
+        update = GameUpdate(game)
+        record_ai_prediction(update, ai_prediction)
+
+        # Check if AI won (confidence >= threshold and prediction matches category)
+        ai_confidence_threshold = game["settings"].get("ai_confidence_threshold", 0.85)
+
+        if (
+            request.confidence >= ai_confidence_threshold
+            and request.prediction.lower() == game["current_category"].lower()
+        ):
+            # AI wins this round!
+            award_team_round(
+                update,
+                "ai",
+                0,
+                {
+                    "round": game["current_round"],
+                    "winner": "ai",
+                    "confidence": request.confidence,
+                },
             )
-        else:
-            # Next round
-            game["current_round"] += 1
-            next_drawer = random.choice(game["players"])
-
-            # Select next category (excluding already used ones)
-            categories = game["settings"]["categories"]
-            used_categories = game.get("used_categories", [])
-            available_categories = [c for c in categories if c not in used_categories]
-
-            # If all categories have been used, reset the pool
-            if not available_categories:
-                available_categories = categories
-                used_categories = []
-
-            next_category = random.choice(available_categories)
-            used_categories.append(next_category)
-
-            game["current_drawer"] = {
-                "player_id": next_drawer["player_id"],
-                "player_name": next_drawer["player_name"],
-            }
-            game["current_category"] = next_category
-            game["round_start_time"] = firestore.SERVER_TIMESTAMP
-            game["team_ai"]["predictions"] = []
-            game["canvas_state"] = None  # Clear canvas for new round
-            game["used_categories"] = used_categories
+            advance_round(update)
 
-        await firestore_service.update_game(request.game_id, game)
+            return update.fields, {
+                "status": "ai_won_round",
+                "confidence": request.confidence,
+                "next_round": game["current_round"],
+                "game_over": game["status"] == "finished",
+            }
 
-        return {
-            "status": "ai_won_round",
+        # Prediction added successfully
+        return update.fields, {
+            "status": "prediction_added",
             "confidence": request.confidence,
-            "next_round": game.get("current_round"),
-            "game_over": game["status"] == "finished",
         }
 
-    # Prediction added successfully
-    return {"status": "prediction_added", "confidence": request.confidence}
+    return await apply_game_action(
+        request.game_id, predict, action="guessing_ai_prediction"
+    )
 
 
 @router.get("/guessing/{game_id}")
 async def get_guessing_game(game_id: str):
     """Get current state of guessing game"""
 
-    game = await firestore_service.get_game(game_id)
+    game = await load_game(game_id)
 
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
+    # The live canvas is held in memory, not in the game document
+    canvas_state = await canvas_sync.canvas_state(game_id)
+    if canvas_state is not None:
+        game["canvas_state"] = canvas_state
+
     return game
 
 
 @router.get("/guessing/lobby/list")
-async def list_guessing_lobbies():
-    """List all available guessing game lobbies"""
-
-    lobbies = firestore_service.get_games_by_status("waiting", game_type="guessing")
-
-    return {"lobbies": lobbies}
+async def list_guessing_lobbies(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None
+):
+    """List available guessing game lobbies (in-memory directory, paginated)"""
+    return await lobby_directory.list_lobbies("guessing", limit=limit, cursor=cursor)
 
 
 @router.post("/guessing/timeout")
-async def guessing_timeout(request: StartGameRequest):
+async def guessing_timeout(request: TimeoutRequest):
     """
     Handle guessing game round timeout - AI wins if they reached threshold
+
+    Also fired by the server when the round deadline passes; with
+    round_number set, calls for a round that already ended change nothing.
     """
 
-    game = await firestore_service.get_game(request.game_id)
+    def timeout(game):
+        if not game:
+            raise HTTPException(status_code=404, detail="Game not found")
 
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
+        if game["status"] != "playing":
+            raise HTTPException(status_code=400, detail="Game not in playing state")
 
-    if game["status"] != "playing":
-        raise HTTPException(status_code=400, detail="Game not in playing state")
+        if round_already_ended(game, request):
+            return {}, {"status": "round_ended", "current_round": game["current_round"]}
 
-    # Check if AI won this round
-    ai_predictions = game.get("team_ai", {}).get("predictions", [])
-    ai_won = any(
-        p.get("confidence", 0) >= game["settings"]["ai_confidence_threshold"]
-        for p in ai_predictions
-    )
+        update = GameUpdate(game)
 
-    if ai_won:
-        # AI wins this round
-        game["team_ai"]["score"] += 100
-        game["team_ai"]["rounds_won"] += 1
+        # Check if AI won this round
+        ai_won = ai_reached_threshold(game)
 
-        round_winner = {
-            "round": game["current_round"],
-            "winner": "ai",
-            "reason": "timeout_with_prediction",
+        if ai_won:
+            # AI wins this round
+            round_winner = {
+                "round": game["current_round"],
+                "winner": "ai",
+                "reason": "timeout_with_prediction",
+            }
+            award_team_round(update, "ai", 100, round_winner)
+        else:
+            # Nobody wins - timeout without winner
+            round_winner = {
+                "round": game["current_round"],
+                "winner": "none",
+                "reason": "timeout_no_guess",
+            }
+            record_round_winner(update, round_winner)
+
+        next_category = advance_round(update)
+
+        if next_category is None:
+            return update.fields, {
+                "status": "game_finished",
+                "winner": game["winner"],
+                "team_humans": game["team_humans"],
+                "team_ai": game["team_ai"],
+            }
+
+        return update.fields, {
+            "status": "next_round" if not ai_won else "ai_won_round",
+            "round_winner": round_winner,
+            "current_round": game["current_round"],
+            "new_drawer": game["current_drawer"],
+            "new_category": next_category,
         }
+
+    return await apply_game_action(request.game_id, timeout, action="guessing_timeout")
+
+
+# ==================== ROUND DEADLINES ====================
+
+
+def round_already_ended(game: Dict, request: TimeoutRequest) -> bool:
+    """Whether a timeout targets a round that is no longer current"""
+    return (
+        request.round_number is not None
+        and request.round_number != game["current_round"]
+    )
+
+
+async def expire_round(game_id: str, game_type: str, round_number: int) -> None:
+    """Run the timeout action of a round whose deadline passed"""
+    request = TimeoutRequest(game_id=game_id, round_number=round_number)
+    if game_type == "race":
+        await race_timeout(request)
     else:
-        # Nobody wins - timeout without winner
-        round_winner = {
-            "round": game["current_round"],
-            "winner": "none",
-            "reason": "timeout_no_guess",
-        }
+        await guessing_timeout(request)
 
-    game["round_winners"].append(round_winner)
-
-    # Check if game over
-    if game["current_round"] >= game["max_rounds"]:
-        game["status"] = "finished"
-        game["winner"] = (
-            "humans"
-            if game["team_humans"]["rounds_won"] > game["team_ai"]["rounds_won"]
-            else "ai"
-            if game["team_ai"]["rounds_won"] > game["team_humans"]["rounds_won"]
-            else "draw"
-        )
 
-        await firestore_service.update_game(request.game_id, game)
+round_deadlines.handler = expire_round
 
-        return {
-            "status": "game_finished",
-            "winner": game["winner"],
-            "team_humans": game["team_humans"],
-            "team_ai": game["team_ai"],
-        }
 
-    # Next round
-    game["current_round"] += 1
-    next_drawer = random.choice(game["players"])
+# ==================== LIVE UPDATES (WEBSOCKET / SSE) ====================
 
-    # Select next category (excluding already used ones)
-    categories = game["settings"]["categories"]
-    used_categories = game.get("used_categories", [])
-    available_categories = [c for c in categories if c not in used_categories]
+SSE_KEEPALIVE_SECONDS = 15
 
-    # If all categories have been used, reset the pool
-    if not available_categories:
-        available_categories = categories
-        used_categories = []
 
-    next_category = random.choice(available_categories)
-    used_categories.append(next_category)
+async def _snapshot_frame(game_id: str):
+    """Full game state as the first frame of a subscription"""
+    game = await load_game(game_id)
+    return encode(game_id, "snapshot", {"game": game}) if game else None
 
-    game["current_drawer"] = {
-        "player_id": next_drawer["player_id"],
-        "player_name": next_drawer["player_name"],
-    }
-    game["current_category"] = next_category
-    game["round_start_time"] = firestore.SERVER_TIMESTAMP
-    game["team_ai"]["predictions"] = []
-    game["used_categories"] = used_categories
 
-    await firestore_service.update_game(request.game_id, game)
+@router.websocket("/ws/{game_id}")
+async def game_updates_socket(websocket: WebSocket, game_id: str):
+    """
+    Subscribe to a game over WebSocket (race or guessing)
 
-    return {
-        "status": "next_round" if not ai_won else "ai_won_round",
-        "round_winner": round_winner,
-        "current_round": game["current_round"],
-        "new_drawer": next_drawer,
-        "new_category": next_category,
-    }
+    Sends a "snapshot" frame with the full state, then one frame per state
+    change: {"event", "game_id", "ts", "changes": [{"path", "value"}]}.
+    A "resync" frame means updates were dropped: a new snapshot follows.
+    """
+    await websocket.accept()
+    queue = game_events.subscribe(game_id)
+    receiver = asyncio.ensure_future(websocket.receive_text())
+    try:
+        try:
+            frame = await _snapshot_frame(game_id)
+        except GameOwnedElsewhere as e:
+            await websocket.close(code=4307, reason=e.owner_url)
+            return
+        if frame is None:
+            await websocket.close(code=4404, reason="Game not found")
+            return
+        await websocket.send_text(frame.json)
+
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {getter, receiver}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if receiver in done:
+                # Clients only listen; any message or a disconnect ends it
+                getter.cancel()
+                break
+
+            frame = getter.result()
+            await websocket.send_text(frame.json)
+            if frame is RESYNC:
+                frame = await _snapshot_frame(game_id)
+                if frame is None:
+                    break
+                await websocket.send_text(frame.json)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        game_events.unsubscribe(game_id, queue)
+
+
+@router.get("/events/{game_id}")
+async def game_updates_stream(game_id: str):
+    """
+    Subscribe to a game with Server-Sent Events (WebSocket fallback)
+
+    Same frames as /games/ws/{game_id}, as SSE events named after the action.
+    """
+    first = await _snapshot_frame(game_id)
+    if first is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+
+    queue = game_events.subscribe(game_id)
+
+    async def stream():
+        try:
+            yield first.sse
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                yield frame.sse
+                if frame is RESYNC:
+                    snapshot = await _snapshot_frame(game_id)
+                    if snapshot is None:
+                        return
+                    yield snapshot.sse
+        finally:
+            game_events.unsubscribe(game_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ==================== PRESENCE & LEAVE ENDPOINTS ====================
@@ -1198,6 +1251,8 @@ async def set_player_online(request: SetPresenceRequest):
     """
     Mark a player as online in a game (called when joining/reconnecting)
     """
+    # Pinned games track presence on their owner instance
+    game_engine.ensure_owner(request.game_id)
     success = await PresenceService.set_player_online(
         request.game_id, request.player_id, request.player_name
     )
@@ -1232,6 +1287,7 @@ async def player_heartbeat(request: HeartbeatRequest):
     Update player's heartbeat timestamp
     Should be called every 10-15 seconds by the client
     """
+    game_engine.ensure_owner(request.game_id)
     success = await PresenceService.heartbeat(request.game_id, request.player_id)
 
     if success:
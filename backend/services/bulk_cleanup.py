@@ -0,0 +1,297 @@
+"""
+Bulk game deletion
+Deletes many games, their subcollections, room codes and RTDB presence with
+batched writes instead of one request per document
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from google.api_core.exceptions import FailedPrecondition
+
+from services.canvas_sync import canvas_sync
+from services.game_cache import game_cache
+from services.game_engine import game_engine
+from services.game_events import game_events
+from services.lobby_directory import lobby_directory
+from services.presence_service import (
+    get_firestore_db,
+    get_rtdb,
+    heartbeat_batcher,
+    presence_tracker,
+)
+from services.round_deadlines import round_deadlines
+
+logger = logging.getLogger(__name__)
+
+# Firestore limit for one WriteBatch
+MAX_BATCH_SIZE = 500
+
+GAME_SUBCOLLECTIONS = ("chat", "turns")
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class BulkCleanup:
+    """
+    Batched deletion of games and everything attached to them
+
+    **Behaviour:**
+    - Subcollections (chat, turns) of all games are swept in parallel, at
+      most `max_concurrency` Firestore calls at a time; documents are
+      listed by reference only (no document data is read)
+    - Deletes are grouped into WriteBatches of up to 500 documents
+    - Game documents go in batches; room_codes/{code} documents are read
+      first and only deleted while they still point at the deleted game
+      (a code may have been freed and reused), with an update-time
+      precondition; RTDB presence of every game goes in one multi-path
+      update
+    - In-memory state (engine actors, cache, lobby list, canvas logs,
+      round deadlines, presence tracking) is dropped first so nothing
+      writes the games back
+    - find_abandoned() filters by age in the query (created_at < cutoff,
+      or createdAt for games older than the created_at field) and only
+      fetches room_code; both need a composite index on (status,
+      <field>), see firestore.indexes.json
+
+    📝 DEFENSE JUSTIFICATION:
+    Abandoned-game cleanup streamed every waiting game and filtered by age
+    in Python, then deleted each game and its presence with separate
+    round trips; admin deletes removed chat and turn documents one request
+    at a time. Batches of 500 and a single RTDB update cut the number of
+    round trips by two to three orders of magnitude.
+    """
+
+    def __init__(self, batch_size: int = MAX_BATCH_SIZE, max_concurrency: int = 8):
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.max_concurrency = max_concurrency
+
+        self.last_run: Optional[Dict] = None
+
+    # ==================== QUERIES ====================
+
+    async def find_abandoned(self, max_age_minutes: int = 30) -> List[Dict]:
+        """
+        Waiting games created more than max_age_minutes ago
+
+        Returns:
+            List of {"id", "room_code"}
+        """
+        cutoff = datetime.utcnow() - timedelta(minutes=max_age_minutes)
+        games = get_firestore_db().collection("games")
+
+        def query(field: str):
+            return (
+                games.where("status", "==", "waiting")
+                .where(field, "<", cutoff)
+                .select(["room_code"])
+            )
+
+        # Legacy games only carry the createdAt server timestamp
+        results = await asyncio.gather(
+            *(
+                asyncio.to_thread(lambda q=query(field): list(q.stream()))
+                for field in ("created_at", "createdAt")
+            )
+        )
+        abandoned = {}
+        for doc in (doc for docs in results for doc in docs):
+            abandoned[doc.id] = {
+                "id": doc.id,
+                "room_code": (doc.to_dict() or {}).get("room_code"),
+            }
+        return list(abandoned.values())
+
+    # ==================== DELETION ====================
+
+    async def delete_games(self, games: List[Dict], reason: str = "cleanup") -> Dict:
+        """
+        Delete games with their subcollections, room codes and presence
+
+        Args:
+            games: List of {"id", "room_code" (optional)}
+            reason: Label used in logs and stats
+
+        Returns:
+            Statistics: games, documents, batches, elapsed seconds, docs/sec
+        """
+        started = time.monotonic()
+        stats = {
+            "reason": reason,
+            "games": len(games),
+            "documents": 0,
+            "subcollection_documents": 0,
+            "batches": 0,
+            "rtdb_updates": 0,
+        }
+        if not games:
+            return self._finish(stats, started)
+
+        db = get_firestore_db()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # 1. Drop in-memory state so nothing writes these games back
+        room_codes = {}
+        for game in games:
+            game_id = game["id"]
+            await game_engine.release(game_id)
+            game_cache.evict(game_id)
+            canvas_sync.drop(game_id)
+            round_deadlines.cancel(game_id)
+            heartbeat_batcher.discard(game_id)
+            presence_tracker.remove_game(game_id)
+            listed_code = lobby_directory.discard(game_id)
+            room_code = game.get("room_code") or listed_code
+            if room_code:
+                room_codes[room_code] = game_id
+
+        # 2. Subcollections, swept in parallel
+        async def list_refs(game_id: str, name: str) -> List:
+            collection = db.collection("games").document(game_id).collection(name)
+            async with semaphore:
+                return await asyncio.to_thread(
+                    lambda: list(collection.list_documents())
+                )
+
+        sweeps = await asyncio.gather(
+            *(
+                list_refs(game["id"], name)
+                for game in games
+                for name in GAME_SUBCOLLECTIONS
+            )
+        )
+        sub_refs = [ref for refs in sweeps for ref in refs]
+        stats["subcollection_documents"] = len(sub_refs)
+
+        # 3. Subcollection documents, then games and room codes
+        game_refs = [db.collection("games").document(game["id"]) for game in games]
+        await self._delete_refs(db, sub_refs, semaphore, stats)
+        await self._delete_refs(db, game_refs, semaphore, stats)
+        await self._delete_room_codes(db, room_codes, semaphore, stats)
+
+        # 4. Presence of every game in one RTDB request
+        try:
+            paths = {f"presence/{game['id']}": None for game in games}
+            await asyncio.to_thread(get_rtdb().update, paths)
+            stats["rtdb_updates"] = 1
+        except Exception as e:
+            logger.error(f"Bulk presence cleanup failed: {e}")
+
+        for game in games:
+            game_events.publish(game["id"], "game_deleted", {})
+
+        return self._finish(stats, started)
+
+    async def cleanup_abandoned(self, max_age_minutes: int = 30) -> Dict:
+        """Find and delete waiting games older than max_age_minutes"""
+        started = time.monotonic()
+        games = await self.find_abandoned(max_age_minutes)
+        query_seconds = time.monotonic() - started
+
+        stats = await self.delete_games(games, reason="abandoned")
+        stats["query_seconds"] = round(query_seconds, 3)
+        return stats
+
+    # ==================== INTERNALS ====================
+
+    async def _delete_refs(
+        self, db, refs: List, semaphore: asyncio.Semaphore, stats: Dict
+    ) -> None:
+        """Delete documents in parallel WriteBatches of batch_size"""
+
+        async def commit(chunk: List) -> None:
+            batch = db.batch()
+            for ref in chunk:
+                batch.delete(ref)
+            async with semaphore:
+                await asyncio.to_thread(batch.commit)
+            stats["batches"] += 1
+            stats["documents"] += len(chunk)
+
+        await asyncio.gather(
+            *(commit(chunk) for chunk in _chunks(refs, self.batch_size))
+        )
+
+    async def _delete_room_codes(
+        self, db, room_codes: Dict[str, str], semaphore: asyncio.Semaphore, stats
+    ) -> None:
+        """
+        Delete room codes that still belong to the deleted games
+
+        Args:
+            room_codes: {code: game_id}
+        """
+        owned = []
+        for chunk in _chunks(list(room_codes), self.batch_size):
+            refs = [db.collection("room_codes").document(code) for code in chunk]
+            async with semaphore:
+                snapshots = await asyncio.to_thread(lambda: list(db.get_all(refs)))
+            owned.extend(
+                snapshot
+                for snapshot in snapshots
+                if snapshot.exists
+                and (snapshot.to_dict() or {}).get("game_id") == room_codes[snapshot.id]
+            )
+
+        def delete(batch, snapshot) -> None:
+            # Fails if the code was released and claimed again since the read
+            option = db.write_option(last_update_time=snapshot.update_time)
+            batch.delete(snapshot.reference, option=option)
+
+        async def commit(chunk: List) -> None:
+            batch = db.batch()
+            for snapshot in chunk:
+                delete(batch, snapshot)
+            try:
+                async with semaphore:
+                    await asyncio.to_thread(batch.commit)
+                stats["batches"] += 1
+                stats["documents"] += len(chunk)
+                return
+            except FailedPrecondition:
+                pass
+
+            # One code was reused: delete the others one at a time
+            for snapshot in chunk:
+                single = db.batch()
+                delete(single, snapshot)
+                try:
+                    async with semaphore:
+                        await asyncio.to_thread(single.commit)
+                    stats["batches"] += 1
+                    stats["documents"] += 1
+                except FailedPrecondition:
+                    logger.info(f"Room code {snapshot.id} was reused, kept")
+
+        await asyncio.gather(
+            *(commit(chunk) for chunk in _chunks(owned, self.batch_size))
+        )
+
+    def _finish(self, stats: Dict, started: float) -> Dict:
+        elapsed = time.monotonic() - started
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["docs_per_second"] = (
+            round(stats["documents"] / elapsed, 1) if elapsed > 0 else 0.0
+        )
+        self.last_run = stats
+
+        if stats["games"]:
+            logger.info(
+                f"🧹 Bulk delete ({stats['reason']}): {stats['games']} games, "
+                f"{stats['documents']} documents in {stats['batches']} batches, "
+                f"{stats['elapsed_seconds']}s ({stats['docs_per_second']} docs/s)"
+            )
+        return stats
+
+
+# Shared instance used by the cleanup routes
+bulk_cleanup = BulkCleanup(
+    max_concurrency=int(os.getenv("BULK_CLEANUP_CONCURRENCY", "8")),
+)
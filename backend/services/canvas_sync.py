@@ -0,0 +1,463 @@
+"""
+Stroke-delta canvas sync for the Guessing Game
+The drawer's strokes live in an in-memory log per game (or in RTDB when
+requests are not pinned to one instance); Firestore only gets one compacted
+snapshot per round
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _RoundCanvas:
+    """Canvas of the current round of one game"""
+
+    __slots__ = (
+        "round_number",
+        "drawer_id",
+        "strokes",
+        "next_seq",
+        "canvas_state",
+        "last_update",
+        "stats",
+    )
+
+    def __init__(self, round_number: int, drawer_id: Optional[str]):
+        self.round_number = round_number
+        self.drawer_id = drawer_id
+        self.strokes: List[Dict] = []  # [{"seq", "stroke"}], seq = index + 1
+        self.next_seq = 1
+        self.canvas_state: Optional[str] = None  # Latest full image (legacy)
+        self.last_update = time.monotonic()
+        self.stats = {
+            "strokes": 0,
+            "stroke_bytes": 0,
+            "canvas_updates": 0,
+            "canvas_bytes": 0,
+            "broadcast_bytes": 0,
+        }
+
+
+class CanvasSync:
+    """
+    Per-game stroke logs with sequence numbers
+
+    **Behaviour:**
+    - append_stroke() adds one stroke delta and returns its sequence number;
+      the caller broadcasts only that delta to the guessers
+    - strokes_since() lets a (re)connecting guesser catch up from its last
+      sequence number instead of downloading a full image
+    - set_canvas() keeps the latest full canvas from legacy clients in
+      memory (GET /games/guessing/{id} overlays it), not in Firestore
+    - end_round() compacts the round into one snapshot for the "turns"
+      subcollection and drops the log
+    - shared=True (several instances, no GAME_ENGINE_INSTANCES pinning):
+      strokes are written through to RTDB canvas/{game_id} in batches of
+      flush_interval seconds (one sequence-number transaction and one
+      multi-path update per batch), full canvases at most once per
+      canvas_flush_interval, and reads come from RTDB, so any instance
+      can serve the drawer and the guessers
+
+    📝 DEFENSE JUSTIFICATION:
+    A base64 canvas is tens of KB and was written to the game document on
+    every update, then re-downloaded by every guesser on every poll. A
+    stroke delta is a few hundred bytes, is sent once per guesser, and
+    costs no Firestore write until the round ends.
+    """
+
+    def __init__(
+        self,
+        max_strokes_per_round: int = 5000,
+        max_stroke_bytes: int = 16 * 1024,
+        max_games: int = 1000,
+        shared: bool = False,
+        flush_interval: float = 0.2,
+        canvas_flush_interval: float = 1.0,
+    ):
+        self.max_strokes_per_round = max_strokes_per_round
+        self.max_stroke_bytes = max_stroke_bytes
+        self.max_games = max_games
+        self.shared = shared
+        self.flush_interval = flush_interval
+        self.canvas_flush_interval = canvas_flush_interval
+
+        self._rounds: Dict[str, _RoundCanvas] = {}
+        # Shared mode: strokes waiting for the next RTDB batch, per game
+        self._pending: Dict[str, List[Tuple[int, str, Dict, asyncio.Future]]] = {}
+        self._pending_canvas: Dict[str, Tuple[int, str, str]] = {}
+        self._flushers: Dict[str, asyncio.Task] = {}
+        self._canvas_flushers: Dict[str, asyncio.Task] = {}
+        # Shared mode: last full canvas read from RTDB, as (monotonic, image)
+        self._canvas_reads: Dict[str, Tuple[float, Optional[str]]] = {}
+
+    # ==================== DRAWER ====================
+
+    async def append_stroke(
+        self,
+        game_id: str,
+        round_number: int,
+        drawer_id: str,
+        stroke: Dict,
+    ) -> Dict:
+        """
+        Append one stroke delta to the current round
+
+        Args:
+            game_id: Game document ID
+            round_number: Round the stroke belongs to
+            drawer_id: Player ID of the drawer
+            stroke: Stroke data as sent by the client
+
+        Returns:
+            {"seq", "bytes"} of the stored stroke
+
+        Raises:
+            ValueError: Stroke too large or round log full
+        """
+        size = len(json.dumps(stroke, separators=(",", ":")))
+        if size > self.max_stroke_bytes:
+            raise ValueError(f"Stroke too large ({size} B > {self.max_stroke_bytes})")
+
+        canvas = self._round(game_id, round_number, drawer_id)
+        if self.shared:
+            seq = await self._queue_stroke(game_id, round_number, drawer_id, stroke)
+        else:
+            if len(canvas.strokes) >= self.max_strokes_per_round:
+                raise ValueError("Too many strokes this round")
+            seq = canvas.next_seq
+            canvas.next_seq += 1
+            canvas.strokes.append({"seq": seq, "stroke": stroke})
+        canvas.last_update = time.monotonic()
+        canvas.stats["strokes"] += 1
+        canvas.stats["stroke_bytes"] += size
+
+        return {"seq": seq, "bytes": size}
+
+    def set_canvas(
+        self, game_id: str, round_number: int, drawer_id: str, canvas_state: str
+    ) -> None:
+        """Keep the latest full canvas image in memory (legacy clients)"""
+        canvas = self._round(game_id, round_number, drawer_id)
+        canvas.canvas_state = canvas_state
+        if self.shared:
+            # Coalesced: only the latest image of each interval is written
+            self._pending_canvas[game_id] = (round_number, drawer_id, canvas_state)
+            self._canvas_reads[game_id] = (time.monotonic(), canvas_state)
+            if game_id not in self._canvas_flushers:
+                self._canvas_flushers[game_id] = asyncio.get_running_loop().create_task(
+                    self._flush_canvas(game_id)
+                )
+        canvas.last_update = time.monotonic()
+        canvas.stats["canvas_updates"] += 1
+        canvas.stats["canvas_bytes"] += len(canvas_state)
+
+    def record_broadcast(self, game_id: str, nbytes: int) -> None:
+        canvas = self._rounds.get(game_id)
+        if canvas is not None:
+            canvas.stats["broadcast_bytes"] += nbytes
+
+    # ==================== GUESSERS ====================
+
+    async def strokes_since(self, game_id: str, since: int = 0) -> Dict:
+        """
+        Strokes of the current round after a sequence number
+
+        Returns:
+            {"round", "strokes": [{"seq", "stroke"}], "last_seq"}
+        """
+        if self.shared:
+            return await asyncio.to_thread(self._read_strokes, game_id, since)
+
+        canvas = self._rounds.get(game_id)
+        if canvas is None:
+            return {"round": None, "strokes": [], "last_seq": 0}
+
+        # seq n is stored at index n - 1
+        start = max(0, min(since, len(canvas.strokes)))
+        return {
+            "round": canvas.round_number,
+            "strokes": canvas.strokes[start:],
+            "last_seq": canvas.next_seq - 1,
+        }
+
+    async def canvas_state(self, game_id: str) -> Optional[str]:
+        if self.shared:
+            # Polled by every guesser: RTDB is read at most once per write
+            # interval per game (the image is not newer than that anyway)
+            cached = self._canvas_reads.get(game_id)
+            if (
+                cached is not None
+                and time.monotonic() - cached[0] < self.canvas_flush_interval
+            ):
+                return cached[1]
+            image = await asyncio.to_thread(
+                lambda: _ref(f"canvas/{game_id}/canvas_state").get()
+            )
+            self._canvas_reads[game_id] = (time.monotonic(), image)
+            if len(self._canvas_reads) > self.max_games:
+                oldest = min(self._canvas_reads, key=lambda g: self._canvas_reads[g][0])
+                self._canvas_reads.pop(oldest, None)
+            return image
+        canvas = self._rounds.get(game_id)
+        return canvas.canvas_state if canvas is not None else None
+
+    # ==================== ROUND END ====================
+
+    async def end_round(self, game_id: str) -> Optional[Dict]:
+        """
+        Compact and drop the canvas of a finished round
+
+        Returns:
+            Turn document for the "turns" subcollection, or None if nothing
+            was drawn
+        """
+        canvas = self._rounds.pop(game_id, None)
+        if self.shared:
+            self._canvas_reads.pop(game_id, None)
+            canvas = await self._collect_shared(game_id, canvas)
+        if canvas is None or not (canvas.strokes or canvas.canvas_state):
+            return None
+
+        turn = {
+            "round": canvas.round_number,
+            "drawer_id": canvas.drawer_id,
+            "stroke_count": len(canvas.strokes),
+            # Sequence numbers are implied by the order
+            "strokes": [entry["stroke"] for entry in canvas.strokes],
+            "canvas_stats": dict(canvas.stats),
+        }
+        if not canvas.strokes and canvas.canvas_state:
+            turn["canvas_state"] = canvas.canvas_state
+
+        snapshot_bytes = len(json.dumps(turn, default=str))
+        logger.info(
+            f"Canvas of game {game_id} round {canvas.round_number}: "
+            f"{canvas.stats['strokes']} strokes ({canvas.stats['stroke_bytes']} B), "
+            f"{canvas.stats['canvas_updates']} full canvases "
+            f"({canvas.stats['canvas_bytes']} B), "
+            f"{canvas.stats['broadcast_bytes']} B pushed; "
+            f"snapshot of {snapshot_bytes} B"
+        )
+
+        from monitoring import metrics_collector
+
+        metrics_collector.record_canvas_round(
+            strokes=canvas.stats["strokes"],
+            stroke_bytes=canvas.stats["stroke_bytes"],
+            canvas_updates=canvas.stats["canvas_updates"],
+            canvas_bytes=canvas.stats["canvas_bytes"],
+            broadcast_bytes=canvas.stats["broadcast_bytes"],
+            snapshot_bytes=snapshot_bytes,
+        )
+        return turn
+
+    def drop(self, game_id: str) -> None:
+        self._rounds.pop(game_id, None)
+        self._pending_canvas.pop(game_id, None)
+        self._canvas_reads.pop(game_id, None)
+        if self.shared:
+            ref = _ref(f"canvas/{game_id}")
+            asyncio.get_running_loop().create_task(asyncio.to_thread(ref.delete))
+
+    # ==================== SHARED MODE (RTDB) ====================
+
+    async def _queue_stroke(
+        self, game_id: str, round_number: int, drawer_id: str, stroke: Dict
+    ) -> int:
+        """Add a stroke to the game's next RTDB batch; returns its seq"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(game_id, []).append(
+            (round_number, drawer_id, stroke, future)
+        )
+        if game_id not in self._flushers:
+            self._flushers[game_id] = asyncio.get_running_loop().create_task(
+                self._flush_strokes(game_id)
+            )
+        return await future
+
+    async def _flush_strokes(self, game_id: str) -> None:
+        await asyncio.sleep(self.flush_interval)
+        del self._flushers[game_id]
+        batch = self._pending.pop(game_id, [])
+        if not batch:
+            return
+
+        # A batch spans one round and drawer; strays from an older one fail
+        round_number, drawer_id = batch[-1][0], batch[-1][1]
+        current = [b for b in batch if b[:2] == (round_number, drawer_id)]
+        for b in batch:
+            if b[:2] != (round_number, drawer_id):
+                b[3].set_exception(ValueError("Round is over"))
+
+        try:
+            first = await asyncio.to_thread(
+                self._write_strokes,
+                game_id,
+                round_number,
+                drawer_id,
+                [b[2] for b in current],
+            )
+        except Exception as e:
+            for b in current:
+                b[3].set_exception(e)
+            return
+        for offset, b in enumerate(current):
+            b[3].set_result(first + offset)
+
+    def _write_strokes(
+        self, game_id: str, round_number: int, drawer_id: str, strokes: List[Dict]
+    ) -> int:
+        """Allocate seqs for a batch and write it (blocking); returns the first"""
+        allocated = {}
+
+        def allocate(meta):
+            meta = meta or {}
+            reset = (
+                meta.get("round") != round_number or meta.get("drawer_id") != drawer_id
+            )
+            first = 1 if reset else meta.get("next_seq", 1)
+            if first - 1 + len(strokes) > self.max_strokes_per_round:
+                raise ValueError("Too many strokes this round")
+            allocated.update(first=first, reset=reset)
+            return {
+                "round": round_number,
+                "drawer_id": drawer_id,
+                "next_seq": first + len(strokes),
+            }
+
+        root = _ref(f"canvas/{game_id}")
+        root.child("meta").transaction(allocate)
+
+        first = allocated["first"]
+        entries = {_seq_key(first + i): s for i, s in enumerate(strokes)}
+        if allocated["reset"]:
+            # New round or drawer: replace the previous log and image
+            root.update({"strokes": entries, "canvas_state": None})
+        else:
+            root.update({f"strokes/{key}": s for key, s in entries.items()})
+        return first
+
+    def _read_strokes(self, game_id: str, since: int) -> Dict:
+        root = _ref(f"canvas/{game_id}")
+        meta = root.child("meta").get() or {}
+        if not meta:
+            return {"round": None, "strokes": [], "last_seq": 0}
+        entries = (
+            root.child("strokes").order_by_key().start_at(_seq_key(since + 1)).get()
+        ) or {}
+        return {
+            "round": meta.get("round"),
+            "strokes": [
+                {"seq": int(key[1:]), "stroke": stroke}
+                for key, stroke in sorted(entries.items())
+            ],
+            "last_seq": meta.get("next_seq", 1) - 1,
+        }
+
+    async def _flush_canvas(self, game_id: str) -> None:
+        await asyncio.sleep(self.canvas_flush_interval)
+        del self._canvas_flushers[game_id]
+        latest = self._pending_canvas.pop(game_id, None)
+        if latest is None:
+            return
+        round_number, drawer_id, canvas_state = latest
+        try:
+            await asyncio.to_thread(
+                _ref(f"canvas/{game_id}").update,
+                {
+                    "canvas_state": canvas_state,
+                    "canvas_round": round_number,
+                    "canvas_drawer_id": drawer_id,
+                },
+            )
+        except Exception as e:
+            logger.error(f"Canvas write-through of game {game_id} failed: {e}")
+
+    async def _collect_shared(
+        self, game_id: str, local: Optional[_RoundCanvas]
+    ) -> Optional[_RoundCanvas]:
+        """Read and delete the round's RTDB log (the strokes of all instances)"""
+        for flushers in (self._flushers, self._canvas_flushers):
+            task = flushers.get(game_id)
+            if task is not None:
+                await asyncio.wait({task})
+
+        root = _ref(f"canvas/{game_id}")
+        try:
+            node = await asyncio.to_thread(root.get) or {}
+            await asyncio.to_thread(root.delete)
+        except Exception as e:
+            logger.error(f"Reading canvas of game {game_id} failed: {e}")
+            return local
+
+        meta = node.get("meta") or {}
+        if not meta and not node.get("canvas_state"):
+            return local
+
+        canvas = _RoundCanvas(
+            meta.get("round", node.get("canvas_round")),
+            meta.get("drawer_id", node.get("canvas_drawer_id")),
+        )
+        canvas.strokes = [
+            {"seq": int(key[1:]), "stroke": stroke}
+            for key, stroke in sorted((node.get("strokes") or {}).items())
+        ]
+        canvas.canvas_state = node.get("canvas_state")
+        if local is not None:
+            # Only this instance's traffic is known here
+            canvas.stats = local.stats
+        return canvas
+
+    # ==================== INTERNALS ====================
+
+    def _round(
+        self, game_id: str, round_number: int, drawer_id: Optional[str]
+    ) -> _RoundCanvas:
+        """Canvas of the given round (a new round or drawer replaces the log)"""
+        canvas = self._rounds.get(game_id)
+        if (
+            canvas is None
+            or canvas.round_number != round_number
+            or canvas.drawer_id != drawer_id
+        ):
+            canvas = _RoundCanvas(round_number, drawer_id)
+            self._rounds[game_id] = canvas
+
+            if len(self._rounds) > self.max_games:
+                oldest = min(self._rounds, key=lambda g: self._rounds[g].last_update)
+                self._rounds.pop(oldest, None)
+        return canvas
+
+
+def _ref(path: str):
+    # Imported lazily: the RTDB reference needs an initialized app
+    from services.presence_service import get_rtdb
+
+    return get_rtdb().child(path)
+
+
+def _seq_key(seq: int) -> str:
+    """RTDB key of a stroke ("s" prefix: integer keys are read back as arrays)"""
+    return f"s{seq:07d}"
+
+
+# Shared instance used by the guessing game routes. Without owner pinning
+# (GAME_ENGINE_INSTANCES) requests of one game reach any instance, so the
+# canvas is written through to RTDB.
+canvas_sync = CanvasSync(
+    max_strokes_per_round=int(os.getenv("CANVAS_MAX_STROKES_PER_ROUND", "5000")),
+    max_stroke_bytes=int(os.getenv("CANVAS_MAX_STROKE_BYTES", "16384")),
+    shared=os.getenv("CANVAS_SYNC", "auto").lower() == "rtdb"
+    or (
+        os.getenv("CANVAS_SYNC", "auto").lower() == "auto"
+        and not os.getenv("GAME_ENGINE_INSTANCES", "").strip()
+    ),
+    flush_interval=float(os.getenv("CANVAS_FLUSH_INTERVAL", "0.2")),
+    canvas_flush_interval=float(os.getenv("CANVAS_STATE_FLUSH_INTERVAL", "1")),
+)
@@ -0,0 +1,49 @@
+"""
+Pre-shuffled category deck for round categories
+A game stores only {seed, cursor, size}; the permutation is rebuilt from the seed
+
+📝 DEFENSE JUSTIFICATION:
+Picking from "categories not in used_categories" scanned both lists on every
+round and kept ~345 category names in each game document. A seeded
+permutation gives the same no-repeat order for one O(n) shuffle per
+process, then O(1) per round, with three integers stored per game.
+"""
+
+import random
+from functools import lru_cache
+from typing import Dict, Sequence, Tuple
+
+
+def new_deck(size: int) -> Dict:
+    """Fresh deck over `size` categories, positioned on its first card"""
+    return {"seed": random.getrandbits(31), "cursor": 0, "size": size}
+
+
+@lru_cache(maxsize=1024)
+def _permutation(seed: int, size: int) -> Tuple[int, ...]:
+    """Seeded Fisher-Yates shuffle of category indices (cached per game)"""
+    order = list(range(size))
+    random.Random(seed).shuffle(order)
+    return tuple(order)
+
+
+def draw_category(deck: Dict, categories: Sequence[str]) -> Tuple[str, Dict]:
+    """
+    Next category of a deck
+
+    Starts a reshuffled deck once every category has been drawn (or if the
+    category list changed size since the deck was dealt).
+
+    Args:
+        deck: Stored deck ({"seed", "cursor", "size"}), or None
+        categories: Category names the deck indexes into
+
+    Returns:
+        (category, updated deck)
+    """
+    size = len(categories)
+    if not deck or deck.get("size") != size or deck["cursor"] >= size:
+        deck = new_deck(size)
+
+    index = _permutation(deck["seed"], size)[deck["cursor"]]
+    return categories[index], {**deck, "cursor": deck["cursor"] + 1}
@@ -0,0 +1,224 @@
+"""
+Append-only sharded archive of training drawings in object storage
+Drawings are rolled into .npy image blocks with a JSON index per shard
+instead of one small object per drawing
+"""
+
+import io
+import json
+import logging
+import os
+import secrets
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.drawing_codec import DRAWING_BYTES, IMAGE_SIZE, decode_drawings
+
+logger = logging.getLogger(__name__)
+
+# Per-drawing metadata copied into the shard index (one column per field)
+INDEX_FIELDS = ["gameMode", "aiPrediction", "aiConfidence", "wasCorrect"]
+
+
+class DrawingArchive:
+    """
+    Rolls drawings into immutable shards: {prefix}/{name}.npy + {name}.json
+
+    **Behaviour:**
+    - append() buffers drawings (imageBytes + label + metadata); every
+      `shard_size` drawings a shard is written through the storage backend
+    - A shard is an (N, 28, 28) uint8 .npy file (plain header, then
+      contiguous rows) and a JSON index with labels, IDs, metadata and the
+      header length, so drawing i lives at header_bytes + i * 784
+    - Shards are never rewritten; names are time-ordered and carry a random
+      suffix so several instances can archive side by side
+    - Readers load whole shards (through the download cache on remote
+      storage), range-read a slice of one, or mmap it when the backend is a
+      local directory (STORAGE_BACKEND=local)
+
+    📝 DEFENSE JUSTIFICATION:
+    One PNG object per drawing pays per-object request, metadata and listing
+    costs for a few hundred bytes of pixels, and retraining has to fetch them
+    one by one. A 4096-drawing shard is ~3 MB: one write and one read
+    replace thousands, and the arrays load without any image decoding.
+    """
+
+    def __init__(
+        self,
+        storage=None,
+        prefix: str = "archive/drawings",
+        shard_size: int = 4096,
+    ):
+        """
+        Args:
+            storage: Object with async upload_bytes / download_range /
+                list_files (StorageService by default, which follows
+                STORAGE_BACKEND, e.g. local for a directory)
+            prefix: Storage prefix of the shards
+            shard_size: Drawings per shard
+        """
+        self._storage = storage
+        self.prefix = prefix.rstrip("/")
+        self.shard_size = shard_size
+
+        self._images: List[bytes] = []
+        self._index: Dict[str, List] = self._empty_index()
+
+        self.stats = {"archived": 0, "shards": 0, "bytes": 0, "skipped": 0}
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            # Imported lazily: the Firebase bucket needs an initialized app
+            from services.storage_service import StorageService
+
+            self._storage = StorageService
+        return self._storage
+
+    # ==================== WRITING ====================
+
+    async def append(self, drawings: List[Tuple[str, Dict]]) -> int:
+        """
+        Add drawings to the archive, writing full shards as they fill up
+
+        Args:
+            drawings: List of (drawing_id, drawing_data) as stored in Firestore
+
+        Returns:
+            Number of shards written
+        """
+        for drawing_id, data in drawings:
+            image = data.get("imageBytes")
+            if not isinstance(image, bytes) or len(image) != DRAWING_BYTES:
+                self.stats["skipped"] += 1
+                continue
+
+            self._images.append(image)
+            self._index["ids"].append(drawing_id)
+            self._index["labels"].append(data.get("targetCategory"))
+            for field in INDEX_FIELDS:
+                self._index[field].append(data.get(field))
+
+        written = 0
+        while len(self._images) >= self.shard_size:
+            await self._write_shard(self.shard_size)
+            written += 1
+        return written
+
+    async def flush(self) -> Optional[str]:
+        """Write the buffered drawings as a (smaller) shard, e.g. on shutdown"""
+        if not self._images:
+            return None
+        return await self._write_shard(len(self._images))
+
+    @property
+    def buffered(self) -> int:
+        return len(self._images)
+
+    # ==================== READING ====================
+
+    async def list_shards(self) -> List[str]:
+        """Shard names (without extension), oldest first"""
+        paths = await self.storage.list_files(f"{self.prefix}/")
+        return [p[len(self.prefix) + 1 : -5] for p in paths if p.endswith(".json")]
+
+    async def read_index(self, name: str) -> Dict:
+        data = await self.storage.download_range(f"{self.prefix}/{name}.json")
+        return json.loads(data)
+
+    async def read_shard(self, name: str, mmap: bool = True) -> np.ndarray:
+        """
+        All images of a shard as an (N, 28, 28) uint8 array
+
+        A local backend is memory-mapped (read-only) unless mmap=False. Remote
+        shards are immutable, so they are served from the download cache.
+        """
+        path = f"{self.prefix}/{name}.npy"
+        local_path = getattr(self.storage, "local_path", None)
+        if mmap and local_path is not None and local_path(path) is not None:
+            return np.load(local_path(path), mmap_mode="r")
+        if hasattr(self.storage, "download_cached"):
+            data = await self.storage.download_cached(path, version=name)
+        else:
+            data = await self.storage.download_range(path)
+        return np.load(io.BytesIO(data))
+
+    async def read_range(
+        self, name: str, start: int, stop: int, index: Optional[Dict] = None
+    ) -> np.ndarray:
+        """
+        Images [start, stop) of a shard with a single ranged read
+
+        Args:
+            name: Shard name
+            start, stop: Drawing positions in the shard
+            index: The shard's index, if already loaded
+        """
+        index = index or await self.read_index(name)
+        stop = min(stop, index["count"])
+        if start >= stop:
+            return np.empty((0, IMAGE_SIZE, IMAGE_SIZE), dtype=np.uint8)
+
+        offset = index["header_bytes"]
+        data = await self.storage.download_range(
+            f"{self.prefix}/{name}.npy",
+            start=offset + start * DRAWING_BYTES,
+            end=offset + stop * DRAWING_BYTES,
+        )
+        return decode_drawings([data])
+
+    # ==================== INTERNALS ====================
+
+    @staticmethod
+    def _empty_index() -> Dict[str, List]:
+        return {"ids": [], "labels": [], **{field: [] for field in INDEX_FIELDS}}
+
+    async def _write_shard(self, count: int) -> str:
+        """Write the first `count` buffered drawings as one shard"""
+        images = decode_drawings(self._images[:count])
+        buffer = io.BytesIO()
+        np.save(buffer, images, allow_pickle=False)
+        npy = buffer.getvalue()
+
+        name = (
+            f"shard-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}"
+            f"-{time.time_ns() % 1_000_000_000:09d}-{secrets.token_hex(3)}"
+        )
+        index = {
+            "name": name,
+            "count": count,
+            "shape": list(images.shape),
+            "dtype": "uint8",
+            "header_bytes": len(npy) - images.nbytes,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            **{key: values[:count] for key, values in self._index.items()},
+        }
+
+        # Images first: an index is only visible once its data exists
+        await self.storage.upload_bytes(
+            f"{self.prefix}/{name}.npy", npy, content_type="application/octet-stream"
+        )
+        await self.storage.upload_bytes(
+            f"{self.prefix}/{name}.json",
+            json.dumps(index, default=str).encode(),
+            content_type="application/json",
+        )
+
+        del self._images[:count]
+        for values in self._index.values():
+            del values[:count]
+
+        self.stats["archived"] += count
+        self.stats["shards"] += 1
+        self.stats["bytes"] += len(npy)
+        logger.info(f"Archived {count} drawings to shard {name} ({len(npy)} B)")
+        return name
+
+
+# Shared instance fed by the drawing write-behind buffer
+drawing_archive = DrawingArchive(
+    shard_size=int(os.getenv("DRAWING_ARCHIVE_SHARD_SIZE", "4096")),
+)
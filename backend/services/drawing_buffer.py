@@ -0,0 +1,301 @@
+"""
+Write-behind buffer for active learning drawing saves
+Accepts drawings immediately and flushes them to Firestore in batched writes
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import secrets
+import string
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from services.drawing_archive import drawing_archive
+from services.firestore_service import FirestoreService, FIRESTORE_BATCH_LIMIT
+
+logger = logging.getLogger(__name__)
+
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+
+
+def _encode_bytes(value):
+    """JSON encoder for bytes fields (imageBytes) in spill files"""
+    if isinstance(value, bytes):
+        return {"$bytes": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode_bytes(obj: Dict):
+    if len(obj) == 1 and "$bytes" in obj:
+        return base64.b64decode(obj["$bytes"])
+    return obj
+
+
+def _auto_id() -> str:
+    """Generate a 20-character Firestore-style document ID without a client"""
+    return "".join(secrets.choice(_AUTO_ID_CHARS) for _ in range(20))
+
+
+class DrawingWriteBuffer:
+    """
+    In-process write-behind queue for user drawings
+
+    **Behaviour:**
+    - enqueue() assigns the document ID and returns immediately
+    - A background task flushes up to 500 drawings per batch commit, either
+      when a full batch is pending (size trigger) or every flush_interval
+      seconds (time trigger)
+    - Memory is bounded by max_pending: older drawings spill to disk
+    - Failed commits spill to disk and are replayed once Firestore recovers
+    - stop() drains everything (to Firestore or to disk) on shutdown
+
+    📝 DEFENSE JUSTIFICATION:
+    A synchronous Firestore set() costs one network round trip on the
+    user-visible latency path of /drawings/save and of a race round win.
+    Training data tolerates a few seconds of delay, so writes are batched
+    (1 commit per 500 drawings instead of 500 round trips).
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = FIRESTORE_BATCH_LIMIT,
+        flush_interval: float = 2.0,
+        max_pending: int = 5000,
+        spill_dir: str = "./data/drawing_spill",
+        archive=None,
+    ):
+        self.max_batch_size = min(max_batch_size, FIRESTORE_BATCH_LIMIT)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spill_dir = spill_dir
+        # Optional DrawingArchive fed with every committed batch
+        self.archive = archive
+
+        self._pending: Deque[Tuple[str, Dict]] = deque()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._retry_at = 0.0  # Monotonic time before which commits are skipped
+
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "failures": 0,
+        }
+
+    # ==================== LIFECYCLE ====================
+
+    def start(self) -> None:
+        """Start the background flush task on the running event loop"""
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(
+                f"Drawing write buffer started (batch={self.max_batch_size}, "
+                f"interval={self.flush_interval}s, max_pending={self.max_pending})"
+            )
+
+    async def stop(self) -> None:
+        """Drain pending drawings and stop the background task"""
+        self._closing = True
+        self._wakeup.set()
+
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+        # Anything still pending (e.g. Firestore down) must not be lost
+        if self._pending:
+            self._spill(list(self._pending))
+            self._pending.clear()
+
+        if self.archive is not None:
+            try:
+                await self.archive.flush()
+            except Exception as e:
+                logger.error(f"Error writing the last archive shard: {e}")
+
+        logger.info(f"Drawing write buffer stopped: {self.stats}")
+
+    # ==================== PRODUCER ====================
+
+    def enqueue(self, drawing_data: Dict) -> str:
+        """
+        Queue a drawing for a batched Firestore write
+
+        Args:
+            drawing_data: Drawing document (see FirestoreService.save_user_drawing)
+
+        Returns:
+            Document ID the drawing will be stored under
+        """
+        doc_id = _auto_id()
+        self._pending.append((doc_id, drawing_data))
+        self.stats["enqueued"] += 1
+
+        # Bounded memory: move the oldest full batch to disk
+        if len(self._pending) > self.max_pending:
+            overflow = [
+                self._pending.popleft()
+                for _ in range(min(self.max_batch_size, len(self._pending)))
+            ]
+            self._spill(overflow)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._wakeup.set()
+
+        # Start lazily if the app startup hook did not run (e.g. scripts),
+        # or again if the flush task died
+        if self._task is None or (self._task.done() and not self._closing):
+            self.start()
+
+        return doc_id
+
+    @property
+    def pending_count(self) -> int:
+        """Number of drawings held in memory"""
+        return len(self._pending)
+
+    # ==================== CONSUMER ====================
+
+    async def _run(self) -> None:
+        """Flush loop: wake up on size trigger or every flush_interval seconds"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush(force=self._closing)
+            except Exception as e:
+                # e.g. an unreadable spill directory: keep the loop alive
+                self.stats["failures"] += 1
+                self._retry_at = time.monotonic() + max(self.flush_interval, 5.0) * 3
+                logger.error(f"Drawing buffer flush failed: {e}")
+
+            if self._closing:
+                return
+
+    async def flush(self, force: bool = False) -> int:
+        """
+        Write pending drawings to Firestore in batches
+
+        Args:
+            force: Ignore the retry backoff (used when draining on shutdown)
+
+        Returns:
+            Number of drawings written
+        """
+        async with self._flush_lock:
+            if not force and time.monotonic() < self._retry_at:
+                return 0
+
+            written = 0
+            while self._pending:
+                count = min(self.max_batch_size, len(self._pending))
+                batch = [self._pending.popleft() for _ in range(count)]
+
+                if not await self._commit(batch):
+                    self._spill(batch)
+                    return written
+                written += len(batch)
+
+            # Firestore is reachable: replay one spilled batch per cycle
+            if not self._closing:
+                written += await self._replay_one_spill_file()
+
+            return written
+
+    async def _commit(self, batch: List[Tuple[str, Dict]]) -> bool:
+        """Commit one batch off the event loop; back off on failure"""
+        try:
+            await asyncio.to_thread(FirestoreService.write_user_drawings_batch, batch)
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+        except Exception as e:
+            self.stats["failures"] += 1
+            self._retry_at = time.monotonic() + max(self.flush_interval, 5.0) * 3
+            logger.error(f"Error flushing {len(batch)} drawings to Firestore: {e}")
+            return False
+
+        if self.archive is not None:
+            try:
+                await self.archive.append(batch)
+            except Exception as e:
+                # Kept in the archive's buffer and retried with the next shard
+                logger.error(f"Error archiving {len(batch)} drawings: {e}")
+        return True
+
+    # ==================== SPILL TO DISK ====================
+
+    def _spill(self, batch: List[Tuple[str, Dict]]) -> None:
+        """Append a batch to a JSON Lines spill file"""
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(
+                self.spill_dir, f"drawings-{time.time_ns()}-{len(batch)}.jsonl"
+            )
+            with open(path, "w") as f:
+                for doc_id, drawing_data in batch:
+                    record = {"id": doc_id, "data": drawing_data}
+                    f.write(json.dumps(record, default=_encode_bytes) + "\n")
+            self.stats["spilled"] += len(batch)
+            logger.warning(f"Spilled {len(batch)} drawings to {path}")
+        except Exception as e:
+            logger.error(f"Error spilling {len(batch)} drawings to disk: {e}")
+
+    async def _replay_one_spill_file(self) -> int:
+        """Commit the oldest spill file and delete it on success"""
+        if not os.path.isdir(self.spill_dir):
+            return 0
+
+        spill_files = sorted(
+            f for f in os.listdir(self.spill_dir) if f.endswith(".jsonl")
+        )
+        if not spill_files:
+            return 0
+
+        path = os.path.join(self.spill_dir, spill_files[0])
+        try:
+            with open(path) as f:
+                records = [
+                    json.loads(line, object_hook=_decode_bytes)
+                    for line in f
+                    if line.strip()
+                ]
+        except Exception as e:
+            logger.error(f"Unreadable spill file {path}, skipping: {e}")
+            os.replace(path, path + ".bad")
+            return 0
+
+        batch = [(r["id"], r["data"]) for r in records]
+        if not await self._commit(batch):
+            return 0
+
+        os.remove(path)
+        self.stats["replayed"] += len(batch)
+        logger.info(f"Replayed {len(batch)} spilled drawings from {path}")
+        return len(batch)
+
+
+# Shared instance used by the API endpoints
+drawing_buffer = DrawingWriteBuffer(
+    flush_interval=float(os.getenv("DRAWING_FLUSH_INTERVAL", "2.0")),
+    max_pending=int(os.getenv("DRAWING_BUFFER_MAX_PENDING", "5000")),
+    spill_dir=os.getenv("DRAWING_SPILL_DIR", "./data/drawing_spill"),
+    archive=(
+        drawing_archive
+        if os.getenv("DRAWING_ARCHIVE", "false").lower() == "true"
+        else None
+    ),
+)
@@ -5,12 +5,55 @@ Handles CRUD operations for corrections, sessions, users, and games
 
 from firebase_admin import firestore
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from google.cloud.firestore_v1.transforms import ArrayUnion, Sentinel
 
 
 # Firestore client will be initialized lazily
 _db = None
 
+# Fields needed to render a lobby card. Heavy fields (canvas_state,
+# team_ai.predictions, settings.categories) are never sent to the lobby list.
+LOBBY_FIELDS = [
+    "game_type",
+    "status",
+    "room_code",
+    "creator_id",
+    "max_players",
+    "players",
+    "current_round",
+    "max_rounds",
+    "created_at",
+    "settings.max_rounds",
+    "settings.round_duration",
+    "settings.target_confidence",
+    "settings.ai_confidence_threshold",
+]
+
+# Fields the retraining pipeline actually reads from a user drawing
+# (imageBase64 only exists on drawings saved before imageBytes)
+TRAINING_DRAWING_FIELDS = [
+    "imageBytes",
+    "imageFormat",
+    "imageBase64",
+    "targetCategory",
+]
+
+# Fields used to aggregate per-category training statistics
+DRAWING_STATS_FIELDS = ["targetCategory", "aiConfidence"]
+
+# Drawings fetched per round trip when paging through training data
+TRAINING_PAGE_SIZE = 500
+
+# Largest page a caller may request from our list queries and endpoints
+MAX_PAGE_SIZE = 100
+
+# Maximum number of writes in a single Firestore batch
+FIRESTORE_BATCH_LIMIT = 500
+
+# Returned by a transition instead of field updates to delete the game
+DELETE_GAME = object()
+
 
 def get_db():
     """Lazy initialization of Firestore client"""
@@ -20,6 +63,34 @@ def get_db():
     return _db
 
 
+def estimate_firestore_size(value: Any) -> int:
+    """
+    Estimate the stored size of a Firestore value in bytes
+
+    Follows the documented storage size rules: strings are UTF-8 bytes + 1,
+    numbers/timestamps 8, booleans/null 1, maps sum key + value sizes.
+    Write transforms count as the values they carry.
+    """
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime, Sentinel)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, ArrayUnion):
+        return sum(estimate_firestore_size(v) for v in value.values)
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_firestore_size(v) for v in value)
+    if isinstance(value, dict):
+        return sum(
+            estimate_firestore_size(str(k)) + estimate_firestore_size(v)
+            for k, v in value.items()
+        )
+    return 8
+
+
 class FirestoreService:
     """Service class for Firestore operations"""
 
@@ -83,6 +154,7 @@ class FirestoreService:
             get_db()
             .collection("corrections")
             .where("modelVersion", "==", model_version)
+            .select([])
             .stream()
         )
 
@@ -166,20 +238,26 @@ class FirestoreService:
         doc_ref.update(update_data)
 
     @staticmethod
-    async def create_game(game_data: Dict) -> str:
+    async def create_game(game_data: Dict, game_id: Optional[str] = None) -> str:
         """
         Create a new multiplayer game
 
         Args:
             game_data: Game configuration
+            game_id: Document ID to use (see new_game_id); auto-generated if None
 
         Returns:
             Document ID of the created game
         """
-        doc_ref = get_db().collection("games").document()
+        doc_ref = get_db().collection("games").document(game_id)
         doc_ref.set({**game_data, "createdAt": firestore.SERVER_TIMESTAMP})
         return doc_ref.id
 
+    @staticmethod
+    def new_game_id() -> str:
+        """Allocate a game document ID client-side (no network call)"""
+        return get_db().collection("games").document().id
+
     @staticmethod
     async def get_game(game_id: str) -> Optional[Dict]:
         """
@@ -210,7 +288,82 @@ class FirestoreService:
             update_data: Data to update
         """
         doc_ref = get_db().collection("games").document(game_id)
-        doc_ref.update(update_data)
+        result = doc_ref.update(update_data)
+
+        # Keep cached reads consistent with our own writes
+        from services.game_cache import game_cache
+
+        game_cache.note_write(game_id, result.update_time)
+
+    @staticmethod
+    async def run_game_transaction(
+        game_id: str,
+        transition: Callable[[Optional[Dict]], Tuple[Dict[str, Any], Any]],
+        action: str = "update",
+    ) -> Any:
+        """
+        Apply a game action atomically with field-path updates
+
+        The game is read inside a Firestore transaction and passed to
+        transition, which returns (field_updates, result). Only the returned
+        field paths are written. The transition may run several times if
+        the transaction is retried after contention, so it must not have
+        side effects; raising aborts the transaction. Returning DELETE_GAME
+        instead of field updates deletes the game document.
+
+        Args:
+            game_id: Game document ID
+            transition: Function (game or None) -> (field_updates, result)
+            action: Action name used for write-size metrics
+
+        Returns:
+            The result returned by the last run of transition
+        """
+        from monitoring import metrics_collector
+        from services.game_cache import game_cache
+
+        db = get_db()
+        doc_ref = db.collection("games").document(game_id)
+        outcome = {}
+
+        @firestore.transactional
+        def _apply(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            game = None
+            if snapshot.exists:
+                game = snapshot.to_dict()
+                game["id"] = snapshot.id
+                outcome["document_bytes"] = estimate_firestore_size(game)
+
+            field_updates, result = transition(game)
+            if field_updates is DELETE_GAME:
+                transaction.delete(doc_ref)
+            elif field_updates:
+                transaction.update(doc_ref, field_updates)
+            outcome["field_updates"] = field_updates
+            return result
+
+        transaction = db.transaction()
+        result = _apply(transaction)
+
+        field_updates = outcome.get("field_updates")
+        if field_updates is DELETE_GAME:
+            game_cache.evict(game_id)
+        elif field_updates:
+            # Commit time of our write, so older listener snapshots stay stale
+            update_time = (
+                transaction.write_results[0].update_time
+                if transaction.write_results
+                else transaction.commit_time
+            )
+            game_cache.note_write(game_id, update_time)
+            metrics_collector.record_game_write(
+                action,
+                bytes_written=estimate_firestore_size(field_updates),
+                full_document_bytes=outcome.get("document_bytes", 0),
+            )
+
+        return result
 
     @staticmethod
     async def add_game_turn(game_id: str, turn_data: Dict) -> str:
@@ -292,21 +445,38 @@ class FirestoreService:
         return None
 
     @staticmethod
-    def get_games_by_status(status: str, game_type: Optional[str] = None) -> List[Dict]:
+    def _games_query(
+        status: str, game_type: Optional[str] = None, fields: Optional[List[str]] = None
+    ):
+        """Build the games query shared by the listing methods"""
+        query = get_db().collection("games").where("status", "==", status)
+
+        if game_type:
+            query = query.where("game_type", "==", game_type)
+
+        if fields is not None:
+            query = query.select(fields)
+
+        return query
+
+    @staticmethod
+    def get_games_by_status(
+        status: str,
+        game_type: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Dict]:
         """
         Get games by status and optionally by game type
 
         Args:
             status: Game status (waiting, playing, finished)
             game_type: Optional game type filter (race, guessing)
+            fields: Optional projection (e.g. LOBBY_FIELDS); full documents if None
 
         Returns:
             List of games
         """
-        query = get_db().collection("games").where("status", "==", status)
-
-        if game_type:
-            query = query.where("game_type", "==", game_type)
+        query = FirestoreService._games_query(status, game_type, fields)
 
         games = []
         for doc in query.stream():
@@ -316,6 +486,44 @@ class FirestoreService:
 
         return games
 
+    @staticmethod
+    def get_games_page(
+        status: str,
+        game_type: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        page_size: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Dict:
+        """
+        Get one page of games by status, ordered by document ID
+
+        Args:
+            status: Game status (waiting, playing, finished)
+            game_type: Optional game type filter (race, guessing)
+            fields: Optional projection (e.g. LOBBY_FIELDS); full documents if None
+            page_size: Number of games per page (capped at MAX_PAGE_SIZE)
+            cursor: ID of the last game of the previous page
+
+        Returns:
+            Dict with "games" and "next_cursor" (None on the last page)
+        """
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        query = FirestoreService._games_query(status, game_type, fields).order_by(
+            "__name__"
+        )
+
+        if cursor:
+            query = query.start_after({"__name__": cursor})
+
+        games = []
+        for doc in query.limit(page_size).stream():
+            data = doc.to_dict()
+            data["id"] = doc.id
+            games.append(data)
+
+        next_cursor = games[-1]["id"] if len(games) == page_size else None
+        return {"games": games, "next_cursor": next_cursor}
+
     # ==================== USER DRAWINGS FOR ACTIVE LEARNING ====================
 
     @staticmethod
@@ -325,7 +533,8 @@ class FirestoreService:
 
         Args:
             drawing_data: Dictionary containing:
-                - imageBase64: Base64 encoded 28x28 image
+                - imageBytes: 784 raw bytes of the 28x28 image (drawing_codec)
+                - imageFormat: Format of imageBytes ("u8-28x28")
                 - targetCategory: The category the user was supposed to draw
                 - aiPrediction: What the AI predicted
                 - aiConfidence: AI confidence score
@@ -348,31 +557,105 @@ class FirestoreService:
         return doc_ref.id
 
     @staticmethod
-    async def get_drawings_for_training(limit: int = 5000) -> List[Dict]:
+    def write_user_drawings_batch(drawings: List[Tuple[str, Dict]]) -> int:
+        """
+        Write pre-allocated user drawings in batched commits (blocking)
+
+        Used by the write-behind buffer, which runs this off the event loop.
+
+        Args:
+            drawings: List of (document_id, drawing_data) tuples
+
+        Returns:
+            Number of drawings written
+        """
+        collection = get_db().collection("user_drawings")
+        count = 0
+
+        for start in range(0, len(drawings), FIRESTORE_BATCH_LIMIT):
+            batch = get_db().batch()
+            for doc_id, drawing_data in drawings[start : start + FIRESTORE_BATCH_LIMIT]:
+                batch.set(
+                    collection.document(doc_id),
+                    {
+                        **drawing_data,
+                        "usedForTraining": False,
+                        "createdAt": firestore.SERVER_TIMESTAMP,
+                    },
+                )
+                count += 1
+            batch.commit()
+
+        return count
+
+    @staticmethod
+    async def get_drawings_for_training(
+        limit: int = 5000, fields: Optional[List[str]] = TRAINING_DRAWING_FIELDS
+    ) -> List[Dict]:
         """
         Fetch user drawings that haven't been used for training yet
 
         Args:
             limit: Maximum number of drawings to fetch
+            fields: Projection to fetch (TRAINING_DRAWING_FIELDS by default,
+                None for full documents)
 
         Returns:
             List of drawing documents
         """
+        drawings = []
+        cursor = None
+        while len(drawings) < limit:
+            page = await FirestoreService.get_drawings_page(
+                page_size=min(TRAINING_PAGE_SIZE, limit - len(drawings)),
+                cursor=cursor,
+                fields=fields,
+            )
+            drawings.extend(page["drawings"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        return drawings
+
+    @staticmethod
+    async def get_drawings_page(
+        page_size: int = 500,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = TRAINING_DRAWING_FIELDS,
+    ) -> Dict:
+        """
+        Fetch one page of unused user drawings, ordered by document ID
+
+        Args:
+            page_size: Number of drawings per page
+            cursor: ID of the last drawing of the previous page
+            fields: Projection to fetch (None for full documents)
+
+        Returns:
+            Dict with "drawings" and "next_cursor" (None on the last page)
+        """
         query = (
             get_db()
             .collection("user_drawings")
             .where("usedForTraining", "==", False)
-            .limit(limit)
-            .stream()
+            .order_by("__name__")
         )
 
+        if fields is not None:
+            query = query.select(fields)
+
+        if cursor:
+            query = query.start_after({"__name__": cursor})
+
         drawings = []
-        for doc in query:
+        for doc in query.limit(page_size).stream():
             data = doc.to_dict()
             data["id"] = doc.id
             drawings.append(data)
 
-        return drawings
+        next_cursor = drawings[-1]["id"] if len(drawings) == page_size else None
+        return {"drawings": drawings, "next_cursor": next_cursor}
 
     @staticmethod
     async def get_new_drawings_count() -> int:
@@ -382,10 +665,12 @@ class FirestoreService:
         Returns:
             Number of new drawings available
         """
+        # Empty projection: only document keys are transferred
         query = (
             get_db()
             .collection("user_drawings")
             .where("usedForTraining", "==", False)
+            .select([])
             .stream()
         )
 
@@ -411,12 +696,12 @@ class FirestoreService:
             count += 1
 
             # Firestore batch limit is 500
-            if count % 500 == 0:
+            if count % FIRESTORE_BATCH_LIMIT == 0:
                 batch.commit()
                 batch = get_db().batch()
 
         # Commit remaining
-        if count % 500 != 0:
+        if count % FIRESTORE_BATCH_LIMIT != 0:
             batch.commit()
 
         return count
@@ -433,6 +718,7 @@ class FirestoreService:
             get_db()
             .collection("user_drawings")
             .where("usedForTraining", "==", False)
+            .select(DRAWING_STATS_FIELDS)
             .stream()
         )
 
@@ -0,0 +1,287 @@
+"""
+Read-through cache for live game documents
+Kept fresh by one Firestore snapshot listener per cached game
+"""
+
+import asyncio
+import copy
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from services.firestore_service import FirestoreService, get_db
+from services.game_events import RESYNC, game_events
+
+logger = logging.getLogger(__name__)
+
+
+def _diff(old: Dict, new: Dict) -> Dict[Tuple[str, ...], Any]:
+    """
+    Changed field paths between two versions of a game document, as
+    {path_tuple: new_value}; maps are compared one level deep
+    """
+    changes = {}
+    for key in set(old) | set(new):
+        if key == "id" or old.get(key) == new.get(key):
+            continue
+        before, after = old.get(key), new.get(key)
+        if isinstance(before, dict) and isinstance(after, dict):
+            for sub in set(before) | set(after):
+                if before.get(sub) != after.get(sub):
+                    changes[(key, sub)] = after.get(sub)
+        else:
+            changes[(key,)] = after
+    return changes
+
+
+class _CacheEntry:
+    """Cached game document plus its listener state"""
+
+    __slots__ = (
+        "data",
+        "update_time",
+        "min_update_time",
+        "own_writes",
+        "watch",
+        "last_read",
+    )
+
+    def __init__(self):
+        self.data: Optional[Dict] = None
+        self.update_time = None  # update_time of the snapshot held in data
+        self.min_update_time = None  # Our last write; older snapshots are stale
+        self.own_writes: set = set()  # Already published by this instance
+        self.watch = None
+        self.last_read = time.monotonic()
+
+    @property
+    def fresh(self) -> bool:
+        if self.data is None:
+            return False
+        if self.min_update_time is None:
+            return True
+        return self.update_time is not None and self.update_time >= self.min_update_time
+
+
+class GameCache:
+    """
+    In-process cache of live (waiting/playing) game documents
+
+    **Behaviour:**
+    - get_game() serves from memory when the cached snapshot is fresh,
+      otherwise reads Firestore and (re)attaches a snapshot listener
+    - The listener replaces the cached document on every remote change, so
+      polling GET /games/race/{id} costs no Firestore reads
+    - note_write() marks the entry stale until the listener delivers a
+      snapshot at least as new as our own write (read-your-writes)
+    - Changes made by other instances are diffed against the cached
+      document and published to this instance's game_events subscribers
+      (our own writes were already published by the route that made them)
+    - Listeners are torn down when the game finishes, is deleted, or has
+      not been read for idle_timeout seconds and has no subscribers
+
+    📝 DEFENSE JUSTIFICATION:
+    Clients poll game state every second or so; each poll used to be a
+    Firestore document read. A listener is billed per changed document,
+    which is bounded by the number of game actions, not by poll rate.
+    """
+
+    def __init__(self, max_games: int = 500, idle_timeout: float = 300.0):
+        self.max_games = max_games
+        self.idle_timeout = idle_timeout
+
+        self._entries: Dict[str, _CacheEntry] = {}
+        # Listener callbacks run on Firestore's background threads
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.stats = {"hits": 0, "misses": 0, "listeners_started": 0, "evictions": 0}
+
+    async def get_game(self, game_id: str) -> Optional[Dict]:
+        """
+        Get game by ID, from memory when possible
+
+        Args:
+            game_id: Game document ID
+
+        Returns:
+            Game data (a private copy the caller may mutate) or None
+        """
+        self._loop = asyncio.get_running_loop()
+        self._sweep_idle()
+
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is not None and entry.fresh:
+                entry.last_read = time.monotonic()
+                self.stats["hits"] += 1
+                return copy.deepcopy(entry.data)
+
+        self.stats["misses"] += 1
+        game = await FirestoreService.get_game(game_id)
+
+        if game is None or game.get("status") == "finished":
+            self.evict(game_id)
+            return game
+
+        self._store(game_id, game)
+        return game
+
+    def note_write(self, game_id: str, update_time=None) -> None:
+        """
+        Record a write made by this instance
+
+        Reads go to Firestore until the listener has delivered a snapshot at
+        least as recent as update_time (or any snapshot if it is unknown).
+
+        Args:
+            game_id: Game document ID
+            update_time: WriteResult.update_time of the write, if available
+        """
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None:
+                return
+            if update_time is None:
+                entry.data = None
+                return
+            entry.own_writes.add(update_time)
+            if entry.min_update_time is None or update_time > entry.min_update_time:
+                entry.min_update_time = update_time
+
+    def evict(self, game_id: str) -> None:
+        """Drop a game from the cache and stop its listener"""
+        with self._lock:
+            entry = self._entries.pop(game_id, None)
+        if entry is not None:
+            self.stats["evictions"] += 1
+            self._close_watch(entry.watch)
+
+    def clear(self) -> None:
+        """Drop every cached game (used on shutdown)"""
+        for game_id in list(self._entries):
+            self.evict(game_id)
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    # ==================== INTERNALS ====================
+
+    def _store(self, game_id: str, game: Dict) -> None:
+        """Cache a freshly read document and make sure it has a listener"""
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None:
+                entry = _CacheEntry()
+                self._entries[game_id] = entry
+            # A direct read is at least as new as any write we made before it
+            entry.data = copy.deepcopy(game)
+            entry.update_time = entry.min_update_time
+            entry.last_read = time.monotonic()
+            needs_watch = entry.watch is None
+
+        if needs_watch:
+            self._start_watch(game_id, entry)
+
+        if len(self._entries) > self.max_games:
+            unwatched = [
+                item
+                for item in self._entries.items()
+                if not game_events.subscriber_count(item[0])
+            ]
+            if unwatched:
+                oldest = min(unwatched, key=lambda item: item[1].last_read)
+                self.evict(oldest[0])
+
+    def _publish_remote(self, game_id: str, old: Optional[Dict], new: Dict) -> None:
+        """Forward another instance's change to local subscribers (any thread)"""
+        if self._loop is None or not game_events.subscriber_count(game_id):
+            return
+        if old is None:
+            # Nothing to diff against: subscribers reload the full state
+            self._loop.call_soon_threadsafe(game_events.publish_frame, game_id, RESYNC)
+            return
+        changes = _diff(old, new)
+        if changes:
+            self._loop.call_soon_threadsafe(
+                game_events.publish_changes, game_id, "remote_update", changes
+            )
+
+    def _start_watch(self, game_id: str, entry: _CacheEntry) -> None:
+        """Attach a snapshot listener to one game document"""
+
+        def on_snapshot(doc_snapshots, changes, read_time):
+            snapshot = doc_snapshots[0] if doc_snapshots else None
+
+            if snapshot is None or not snapshot.exists:
+                if self._entries.get(game_id) is entry and self._loop is not None:
+                    self._loop.call_soon_threadsafe(
+                        game_events.publish, game_id, "game_deleted", {}
+                    )
+                self.evict(game_id)
+                return
+
+            data = snapshot.to_dict()
+            data["id"] = snapshot.id
+
+            with self._lock:
+                if self._entries.get(game_id) is not entry:
+                    return
+                own = snapshot.update_time in entry.own_writes
+                # Writes up to this snapshot are applied or superseded
+                entry.own_writes = {
+                    t for t in entry.own_writes if t > snapshot.update_time
+                }
+                old = entry.data
+                entry.data = data
+                entry.update_time = snapshot.update_time
+
+            if not own:
+                self._publish_remote(game_id, old, data)
+
+            if data.get("status") == "finished":
+                self.evict(game_id)
+
+        try:
+            doc_ref = get_db().collection("games").document(game_id)
+            entry.watch = doc_ref.on_snapshot(on_snapshot)
+            self.stats["listeners_started"] += 1
+        except Exception as e:
+            # Without a listener the entry can never be trusted
+            logger.error(f"Error starting listener for game {game_id}: {e}")
+            with self._lock:
+                self._entries.pop(game_id, None)
+
+    def _sweep_idle(self) -> None:
+        """Tear down listeners of games nobody has read recently"""
+        now = time.monotonic()
+        if now - self._last_sweep < 30:
+            return
+        self._last_sweep = now
+
+        with self._lock:
+            idle = [
+                game_id
+                for game_id, entry in self._entries.items()
+                if now - entry.last_read > self.idle_timeout
+                and not game_events.subscriber_count(game_id)
+            ]
+        for game_id in idle:
+            self.evict(game_id)
+
+    @staticmethod
+    def _close_watch(watch) -> None:
+        """Unsubscribe without blocking (may be called from a listener thread)"""
+        if watch is not None:
+            threading.Thread(target=watch.unsubscribe, daemon=True).start()
+
+
+# Shared instance used by the game routes
+game_cache = GameCache(
+    max_games=int(os.getenv("GAME_CACHE_MAX_GAMES", "500")),
+    idle_timeout=float(os.getenv("GAME_CACHE_IDLE_TIMEOUT", "300")),
+)
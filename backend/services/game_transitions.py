@@ -0,0 +1,340 @@
+"""
+Game state transitions shared by Race Mode and Guessing Game
+Every game action is expressed as a minimal set of field-path updates
+"""
+
+import os
+import random
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from config import CATEGORIES
+from services.category_deck import draw_category
+
+# A field is either a dotted path ("team_ai.score") or a tuple of raw keys
+# (("round_submissions", player_id)) for keys that need quoting.
+FieldKey = Union[str, Tuple[str, ...]]
+
+# Latest AI predictions kept per round (0 keeps none); win checks only read
+# the team_ai.best_confidence summary
+AI_PREDICTION_HISTORY = int(os.getenv("AI_PREDICTION_HISTORY", "10"))
+
+
+def _split(key: FieldKey) -> Tuple[str, ...]:
+    return tuple(key.split(".")) if isinstance(key, str) else tuple(key)
+
+
+def _to_path(parts: Tuple[str, ...]) -> str:
+    return FieldPath(*parts).to_api_repr()
+
+
+def _local_value(value: Any) -> Any:
+    """Resolve write sentinels for the local mirror of the game"""
+    if value is firestore.SERVER_TIMESTAMP:
+        return datetime.utcnow()
+    return value
+
+
+class GameUpdate:
+    """
+    Field-path updates for one game action
+
+    Each change is recorded as a Firestore field path and mirrored onto the
+    local game dict, so the caller can build its response from the new
+    state without re-reading the document.
+    """
+
+    def __init__(self, game: Dict):
+        self.game = game
+        self.fields: Dict[str, Any] = {}
+
+    def set(self, key: FieldKey, value: Any) -> None:
+        """Set one field (nested maps are addressed with dotted paths)"""
+        parts = _split(key)
+        self.fields[_to_path(parts)] = value
+
+        target = self.game
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = _local_value(value)
+
+    def append(self, key: FieldKey, item: Any) -> None:
+        """Append to an array field without rewriting the whole array"""
+        parts = _split(key)
+        path = _to_path(parts)
+
+        target = self.game
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target.setdefault(parts[-1], []).append(item)
+
+        if isinstance(self.fields.get(path), list):
+            # Array was already replaced in this update: send the final value
+            self.fields[path] = list(target[parts[-1]])
+        else:
+            self.fields[path] = firestore.ArrayUnion([item])
+
+    def __bool__(self) -> bool:
+        return bool(self.fields)
+
+
+def changed_values(game: Dict, fields: Dict[str, Any]) -> Dict[Tuple[str, ...], Any]:
+    """
+    Resolve field-path updates to their new values in the mirrored game
+
+    Write sentinels (SERVER_TIMESTAMP, ArrayUnion) are replaced by the value
+    they produced locally, so the result can be sent to clients as is.
+    """
+    changes = {}
+    for path in fields:
+        parts = tuple(FieldPath.from_string(path).parts)
+        value = game
+        for part in parts:
+            value = value.get(part) if isinstance(value, dict) else None
+        changes[parts] = value
+    return changes
+
+
+# ==================== ROUNDS ====================
+
+
+def game_categories(game: Dict) -> List[str]:
+    """Categories a game draws from: custom settings or the model's classes"""
+    return game.get("settings", {}).get("categories") or CATEGORIES
+
+
+def pick_next_category(update: GameUpdate) -> str:
+    """Draw the category of the next round from the game's deck"""
+    game = update.game
+    category, deck = draw_category(game.get("category_deck"), game_categories(game))
+
+    if (game.get("category_deck") or {}).get("seed") == deck["seed"]:
+        update.set("category_deck.cursor", deck["cursor"])
+    else:
+        update.set("category_deck", deck)  # New (or reshuffled) deck
+
+    return category
+
+
+def start_round(update: GameUpdate, round_number: int) -> str:
+    """
+    Start a round: new category, timer reset and per-mode round state
+
+    Returns:
+        The category of the new round
+    """
+    game = update.game
+    category = pick_next_category(update)
+
+    update.set("current_round", round_number)
+    update.set("current_category", category)
+    update.set("round_start_time", firestore.SERVER_TIMESTAMP)
+
+    if game["game_type"] == "race":
+        update.set("round_submissions", {})  # Reset submissions for new round
+    else:
+        drawer = random.choice(game["players"])
+        update.set(
+            "current_drawer",
+            {"player_id": drawer["player_id"], "player_name": drawer["player_name"]},
+        )
+        update.set("team_ai.predictions", [])
+        update.set("team_ai.best_confidence", 0)
+        update.set("team_ai.last_prediction", None)
+        update.set("canvas_state", None)  # Clear canvas for new round
+
+    return category
+
+
+def record_round_winner(update: GameUpdate, round_winner: Dict) -> None:
+    """Append the outcome of the current round to round_winners"""
+    update.append("round_winners", round_winner)
+
+
+def is_last_round(game: Dict) -> bool:
+    return game["current_round"] >= game["max_rounds"]
+
+
+def advance_round(update: GameUpdate) -> Optional[str]:
+    """
+    Finish the game after the last round, otherwise start the next one
+
+    Returns:
+        The next category, or None if the game is finished
+    """
+    game = update.game
+    if is_last_round(game):
+        finish_game(update)
+        return None
+    return start_round(update, game["current_round"] + 1)
+
+
+def finish_game(update: GameUpdate) -> None:
+    """Mark the game finished and record the mode-specific result"""
+    game = update.game
+    update.set("status", "finished")
+    update.set("finished_at", firestore.SERVER_TIMESTAMP)
+
+    if game["game_type"] == "race":
+        champion = max(game["players"], key=lambda p: p["rounds_won"])
+        update.set(
+            "champion",
+            {
+                "player_id": champion["player_id"],
+                "player_name": champion["player_name"],
+                "rounds_won": champion["rounds_won"],
+            },
+        )
+    else:
+        humans = game["team_humans"]["rounds_won"]
+        ai = game["team_ai"]["rounds_won"]
+        update.set(
+            "winner", "humans" if humans > ai else "ai" if ai > humans else "draw"
+        )
+
+
+# ==================== PLAYERS ====================
+
+
+def remove_player(update: GameUpdate, player_id: str) -> Optional[Dict]:
+    """
+    Take a player out of a game that still has other players
+
+    The creator role moves to the next player; a game left with fewer than
+    two players during play is finished (race: the last player is champion,
+    guessing: abandoned if the drawer left), and a guessing game whose
+    drawer left gets a new drawer and a blank canvas.
+
+    Returns:
+        The removed player entry, or None if the player is not in the game
+    """
+    game = update.game
+    players = [p for p in game.get("players", []) if p.get("player_id") != player_id]
+    removed = next(
+        (p for p in game.get("players", []) if p.get("player_id") == player_id), None
+    )
+    if removed is None:
+        return None
+
+    update.set("players", players)
+
+    if game.get("creator_id") == player_id and players:
+        update.set("creator_id", players[0]["player_id"])
+
+    if game.get("status") != "playing":
+        return removed
+
+    if game.get("game_type") == "guessing":
+        if (game.get("current_drawer") or {}).get("player_id") == player_id:
+            if len(players) < 2:
+                update.set("status", "finished")
+                update.set("winner", "abandoned")
+            else:
+                drawer = random.choice(players)
+                update.set(
+                    "current_drawer",
+                    {
+                        "player_id": drawer["player_id"],
+                        "player_name": drawer["player_name"],
+                    },
+                )
+                update.set("canvas_state", None)  # Reset canvas for new drawer
+
+    elif game.get("game_type") == "race" and len(players) < 2:
+        update.set("status", "finished")
+        if players:
+            update.set(
+                "champion",
+                {
+                    "player_id": players[0]["player_id"],
+                    "player_name": players[0]["player_name"],
+                    "rounds_won": players[0].get("rounds_won", 0),
+                },
+            )
+
+    return removed
+
+
+# ==================== RACE MODE ====================
+
+
+def award_race_round(
+    update: GameUpdate, player_id: str, points: int, confidence: float, **extra
+) -> Optional[Dict]:
+    """
+    Give the current race round to a player
+
+    Returns:
+        The winning player entry, or None if the player is not in the game
+    """
+    game = update.game
+    players = [dict(p) for p in game["players"]]
+    winner = next((p for p in players if p["player_id"] == player_id), None)
+    if winner is None:
+        return None
+
+    winner["rounds_won"] += 1
+    winner["score"] += points
+    # Player entries live in an array, which Firestore can only replace whole
+    update.set("players", players)
+
+    record_round_winner(
+        update,
+        {
+            "round": game["current_round"],
+            "winner_id": player_id,
+            "winner_name": winner["player_name"],
+            "confidence": confidence,
+            "category": game["current_category"],
+            **extra,
+        },
+    )
+    return winner
+
+
+# ==================== GUESSING GAME ====================
+
+
+def award_team_round(
+    update: GameUpdate, team: str, points: int, round_winner: Dict
+) -> None:
+    """Give the current guessing round to "humans" or "ai" """
+    game = update.game
+    team_key = f"team_{team}"
+    update.set(f"{team_key}.score", game[team_key]["score"] + points)
+    update.set(f"{team_key}.rounds_won", game[team_key]["rounds_won"] + 1)
+    record_round_winner(update, round_winner)
+
+
+def record_ai_prediction(update: GameUpdate, prediction: Dict) -> None:
+    """
+    Record an AI prediction as a round summary plus a capped history
+
+    team_ai.best_confidence and team_ai.last_prediction are O(1) to check;
+    team_ai.predictions keeps only the last AI_PREDICTION_HISTORY entries,
+    so the document stays the same size however long the round lasts.
+    """
+    team_ai = update.game.get("team_ai", {})
+    update.set("team_ai.last_prediction", prediction)
+    if prediction["confidence"] > team_ai.get("best_confidence", 0):
+        update.set("team_ai.best_confidence", prediction["confidence"])
+
+    if AI_PREDICTION_HISTORY > 0:
+        history = team_ai.get("predictions", []) + [prediction]
+        update.set("team_ai.predictions", history[-AI_PREDICTION_HISTORY:])
+
+
+def ai_reached_threshold(game: Dict) -> bool:
+    """Whether any AI prediction this round reached the confidence threshold"""
+    threshold = game["settings"].get("ai_confidence_threshold", 0.85)
+    team_ai = game.get("team_ai", {})
+    if "best_confidence" in team_ai:
+        return team_ai["best_confidence"] >= threshold
+
+    # Rounds started before the summary existed
+    return any(
+        p.get("confidence", 0) >= threshold for p in team_ai.get("predictions", [])
+    )
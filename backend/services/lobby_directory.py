@@ -0,0 +1,317 @@
+"""
+Lobby directory: room-code index and in-memory list of waiting games
+Lobby list requests are served from memory, updated as games change
+"""
+
+import asyncio
+import bisect
+import copy
+import logging
+import os
+import random
+import string
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from google.api_core.exceptions import Conflict
+from google.cloud.firestore_v1.transforms import Sentinel
+
+from services.firestore_service import FirestoreService, LOBBY_FIELDS, get_db
+
+logger = logging.getLogger(__name__)
+
+ROOM_CODE_CHARS = string.ascii_uppercase + string.digits
+ROOM_CODE_LENGTH = 4
+
+# Top-level game fields a lobby card is made of
+_LOBBY_TOP_FIELDS = {field.split(".")[0] for field in LOBBY_FIELDS}
+
+
+def generate_room_code() -> str:
+    """Generate a 4-character room code (uppercase letters and numbers)"""
+    return "".join(random.choice(ROOM_CODE_CHARS) for _ in range(ROOM_CODE_LENGTH))
+
+
+def lobby_card(game_id: str, game: Dict) -> Dict:
+    """Project a game onto LOBBY_FIELDS (same shape as the projected query)"""
+    card = {"id": game_id}
+    for field in LOBBY_FIELDS:
+        parts = field.split(".")
+        value = game
+        for part in parts:
+            value = value.get(part) if isinstance(value, dict) else None
+        if value is None:
+            continue
+        if isinstance(value, Sentinel):  # SERVER_TIMESTAMP at creation
+            value = datetime.utcnow()
+
+        target = card
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return card
+
+
+class LobbyDirectory:
+    """
+    Room codes and waiting games, indexed in memory
+
+    **Behaviour:**
+    - reserve_room_code() claims room_codes/{code} with a create() that
+      fails if the code exists, so two lobbies never share a code
+    - resolve() maps a code to its game in O(1) (memory, then one read)
+    - The lobby list is kept per game type, sorted by game ID (a page
+      starts after the `cursor` game ID), and updated by
+      add() / apply_changes() / close() as games are created, joined,
+      left, started and deleted
+    - It is bootstrapped lazily; with LOBBY_DIRECTORY_LISTEN (default) a
+      listener on waiting games also picks up lobbies created, joined and
+      started on other instances. Without it the list is reloaded with
+      one projected query every refresh_interval seconds.
+
+    📝 DEFENSE JUSTIFICATION:
+    Every lobby list request used to query all waiting games (one billed
+    read per lobby, per request, per client). Lobbies change a few times
+    in their life; reading them once and applying changes keeps list
+    requests free of Firestore reads.
+    """
+
+    def __init__(self, listen: bool = True, refresh_interval: float = 60.0):
+        self.listen = listen
+        self.refresh_interval = refresh_interval
+
+        self._lobbies: Dict[str, Dict] = {}  # game_id -> lobby card
+        self._ids: Dict[str, List[str]] = {}  # game_type -> sorted game IDs
+        self._codes: Dict[str, str] = {}  # room_code -> game_id
+        # Listener callbacks run on Firestore's background threads
+        self._lock = threading.Lock()
+        self._bootstrapped = False
+        self._bootstrapped_at = 0.0
+        self._bootstrap_lock = asyncio.Lock()
+        self._watch = None
+
+        self.stats = {"lists": 0, "bootstrap_reads": 0, "code_collisions": 0}
+
+    # ==================== ROOM CODES ====================
+
+    async def reserve_room_code(
+        self, game_id: str, game_type: str, attempts: int = 10
+    ) -> str:
+        """
+        Claim an unused room code for a game
+
+        Raises:
+            RuntimeError: No free code found after `attempts` tries
+        """
+        for _ in range(attempts):
+            code = generate_room_code()
+            doc_ref = get_db().collection("room_codes").document(code)
+            try:
+                await asyncio.to_thread(
+                    doc_ref.create,
+                    {
+                        "game_id": game_id,
+                        "game_type": game_type,
+                        "created_at": datetime.utcnow(),
+                    },
+                )
+                with self._lock:
+                    self._codes[code] = game_id
+                return code
+            except Conflict:
+                self.stats["code_collisions"] += 1
+        raise RuntimeError("Could not allocate a room code")
+
+    async def resolve(self, room_code: str) -> Optional[Dict]:
+        """
+        Find the lobby behind a room code
+
+        Returns:
+            {"game_id", "game_type"} or None if the code is not in use
+        """
+        room_code = room_code.upper()
+        with self._lock:
+            game_id = self._codes.get(room_code)
+            card = self._lobbies.get(game_id) if game_id else None
+        if card is not None:
+            return {"game_id": game_id, "game_type": card.get("game_type")}
+
+        doc = await asyncio.to_thread(
+            get_db().collection("room_codes").document(room_code).get
+        )
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        return {"game_id": data["game_id"], "game_type": data.get("game_type")}
+
+    async def release_room_code(self, room_code: Optional[str]) -> None:
+        """Free a room code once its game can no longer be joined"""
+        if not room_code:
+            return
+        with self._lock:
+            self._codes.pop(room_code, None)
+        try:
+            doc_ref = get_db().collection("room_codes").document(room_code)
+            await asyncio.to_thread(doc_ref.delete)
+        except Exception as e:
+            logger.error(f"Error releasing room code {room_code}: {e}")
+
+    # ==================== LOBBY LIST ====================
+
+    def add(self, game_id: str, game: Dict) -> None:
+        """Register a newly created lobby"""
+        with self._lock:
+            self._put(game_id, lobby_card(game_id, game))
+
+    def apply_changes(self, game_id: str, changes: Dict) -> None:
+        """Apply a game diff ({field_path_tuple: value}) to its lobby card"""
+        with self._lock:
+            card = self._lobbies.get(game_id)
+            if card is None:
+                return
+
+            for path, value in changes.items():
+                if path[0] not in _LOBBY_TOP_FIELDS:
+                    continue
+                if len(path) > 1 and ".".join(path) not in LOBBY_FIELDS:
+                    continue
+                target = card
+                for part in path[:-1]:
+                    target = target.setdefault(part, {})
+                target[path[-1]] = copy.deepcopy(value)
+
+    async def close(self, game_id: str, room_code: Optional[str] = None) -> None:
+        """Remove a lobby (started or deleted game) and free its room code"""
+        listed_code = self.discard(game_id)
+        await self.release_room_code(room_code or listed_code)
+
+    def discard(self, game_id: str) -> Optional[str]:
+        """
+        Remove a lobby from memory only (the caller deletes its room code doc)
+
+        Returns:
+            The lobby's room code, if it was listed
+        """
+        with self._lock:
+            card = self._drop(game_id)
+        return (card or {}).get("room_code")
+
+    async def list_lobbies(
+        self, game_type: str, limit: int = 50, cursor: Optional[str] = None
+    ) -> Dict:
+        """
+        One page of waiting lobbies of a game type
+
+        Returns:
+            Dict with "lobbies" and "next_cursor" (None on the last page)
+        """
+        await self._ensure_bootstrapped()
+        self.stats["lists"] += 1
+
+        with self._lock:
+            ids = self._ids.get(game_type, [])
+            start = bisect.bisect_right(ids, cursor) if cursor else 0
+            page_ids = ids[start : start + limit]
+            lobbies = [dict(self._lobbies[game_id]) for game_id in page_ids]
+
+        next_cursor = page_ids[-1] if len(page_ids) == limit else None
+        return {"lobbies": lobbies, "next_cursor": next_cursor}
+
+    @property
+    def size(self) -> int:
+        return len(self._lobbies)
+
+    def stop(self) -> None:
+        """Stop the waiting-games listener (used on shutdown)"""
+        if self._watch is not None:
+            watch, self._watch = self._watch, None
+            threading.Thread(target=watch.unsubscribe, daemon=True).start()
+
+    # ==================== INTERNALS ====================
+
+    def _put(self, game_id: str, card: Dict) -> None:
+        """Insert or replace a lobby card (caller holds the lock)"""
+        if game_id not in self._lobbies:
+            ids = self._ids.setdefault(card.get("game_type"), [])
+            bisect.insort(ids, game_id)
+        self._lobbies[game_id] = card
+        if card.get("room_code"):
+            self._codes[card["room_code"]] = game_id
+
+    def _drop(self, game_id: str) -> Optional[Dict]:
+        """Remove a lobby card (caller holds the lock)"""
+        card = self._lobbies.pop(game_id, None)
+        if card is None:
+            return None
+        ids = self._ids.get(card.get("game_type"), [])
+        index = bisect.bisect_left(ids, game_id)
+        if index < len(ids) and ids[index] == game_id:
+            del ids[index]
+        if self._codes.get(card.get("room_code")) == game_id:
+            del self._codes[card["room_code"]]
+        return card
+
+    def _expired(self) -> bool:
+        if not self._bootstrapped:
+            return True
+        # The listener keeps the list current; a one-off load goes stale
+        return (
+            not self.listen
+            and time.monotonic() - self._bootstrapped_at > self.refresh_interval
+        )
+
+    async def _ensure_bootstrapped(self) -> None:
+        """Load the waiting games (then keep them up to date or reload them)"""
+        if not self._expired():
+            return
+        async with self._bootstrap_lock:
+            if not self._expired():
+                return
+
+            if self.listen:
+                await asyncio.to_thread(self._start_listener)
+            else:
+                games = await asyncio.to_thread(
+                    FirestoreService.get_games_by_status, "waiting", None, LOBBY_FIELDS
+                )
+                self.stats["bootstrap_reads"] += len(games)
+                with self._lock:
+                    # Replace: lobbies started or deleted elsewhere disappear
+                    for game_id in list(self._lobbies):
+                        self._drop(game_id)
+                    for game in games:
+                        game_id = game.pop("id")
+                        self._put(game_id, {"id": game_id, **game})
+
+            if not self._bootstrapped:
+                logger.info(f"Lobby directory loaded: {len(self._lobbies)} lobbies")
+            self._bootstrapped = True
+            self._bootstrapped_at = time.monotonic()
+
+    def _start_listener(self, timeout: float = 10.0) -> None:
+        """Listen to waiting games; block until the initial snapshot arrived"""
+        ready = threading.Event()
+
+        def on_snapshot(doc_snapshots, changes, read_time):
+            with self._lock:
+                for change in changes:
+                    doc = change.document
+                    if change.type.name == "REMOVED":
+                        self._drop(doc.id)
+                    else:
+                        self._put(doc.id, lobby_card(doc.id, doc.to_dict()))
+            ready.set()
+
+        query = get_db().collection("games").where("status", "==", "waiting")
+        self._watch = query.on_snapshot(on_snapshot)
+        if not ready.wait(timeout):
+            logger.warning("Lobby listener: no initial snapshot yet, serving partial")
+
+
+# Shared instance used by the game routes
+lobby_directory = LobbyDirectory(
+    listen=os.getenv("LOBBY_DIRECTORY_LISTEN", "true").lower() == "true",
+    refresh_interval=float(os.getenv("LOBBY_DIRECTORY_REFRESH_INTERVAL", "60")),
+)
@@ -3,13 +3,21 @@ Presence Service for Firebase Realtime Database
 Handles player online/offline detection and game cleanup for multiplayer games
 """
 
+import asyncio
 import os
 import logging
-import random
-from typing import Dict, List
-from datetime import datetime, timedelta
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import datetime
 from firebase_admin import db as rtdb
 from firebase_admin import firestore
+from services.canvas_sync import canvas_sync
+from services.game_cache import game_cache
+from services.game_engine import game_engine
+from services.game_events import game_events
+from services.lobby_directory import lobby_directory
+from services.presence_tracker import PresenceTracker
+from services.round_deadlines import round_deadlines
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +46,108 @@ def get_firestore_db():
     return _firestore_db
 
 
+class HeartbeatBatcher:
+    """
+    Coalesces presence heartbeats into one multi-path RTDB update
+
+    **Behaviour:**
+    - add() records that a player is alive; repeated heartbeats of the same
+      player within one interval collapse into a single entry
+    - Every flush_interval seconds all pending players (every game this
+      instance serves) are written with ONE update() on the RTDB root
+    - discard() drops a pending heartbeat when a player goes offline or is
+      removed, so a late flush cannot bring them back
+    - Failed flushes are retried on the next interval; stop() flushes once
+      more on shutdown
+
+    📝 DEFENSE JUSTIFICATION:
+    Each heartbeat used to be its own RTDB write (one per player every
+    10-15 s). Batching makes it one write per instance per interval;
+    flush_interval stays well below PRESENCE_TIMEOUT, so lastSeen can never
+    fall behind far enough to mark a live player offline.
+    """
+
+    def __init__(self, flush_interval: float = 5.0):
+        self.flush_interval = flush_interval
+
+        self._pending: Set[Tuple[str, str]] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.stats = {"heartbeats": 0, "flushes": 0, "paths_written": 0, "failures": 0}
+
+    def start(self) -> None:
+        """Start the periodic flush task on the running event loop"""
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Heartbeat batcher started (interval={self.flush_interval}s)")
+
+    async def stop(self) -> None:
+        """Flush pending heartbeats and stop the flush task"""
+        self._closing = True
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        logger.info(f"Heartbeat batcher stopped: {self.stats}")
+
+    def add(self, game_id: str, player_id: str) -> None:
+        """Queue a heartbeat for the next flush"""
+        self._pending.add((game_id, player_id))
+        self.stats["heartbeats"] += 1
+        if self._task is None and not self._closing:
+            self.start()
+
+    def discard(self, game_id: str, player_id: Optional[str] = None) -> None:
+        """Forget a player (or a whole game if player_id is None)"""
+        if player_id is not None:
+            self._pending.discard((game_id, player_id))
+        else:
+            self._pending = {key for key in self._pending if key[0] != game_id}
+
+    async def flush(self) -> int:
+        """
+        Write all pending heartbeats in one multi-path update
+
+        Returns:
+            Number of players written
+        """
+        if not self._pending:
+            return 0
+
+        batch, self._pending = self._pending, set()
+        updates = {}
+        for game_id, player_id in batch:
+            base = f"presence/{game_id}/{player_id}"
+            updates[f"{base}/lastSeen"] = {".sv": "timestamp"}
+            updates[f"{base}/lastHeartbeat"] = {".sv": "timestamp"}
+            updates[f"{base}/online"] = True
+
+        try:
+            await asyncio.to_thread(get_rtdb().update, updates)
+            self.stats["flushes"] += 1
+            self.stats["paths_written"] += len(updates)
+            return len(batch)
+        except Exception as e:
+            # Retry with the next flush (newer heartbeats merge in)
+            self._pending |= batch
+            self.stats["failures"] += 1
+            logger.error(f"Error flushing {len(batch)} heartbeats: {e}")
+            return 0
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+# Shared instance used by PresenceService.heartbeat
+heartbeat_batcher = HeartbeatBatcher(
+    flush_interval=float(os.getenv("PRESENCE_FLUSH_INTERVAL", "5")),
+)
+
+
 class PresenceService:
     """Service class for player presence management using RTDB"""
 
@@ -64,10 +174,13 @@ class PresenceService:
                 {
                     "online": True,
                     "lastSeen": {".sv": "timestamp"},  # Server timestamp
+                    # Only written by the player, never by offline/cleanup
+                    "lastHeartbeat": {".sv": "timestamp"},
                     "playerName": player_name,
                     "joinedAt": {".sv": "timestamp"},
                 }
             )
+            presence_tracker.touch(game_id, player_id)
 
             logger.info(
                 f"Player {player_name} ({player_id}) marked online in game {game_id}"
@@ -90,6 +203,8 @@ class PresenceService:
             True if successful
         """
         try:
+            heartbeat_batcher.discard(game_id, player_id)
+            presence_tracker.mark_offline(game_id, player_id)
             presence_ref = get_rtdb().child(f"presence/{game_id}/{player_id}")
             presence_ref.update({"online": False, "lastSeen": {".sv": "timestamp"}})
             logger.info(f"Player {player_id} marked offline in game {game_id}")
@@ -111,6 +226,8 @@ class PresenceService:
             True if successful
         """
         try:
+            heartbeat_batcher.discard(game_id, player_id)
+            presence_tracker.remove(game_id, player_id)
             presence_ref = get_rtdb().child(f"presence/{game_id}/{player_id}")
             presence_ref.delete()
             logger.info(f"Presence removed for player {player_id} in game {game_id}")
@@ -124,6 +241,10 @@ class PresenceService:
         """
         Update player's lastSeen timestamp (heartbeat)
 
+        A player already known online is only queued: its lastSeen reaches
+        RTDB with the next batched flush. Coming (back) online is written
+        immediately.
+
         Args:
             game_id: Game document ID
             player_id: Player's Firebase UID
@@ -131,14 +252,45 @@ class PresenceService:
         Returns:
             True if successful
         """
+        if not presence_tracker.touch(game_id, player_id):
+            heartbeat_batcher.add(game_id, player_id)
+            return True
+
         try:
             presence_ref = get_rtdb().child(f"presence/{game_id}/{player_id}")
-            presence_ref.update({"lastSeen": {".sv": "timestamp"}, "online": True})
+            presence_ref.update(
+                {
+                    "lastSeen": {".sv": "timestamp"},
+                    "lastHeartbeat": {".sv": "timestamp"},
+                    "online": True,
+                }
+            )
             return True
         except Exception as e:
             logger.error(f"Error updating heartbeat: {e}")
             return False
 
+    @staticmethod
+    async def seconds_since_last_seen(game_id: str, player_id: str) -> Optional[float]:
+        """
+        Age of a player's RTDB lastHeartbeat (one small read)
+
+        lastSeen is not used: set_player_offline stamps it too, which would
+        make a player this instance just marked offline look alive.
+
+        Returns:
+            Seconds since the last heartbeat written by any instance, or None
+        """
+        try:
+            ref = get_rtdb().child(f"presence/{game_id}/{player_id}/lastHeartbeat")
+            last_heartbeat = await asyncio.to_thread(ref.get)
+        except Exception as e:
+            logger.error(f"Error reading lastHeartbeat: {e}")
+            return None
+        if not isinstance(last_heartbeat, (int, float)):
+            return None
+        return max(0.0, time.time() - last_heartbeat / 1000)
+
     @staticmethod
     async def get_game_presence(game_id: str) -> Dict:
         """
@@ -163,12 +315,21 @@ class PresenceService:
         """
         Get list of online player IDs in a game
 
+        Answered by the presence tracker alone when games are pinned to an
+        owner instance (GAME_ENGINE_INSTANCES), which then receives all of
+        their heartbeats. Otherwise heartbeats are spread over instances:
+        the RTDB presence is read and merged with the tracker.
+
         Args:
             game_id: Game document ID
 
         Returns:
             List of online player IDs
         """
+        tracked = presence_tracker.online_players(game_id)
+        if tracked is not None and game_engine.instances:
+            return tracked
+
         presence_data = await PresenceService.get_game_presence(game_id)
         current_time = datetime.utcnow().timestamp() * 1000  # milliseconds
         timeout_threshold = current_time - (PresenceService.PRESENCE_TIMEOUT * 1000)
@@ -180,6 +341,11 @@ class PresenceService:
                 if last_seen > timeout_threshold:
                     online_players.append(player_id)
 
+        # Heartbeats queued here may not have reached RTDB yet
+        for player_id in tracked or []:
+            if player_id not in online_players:
+                online_players.append(player_id)
+
         return online_players
 
     @staticmethod
@@ -187,12 +353,18 @@ class PresenceService:
         """
         Remove players who haven't sent heartbeat in CLEANUP_THRESHOLD seconds
 
+        Games tracked by this instance are already cleaned up by the
+        presence tracker, so only untracked games are scanned in RTDB.
+
         Args:
             game_id: Game document ID
 
         Returns:
             List of removed player IDs
         """
+        if presence_tracker.tracks(game_id):
+            return []
+
         presence_data = await PresenceService.get_game_presence(game_id)
         current_time = datetime.utcnow().timestamp() * 1000
         cleanup_threshold = current_time - (PresenceService.CLEANUP_THRESHOLD * 1000)
@@ -219,6 +391,8 @@ class PresenceService:
             True if successful
         """
         try:
+            heartbeat_batcher.discard(game_id)
+            presence_tracker.remove_game(game_id)
             presence_ref = get_rtdb().child(f"presence/{game_id}")
             presence_ref.delete()
             logger.info(f"Cleaned up all presence data for game {game_id}")
@@ -228,6 +402,13 @@ class PresenceService:
             return False
 
 
+# Shared tracker fed by heartbeats (see services/presence_tracker.py)
+presence_tracker = PresenceTracker(
+    presence_timeout=PresenceService.PRESENCE_TIMEOUT,
+    cleanup_threshold=PresenceService.CLEANUP_THRESHOLD,
+)
+
+
 class GameCleanupService:
     """Service for cleaning up abandoned games and removing disconnected players"""
 
@@ -243,101 +424,74 @@ class GameCleanupService:
         Returns:
             Updated game data or error info
         """
-        try:
-            db = get_firestore_db()
-            game_ref = db.collection("games").document(game_id)
-            game_doc = game_ref.get()
-
-            if not game_doc.exists:
-                return {"error": "Game not found"}
-
-            game_data = game_doc.to_dict()
-
-            # Remove player from players list
-            original_players = game_data.get("players", [])
-            updated_players = [
-                p for p in original_players if p.get("player_id") != player_id
-            ]
+        from services.firestore_service import DELETE_GAME, firestore_service
+        from services.game_transitions import GameUpdate, changed_values, remove_player
+
+        applied = {}
+
+        def transition(game):
+            if game is None:
+                raise ValueError("Game not found")
+            applied["room_code"] = game.get("room_code")
+            applied["was_creator"] = game.get("creator_id") == player_id
+            update = GameUpdate(game)
+            if remove_player(update, player_id) is None:
+                raise ValueError("Player not in game")
+            if not game["players"]:
+                # Last player out - delete the game
+                return DELETE_GAME, None
+            applied["changes"] = changed_values(game, update.fields)
+            applied["remaining"] = len(game["players"])
+            return update.fields, None
 
-            if len(updated_players) == len(original_players):
-                return {"error": "Player not in game"}
-
-            # Check if game should be deleted (no players left)
-            if len(updated_players) == 0:
-                game_ref.delete()
-                # Clean up presence data too
-                await PresenceService.cleanup_game_presence(game_id)
-                return {
-                    "status": "game_deleted",
-                    "message": "Game deleted - no players remaining",
-                }
-
-            # Check if creator left - transfer to next player
-            was_creator = game_data.get("creator_id") == player_id
-            update_data = {"players": updated_players}
-
-            if was_creator and len(updated_players) > 0:
-                new_creator = updated_players[0]
-                update_data["creator_id"] = new_creator["player_id"]
-                logger.info(
-                    f"Creator left, transferred to {new_creator['player_name']}"
+        try:
+            # The in-memory engine must not overwrite this change later
+            async with game_engine.exclusive(game_id):
+                await firestore_service.run_game_transaction(
+                    game_id, transition, action="player_left"
                 )
+        except ValueError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            logger.error(f"Error removing player from game: {e}")
+            return {"error": str(e)}
 
-            # Handle guessing game specific - if drawer left during playing
-            if (
-                game_data.get("game_type") == "guessing"
-                and game_data.get("status") == "playing"
-            ):
-                current_drawer = game_data.get("current_drawer", {})
-                if current_drawer.get("player_id") == player_id:
-                    # Drawer left - skip to next round or end game
-                    if len(updated_players) < 2:
-                        update_data["status"] = "finished"
-                        update_data["winner"] = "abandoned"
-                    else:
-                        # Select new drawer from remaining players
-                        new_drawer = random.choice(updated_players)
-                        update_data["current_drawer"] = {
-                            "player_id": new_drawer["player_id"],
-                            "player_name": new_drawer["player_name"],
-                        }
-                        # Reset canvas for new drawer
-                        update_data["canvas_state"] = None
-
-            # Handle race game specific - check if enough players remain
-            if (
-                game_data.get("game_type") == "race"
-                and game_data.get("status") == "playing"
-            ):
-                if len(updated_players) < 2:
-                    # Not enough players - end game
-                    update_data["status"] = "finished"
-                    if len(updated_players) == 1:
-                        update_data["champion"] = {
-                            "player_id": updated_players[0]["player_id"],
-                            "player_name": updated_players[0]["player_name"],
-                            "rounds_won": updated_players[0].get("rounds_won", 0),
-                        }
-
-            game_ref.update(update_data)
-
-            # Remove presence data
-            await PresenceService.remove_player_presence(game_id, player_id)
-
+        if "changes" not in applied:
+            round_deadlines.cancel(game_id)
+            canvas_sync.drop(game_id)
+            game_events.publish(game_id, "game_deleted", {})
+            await lobby_directory.close(game_id, applied.get("room_code"))
+            # Clean up presence data too
+            await PresenceService.cleanup_game_presence(game_id)
             return {
-                "status": "player_removed",
-                "remaining_players": len(updated_players),
-                "was_creator": was_creator,
+                "status": "game_deleted",
+                "message": "Game deleted - no players remaining",
             }
 
-        except Exception as e:
-            logger.error(f"Error removing player from game: {e}")
-            return {"error": str(e)}
+        changes = applied["changes"]
+        if applied["was_creator"] and ("creator_id",) in changes:
+            logger.info(f"Creator left, transferred to {changes[('creator_id',)]}")
+        game_events.publish_changes(game_id, "player_left", changes)
+        lobby_directory.apply_changes(game_id, changes)
+        if changes.get(("status",)) == "finished":
+            # No round left to time out or draw on
+            round_deadlines.cancel(game_id)
+            canvas_sync.drop(game_id)
+            await lobby_directory.close(game_id, applied.get("room_code"))
+
+        # Remove presence data
+        await PresenceService.remove_player_presence(game_id, player_id)
+
+        return {
+            "status": "player_removed",
+            "remaining_players": applied["remaining"],
+            "was_creator": applied["was_creator"],
+        }
 
     @staticmethod
     async def cleanup_abandoned_games(max_age_minutes: int = 30) -> Dict:
         """
-        Clean up games that have been waiting/playing for too long
+        Clean up games that have been waiting for too long
 
         Args:
             max_age_minutes: Maximum age in minutes before cleanup
@@ -345,34 +499,15 @@ class GameCleanupService:
         Returns:
             Cleanup statistics
         """
-        try:
-            db = get_firestore_db()
-            cutoff_time = datetime.utcnow() - timedelta(minutes=max_age_minutes)
-
-            # Query for old waiting games
-            waiting_query = (
-                db.collection("games").where("status", "==", "waiting").stream()
-            )
-
-            deleted_count = 0
-            for doc in waiting_query:
-                game_data = doc.to_dict()
-                created_at = game_data.get("created_at") or game_data.get("createdAt")
-
-                if created_at:
-                    # Handle both datetime and Firestore timestamp
-                    if hasattr(created_at, "timestamp"):
-                        game_time = datetime.fromtimestamp(created_at.timestamp())
-                    else:
-                        game_time = created_at
-
-                    if game_time < cutoff_time:
-                        doc.reference.delete()
-                        await PresenceService.cleanup_game_presence(doc.id)
-                        deleted_count += 1
-                        logger.info(f"Deleted abandoned game: {doc.id}")
+        from services.bulk_cleanup import bulk_cleanup
 
-            return {"status": "cleanup_complete", "deleted_games": deleted_count}
+        try:
+            stats = await bulk_cleanup.cleanup_abandoned(max_age_minutes)
+            return {
+                "status": "cleanup_complete",
+                "deleted_games": stats["games"],
+                "stats": stats,
+            }
 
         except Exception as e:
             logger.error(f"Error cleaning up abandoned games: {e}")
@@ -384,6 +519,11 @@ class GameCleanupService:
         Sync RTDB presence data to Firestore game document
         Useful for updating player list based on actual presence
 
+        Only players who have a presence record and are offline are removed
+        (clients that never call the presence endpoints have none), each
+        through remove_player_from_game so creator transfer, game deletion,
+        the lobby list and subscribers are handled as for a player leaving.
+
         Args:
             game_id: Game document ID
 
@@ -391,36 +531,36 @@ class GameCleanupService:
             Sync result
         """
         try:
-            # Get online players from RTDB
-            online_players = await PresenceService.get_online_players(game_id)
+            presence_data = await PresenceService.get_game_presence(game_id)
+            if not presence_data:
+                return {"status": "skipped", "message": "No presence data"}
 
-            # Get game from Firestore
-            db = get_firestore_db()
-            game_ref = db.collection("games").document(game_id)
-            game_doc = game_ref.get()
-
-            if not game_doc.exists:
+            game = await game_cache.get_game(game_id)
+            if game is None:
                 return {"error": "Game not found"}
 
-            game_data = game_doc.to_dict()
-
             # Only sync if game is waiting (not in progress)
-            if game_data.get("status") != "waiting":
+            if game.get("status") != "waiting":
                 return {"status": "skipped", "message": "Game in progress"}
 
-            # Filter players to only include online ones
-            current_players = game_data.get("players", [])
-            synced_players = [
-                p for p in current_players if p["player_id"] in online_players
+            online_players = set(await PresenceService.get_online_players(game_id))
+            absent = [
+                p["player_id"]
+                for p in game.get("players", [])
+                if p["player_id"] in presence_data
+                and p["player_id"] not in online_players
             ]
 
-            if len(synced_players) != len(current_players):
-                game_ref.update({"players": synced_players})
-                return {
-                    "status": "synced",
-                    "removed": len(current_players) - len(synced_players),
-                }
+            removed = 0
+            for player_id in absent:
+                result = await GameCleanupService.remove_player_from_game(
+                    game_id, player_id
+                )
+                if "error" not in result:
+                    removed += 1
 
+            if removed:
+                return {"status": "synced", "removed": removed}
             return {"status": "no_change"}
 
         except Exception as e:
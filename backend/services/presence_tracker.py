@@ -0,0 +1,261 @@
+"""
+In-process presence tracker
+Heartbeat deadlines live in a hierarchical timing wheel; expired players are
+marked offline, then removed from their game, without anyone polling RTDB
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel (levels of `slots` buckets, one tick each)
+
+    schedule() and the expiry of one timer are O(1); timers further than one
+    revolution away sit in a coarser level and cascade down as time passes.
+    """
+
+    def __init__(self, slots: int = 64, levels: int = 3):
+        self.slots = slots
+        self.levels = levels
+        self.current_tick = 0
+        self._wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+
+    def schedule(self, deadline_tick: int, item) -> None:
+        """Fire `item` at deadline_tick (next tick if already past)"""
+        self._place(max(deadline_tick, self.current_tick + 1), item)
+
+    def advance(self, to_tick: int) -> List:
+        """Move time forward and return the items that expired"""
+        expired = []
+        while self.current_tick < to_tick:
+            self.current_tick += 1
+
+            # Cascade coarser levels whose bucket starts at this tick
+            for level in range(self.levels - 1, 0, -1):
+                span = self.slots**level
+                if self.current_tick % span == 0:
+                    bucket_index = (self.current_tick // span) % self.slots
+                    bucket = self._wheels[level][bucket_index]
+                    self._wheels[level][bucket_index] = []
+                    for deadline, item in bucket:
+                        self._place(deadline, item)
+
+            index = self.current_tick % self.slots
+            expired.extend(item for _, item in self._wheels[0][index])
+            self._wheels[0][index] = []
+        return expired
+
+    def _place(self, deadline: int, item) -> None:
+        delta = deadline - self.current_tick
+        for level in range(self.levels):
+            if delta < self.slots ** (level + 1) or level == self.levels - 1:
+                index = (deadline // self.slots**level) % self.slots
+                self._wheels[level][index].append((deadline, item))
+                return
+
+
+class _PlayerPresence:
+    """Last heartbeat of one player in one game"""
+
+    __slots__ = ("game_id", "player_id", "last_seen", "online", "scheduled")
+
+    def __init__(self, game_id: str, player_id: str, now: float):
+        self.game_id = game_id
+        self.player_id = player_id
+        self.last_seen = now
+        self.online = True
+        self.scheduled = False  # A timer for this player is in the wheel
+
+
+class PresenceTracker:
+    """
+    Tracks the players whose heartbeats reach this instance
+
+    **Behaviour:**
+    - touch() (online / heartbeat) only updates last_seen: O(1), no write
+    - Each player has at most one timer in the wheel. When it fires, the
+      deadline is recomputed from last_seen (re-armed if the player was
+      seen since), so heartbeats never have to cancel timers
+    - presence_timeout after the last heartbeat: the player is marked
+      offline; cleanup_threshold after it: GameCleanupService removes the
+      player from the game
+    - Before acting, the RTDB lastHeartbeat is checked once, in case the
+      player heartbeats through another instance
+    - online_players() answers from memory for tracked games
+
+    📝 DEFENSE JUSTIFICATION:
+    get_online_players and cleanup_stale_players downloaded the whole
+    presence/{game_id} subtree on every call, and stale players were only
+    removed when someone called the cleanup endpoint. The wheel turns
+    that into O(1) work per expiry and removes players on time.
+    """
+
+    def __init__(
+        self,
+        presence_timeout: float = 30,
+        cleanup_threshold: float = 60,
+        tick: float = 1.0,
+    ):
+        self.presence_timeout = presence_timeout
+        self.cleanup_threshold = cleanup_threshold
+        self.tick = tick
+
+        self._games: Dict[str, Dict[str, _PlayerPresence]] = {}
+        self._wheel = TimingWheel()
+        self._epoch = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {"expired_timers": 0, "marked_offline": 0, "removed": 0}
+
+    # ==================== UPDATES ====================
+
+    def touch(self, game_id: str, player_id: str) -> bool:
+        """
+        Record a heartbeat (or coming online)
+
+        Returns:
+            True if the player was not known online before
+        """
+        now = time.monotonic()
+        players = self._games.setdefault(game_id, {})
+        presence = players.get(player_id)
+
+        if presence is None:
+            presence = _PlayerPresence(game_id, player_id, now)
+            players[player_id] = presence
+            came_online = True
+        else:
+            came_online = not presence.online
+            presence.last_seen = now
+            presence.online = True
+
+        if not presence.scheduled:
+            self._arm(presence, now + self.presence_timeout)
+
+        if self._task is None:
+            self.start()
+        return came_online
+
+    def mark_offline(self, game_id: str, player_id: str) -> None:
+        """Explicit offline (the cleanup timer keeps running)"""
+        presence = self._games.get(game_id, {}).get(player_id)
+        if presence is not None:
+            presence.online = False
+
+    def remove(self, game_id: str, player_id: str) -> None:
+        players = self._games.get(game_id)
+        if players is not None:
+            players.pop(player_id, None)
+            if not players:
+                del self._games[game_id]
+
+    def remove_game(self, game_id: str) -> None:
+        self._games.pop(game_id, None)
+
+    # ==================== QUERIES ====================
+
+    def tracks(self, game_id: str) -> bool:
+        return game_id in self._games
+
+    def online_players(self, game_id: str) -> Optional[List[str]]:
+        """Online player IDs of a tracked game (None if not tracked here)"""
+        players = self._games.get(game_id)
+        if players is None:
+            return None
+        cutoff = time.monotonic() - self.presence_timeout
+        return [
+            p.player_id for p in players.values() if p.online and p.last_seen > cutoff
+        ]
+
+    # ==================== LIFECYCLE ====================
+
+    def start(self) -> None:
+        """Start the wheel tick task on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(
+                f"Presence tracker started (timeout={self.presence_timeout}s, "
+                f"cleanup={self.cleanup_threshold}s)"
+            )
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # ==================== INTERNALS ====================
+
+    def _to_tick(self, monotonic_time: float) -> int:
+        return int((monotonic_time - self._epoch) / self.tick) + 1
+
+    def _arm(self, presence: _PlayerPresence, deadline: float) -> None:
+        presence.scheduled = True
+        self._wheel.schedule(self._to_tick(deadline), presence)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            for presence in self._wheel.advance(self._to_tick(now) - 1):
+                self.stats["expired_timers"] += 1
+                presence.scheduled = False
+                try:
+                    await self._expire(presence, now)
+                except Exception as e:
+                    logger.error(
+                        f"Presence expiry failed for {presence.player_id} "
+                        f"in game {presence.game_id}: {e}"
+                    )
+
+    async def _expire(self, presence: _PlayerPresence, now: float) -> None:
+        """Handle one fired timer: re-arm, mark offline or remove"""
+        if (
+            self._games.get(presence.game_id, {}).get(presence.player_id)
+            is not presence
+        ):
+            return  # Removed meanwhile
+
+        idle = now - presence.last_seen
+        if presence.online and idle < self.presence_timeout:
+            self._arm(presence, presence.last_seen + self.presence_timeout)
+            return
+        if not presence.online and idle < self.cleanup_threshold:
+            self._arm(presence, presence.last_seen + self.cleanup_threshold)
+            return
+
+        from services.presence_service import GameCleanupService, PresenceService
+
+        # Another instance may be receiving this player's heartbeats
+        remote_idle = await PresenceService.seconds_since_last_seen(
+            presence.game_id, presence.player_id
+        )
+        if remote_idle is not None and remote_idle < idle:
+            presence.last_seen = now - remote_idle
+            presence.online = True
+            self._arm(presence, presence.last_seen + self.presence_timeout)
+            return
+
+        if presence.online:
+            presence.online = False
+            self.stats["marked_offline"] += 1
+            await PresenceService.set_player_offline(
+                presence.game_id, presence.player_id
+            )
+            self._arm(presence, presence.last_seen + self.cleanup_threshold)
+            return
+
+        self.stats["removed"] += 1
+        logger.info(
+            f"Removing player {presence.player_id} from game {presence.game_id} "
+            f"after {idle:.0f}s without heartbeat"
+        )
+        self.remove(presence.game_id, presence.player_id)
+        await GameCleanupService.remove_player_from_game(
+            presence.game_id, presence.player_id
+        )
@@ -0,0 +1,420 @@
+"""
+Retraining job manager
+Runs the active learning pipeline in a supervised child process (CPU and
+memory limits, lower priority), persists its state in Firestore and relays
+its progress to status and streaming endpoints
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lines starting with this prefix carry a JSON progress update
+PROGRESS_PREFIX = "PROGRESS "
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Runs as the child: applies the limits to itself, then execs the pipeline
+# (argv: cpu_seconds memory_bytes nice command...). preexec_fn is not safe
+# in the threaded serving process.
+LIMITS_LAUNCHER = """
+import os, resource, sys
+cpu, memory, nice = (int(value) for value in sys.argv[1:4])
+if cpu:
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 30))
+if memory:
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+if nice:
+    os.nice(nice)
+os.execv(sys.argv[4], sys.argv[4:])
+"""
+
+
+class RetrainJobConflict(Exception):
+    """A retraining job is already running (here or on another instance)"""
+
+    def __init__(self, job_id: Optional[str] = None):
+        self.job_id = job_id
+        super().__init__(f"Retraining job already running: {job_id or 'elsewhere'}")
+
+
+def find_retrain_script() -> Optional[str]:
+    """RETRAIN_SCRIPT_PATH, or the repository copy for local development"""
+    for path in (
+        os.getenv(
+            "RETRAIN_SCRIPT_PATH", "/app/ml-training/scripts/retrain_pipeline.py"
+        ),
+        "./ml-training/scripts/retrain_pipeline.py",
+        "../ml-training/scripts/retrain_pipeline.py",
+    ):
+        if os.path.exists(path):
+            return os.path.abspath(path)
+    return None
+
+
+class RetrainJob:
+    """State of one retraining run (mirrored to retrain_jobs/{job_id})"""
+
+    def __init__(self, job_id: str, options: Dict):
+        self.job_id = job_id
+        self.options = options
+        self.status = "queued"
+        self.phase: Optional[str] = None
+        self.progress = 0.0
+        self.metrics: Dict = {}
+        self.error: Optional[str] = None
+        self.returncode: Optional[int] = None
+        self.created_at = datetime.utcnow().isoformat() + "Z"
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+
+        self.log: deque = deque(maxlen=500)  # Recent output lines
+        self.subscribers: List[asyncio.Queue] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in ACTIVE_STATUSES
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "phase": self.phase,
+            "progress": round(self.progress, 3),
+            "metrics": self.metrics,
+            "options": self.options,
+            "error": self.error,
+            "returncode": self.returncode,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "instance": socket.gethostname(),
+        }
+
+
+class RetrainJobManager:
+    """
+    One retraining run at a time, outside the serving process
+
+    **Behaviour:**
+    - start() rejects a second run with RetrainJobConflict; across
+      instances a Firestore lease (retrain/lock) is held while a job runs
+    - The pipeline runs as `python -u retrain_pipeline.py` with RLIMIT_CPU,
+      RLIMIT_AS and a nice level (set by a small launcher that then execs
+      it), and is killed after `timeout` seconds
+    - Output is read line by line: PROGRESS {json} lines update the job's
+      phase/progress/metrics (written to retrain_jobs/{job_id}), every line
+      is kept in a short log and pushed to stream subscribers
+    - The nice level is what keeps serving responsive: RLIMIT_CPU caps the
+      total CPU seconds of a run (it stops a runaway job, it does not
+      lower the job's share of the CPU) and RLIMIT_AS its address space
+    - mark_orphaned() (startup) fails jobs left queued/running by a process
+      that died without recording a final status
+
+    📝 DEFENSE JUSTIFICATION:
+    The retrain endpoint used to run subprocess.run() in a BackgroundTask,
+    holding a worker thread of the serving process for up to an hour with
+    no way to see what the job was doing, and nothing stopped two runs at
+    once. A supervised process with resource limits keeps training from
+    competing with inference, and persisted progress makes the status
+    endpoint real.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 3600,
+        cpu_seconds: int = 14400,
+        memory_mb: int = 8192,
+        nice: int = 10,
+        collection: str = "retrain_jobs",
+    ):
+        """
+        Args:
+            timeout: Wall-clock limit of a run, in seconds
+            cpu_seconds: RLIMIT_CPU of the child, total CPU seconds over all
+                its threads (0 = unlimited)
+            memory_mb: RLIMIT_AS of the child in MB (0 = unlimited)
+            nice: Priority decrease of the child (protects serving)
+            collection: Firestore collection of job documents
+        """
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.nice = nice
+        self.collection = collection
+
+        self._current: Optional[RetrainJob] = None
+        self._task: Optional[asyncio.Task] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._lease = None
+
+    @property
+    def current(self) -> Optional[RetrainJob]:
+        return self._current
+
+    # ==================== CONTROL ====================
+
+    async def start(self, options: Optional[Dict] = None) -> RetrainJob:
+        """
+        Queue and launch a retraining run
+
+        Args:
+            options: Pipeline options (min_drawings, epochs, force...)
+
+        Returns:
+            The new job
+
+        Raises:
+            RetrainJobConflict: A run is already in progress
+            FileNotFoundError: The pipeline script is missing
+        """
+        if self._current is not None and not self._current.finished:
+            raise RetrainJobConflict(self._current.job_id)
+
+        script_path = find_retrain_script()
+        if script_path is None:
+            raise FileNotFoundError("Retraining script not found")
+
+        from services.scheduler import LeaderLease
+
+        job_id = f"retrain_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+        lease = LeaderLease(
+            holder=f"{socket.gethostname()}:{job_id}:{uuid.uuid4().hex[:6]}",
+            ttl=120,
+            path="retrain/lock",
+        )
+        if not await asyncio.to_thread(lease.acquire):
+            raise RetrainJobConflict()
+
+        job = RetrainJob(job_id, options or {})
+        self._current = job
+        self._lease = lease
+        await self._persist(job)
+
+        self._task = asyncio.create_task(self._run(job, script_path))
+        return job
+
+    async def stop(self) -> None:
+        """Kill a running job (shutdown); it is recorded as interrupted"""
+        if self._process is not None and self._process.returncode is None:
+            logger.warning("Stopping retraining job on shutdown")
+            self._current.error = "Interrupted by server shutdown"
+            self._process.kill()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=10)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+
+    async def mark_orphaned(self) -> int:
+        """
+        Fail jobs still recorded as queued/running whose process is gone
+
+        A job is alive only while its run holds the retrain/lock lease
+        (renewed every ttl / 3 seconds); any other active job was left
+        behind by a crashed or killed instance.
+
+        Returns:
+            Number of jobs marked as failed
+        """
+        from services.firestore_service import get_db
+
+        db = get_db()
+        query = db.collection(self.collection).where(
+            "status", "in", list(ACTIVE_STATUSES)
+        )
+        docs = await asyncio.to_thread(lambda: list(query.stream()))
+        if not docs:
+            return 0
+
+        lock = await asyncio.to_thread(db.collection("retrain").document("lock").get)
+        lease = lock.to_dict() if lock.exists else {}
+        lease_live = lease.get("expires_at", 0) > time.time()
+
+        orphaned = 0
+        for doc in docs:
+            job_id = doc.id
+            if self._current is not None and self._current.job_id == job_id:
+                continue
+            if lease_live and f":{job_id}:" in lease.get("holder", ""):
+                continue
+            await asyncio.to_thread(
+                doc.reference.update,
+                {
+                    "status": "failed",
+                    "error": "Orphaned: the process running it exited",
+                    "finished_at": datetime.utcnow().isoformat() + "Z",
+                },
+            )
+            orphaned += 1
+            logger.warning(f"Retraining job {job_id} was orphaned, marked failed")
+        return orphaned
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """Job state, from memory for the current job or from Firestore"""
+        if self._current is not None and self._current.job_id == job_id:
+            return self._current.to_dict()
+
+        from services.firestore_service import get_db
+
+        doc = await asyncio.to_thread(
+            get_db().collection(self.collection).document(job_id).get
+        )
+        return doc.to_dict() if doc.exists else None
+
+    async def stream(self, job_id: str) -> AsyncIterator[Dict]:
+        """
+        Follow a job on this instance: recent lines, then live updates
+
+        Yields:
+            {"type": "log", "line": ...}, {"type": "progress", ...job state}
+            and a final {"type": "done", ...job state}
+        """
+        job = self._current
+        if job is None or job.job_id != job_id:
+            return
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        job.subscribers.append(queue)
+        try:
+            for line in list(job.log):
+                yield {"type": "log", "line": line}
+            yield {"type": "progress", **job.to_dict()}
+            while not job.finished:
+                event = await queue.get()
+                yield event
+                if event["type"] == "done":
+                    return
+            yield {"type": "done", **job.to_dict()}
+        finally:
+            job.subscribers.remove(queue)
+
+    # ==================== INTERNALS ====================
+
+    def _command(self, script_path: str, options: Dict) -> List[str]:
+        command = [sys.executable, "-u", script_path]
+        for key, value in options.items():
+            flag = "--" + key.replace("_", "-")
+            if value is True:
+                command.append(flag)
+            elif value not in (None, False):
+                command.extend([flag, str(value)])
+
+        if os.name != "posix":
+            return command
+        limits = [self.cpu_seconds, self.memory_mb * 1024 * 1024, self.nice]
+        return [sys.executable, "-c", LIMITS_LAUNCHER, *map(str, limits), *command]
+
+    async def _run(self, job: RetrainJob, script_path: str) -> None:
+        renew = asyncio.create_task(self._renew_lease())
+        try:
+            self._process = await asyncio.create_subprocess_exec(
+                *self._command(script_path, job.options),
+                cwd=os.path.dirname(script_path),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+            job.status = "running"
+            job.started_at = datetime.utcnow().isoformat() + "Z"
+            await self._persist(job)
+            logger.info(f"Retraining job {job.job_id} started: {script_path}")
+
+            try:
+                await asyncio.wait_for(self._read_output(job), timeout=self.timeout)
+                job.returncode = await self._process.wait()
+            except asyncio.TimeoutError:
+                self._process.kill()
+                job.returncode = await self._process.wait()
+                job.error = f"Timed out after {self.timeout:g}s"
+
+            if job.returncode == 0:
+                job.status = "skipped" if job.phase == "skipped" else "completed"
+                job.progress = 1.0
+            else:
+                job.status = "failed"
+                job.error = job.error or (
+                    job.log[-1] if job.log else f"Exit code {job.returncode}"
+                )
+
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"Retraining job {job.job_id} failed: {e}")
+
+        finally:
+            renew.cancel()
+            job.finished_at = datetime.utcnow().isoformat() + "Z"
+            self._process = None
+            await self._persist(job)
+            self._publish(job, {"type": "done", **job.to_dict()})
+            try:
+                await asyncio.to_thread(self._lease.release)
+            except Exception as e:
+                logger.warning(f"Could not release retraining lease: {e}")
+            logger.info(f"Retraining job {job.job_id} {job.status}")
+
+    async def _read_output(self, job: RetrainJob) -> None:
+        while True:
+            raw = await self._process.stdout.readline()
+            if not raw:
+                return
+            line = raw.decode(errors="replace").rstrip()
+
+            if line.startswith(PROGRESS_PREFIX):
+                try:
+                    update = json.loads(line[len(PROGRESS_PREFIX) :])
+                except ValueError:
+                    update = None
+                if isinstance(update, dict):
+                    job.phase = update.get("phase", job.phase)
+                    job.progress = float(update.get("progress", job.progress))
+                    job.metrics.update(update.get("metrics") or {})
+                    await self._persist(job)
+                    self._publish(job, {"type": "progress", **job.to_dict()})
+                    continue
+
+            job.log.append(line)
+            self._publish(job, {"type": "log", "line": line})
+
+    def _publish(self, job: RetrainJob, event: Dict) -> None:
+        for queue in job.subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                pass  # A slow reader misses log lines, not the final state
+
+    async def _renew_lease(self) -> None:
+        while True:
+            await asyncio.sleep(self._lease.ttl / 3)
+            try:
+                await asyncio.to_thread(self._lease.acquire)
+            except Exception as e:
+                logger.warning(f"Could not renew retraining lease: {e}")
+
+    async def _persist(self, job: RetrainJob) -> None:
+        from services.firestore_service import get_db
+
+        try:
+            doc_ref = get_db().collection(self.collection).document(job.job_id)
+            await asyncio.to_thread(doc_ref.set, job.to_dict())
+        except Exception as e:
+            logger.warning(f"Could not save retraining job {job.job_id}: {e}")
+
+
+# Shared instance used by the admin endpoints
+retrain_jobs = RetrainJobManager(
+    timeout=float(os.getenv("RETRAIN_TIMEOUT", "3600")),
+    cpu_seconds=int(os.getenv("RETRAIN_CPU_SECONDS", "14400")),
+    memory_mb=int(os.getenv("RETRAIN_MEMORY_LIMIT_MB", "8192")),
+    nice=int(os.getenv("RETRAIN_NICE", "10")),
+)
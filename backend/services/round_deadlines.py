@@ -0,0 +1,187 @@
+"""
+Server-side round deadlines
+One min-heap of round deadlines across all live games; when a round's time is
+up the game's timeout action runs once, whether or not any client is connected
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from services.game_engine import GameOwnedElsewhere
+
+logger = logging.getLogger(__name__)
+
+# handler(game_id, game_type, round_number) runs the timeout action
+ExpireHandler = Callable[[str, str, int], Awaitable[None]]
+
+# Fields needed to rebuild deadlines of playing games
+DEADLINE_FIELDS = [
+    "game_type",
+    "current_round",
+    "round_start_time",
+    "settings.round_duration",
+]
+
+
+class RoundDeadlines:
+    """
+    Min-heap of (deadline, game_id, round_number)
+
+    **Behaviour:**
+    - schedule() is called whenever a game enters a round; a game has one
+      live deadline, so entries for earlier rounds are skipped lazily when
+      they reach the top of the heap (no removal from the middle)
+    - One task sleeps until the earliest deadline (woken early when a sooner
+      one is scheduled) and calls the handler for the round that expired
+    - The timeout action itself checks the round number, so a client or
+      another instance that already ended the round makes the call a no-op
+    - rehydrate() rebuilds the heap from playing games at startup, so rounds
+      still end after a restart
+
+    📝 DEFENSE JUSTIFICATION:
+    Round expiry used to rely on clients: every connected client called the
+    timeout endpoint (N reads and writes for one round), and a round nobody
+    was watching never ended. A heap gives O(log n) scheduling for all games
+    and a single timeout action per round.
+    """
+
+    def __init__(self, grace: float = 1.0):
+        self.grace = grace  # Let the clients' own timers go first
+
+        self.handler: Optional[ExpireHandler] = None
+        self._heap: List[Tuple[float, str, int, str]] = []
+        self._live: Dict[str, int] = {}  # game_id -> round with a live deadline
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._firing = set()  # Running timeout actions
+
+        self.stats = {"scheduled": 0, "fired": 0, "skipped": 0, "failed": 0}
+
+    # ==================== SCHEDULING ====================
+
+    def schedule(
+        self, game_id: str, game_type: str, round_number: int, seconds: float
+    ) -> None:
+        """Expire round_number of a game in `seconds` (replaces earlier rounds)"""
+        deadline = time.monotonic() + max(0.0, seconds) + self.grace
+        self._live[game_id] = round_number
+        heapq.heappush(self._heap, (deadline, game_id, round_number, game_type))
+        self.stats["scheduled"] += 1
+
+        if self._heap[0][1] == game_id and self._heap[0][2] == round_number:
+            self._wakeup.set()  # New earliest deadline
+        if self._task is None:
+            self.start()
+
+    def cancel(self, game_id: str) -> None:
+        """Forget a game's deadline (game finished or deleted)"""
+        self._live.pop(game_id, None)
+
+    @property
+    def pending(self) -> int:
+        return len(self._live)
+
+    # ==================== LIFECYCLE ====================
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def rehydrate(self) -> int:
+        """
+        Schedule the current round of every playing game (owned here)
+
+        Returns:
+            Number of games scheduled
+        """
+        from services.firestore_service import FirestoreService
+        from services.game_engine import game_engine
+
+        games = await asyncio.to_thread(
+            FirestoreService.get_games_by_status, "playing", None, DEADLINE_FIELDS
+        )
+        now = datetime.now(timezone.utc)
+        scheduled = 0
+        for game in games:
+            if game_engine.enabled and game_engine.owner_of(game["id"]) not in (
+                None,
+                game_engine.self_url,
+            ):
+                continue
+            if not game.get("current_round") or not game.get("game_type"):
+                continue
+
+            duration = game.get("settings", {}).get("round_duration", 60)
+            started = game.get("round_start_time")
+            elapsed = 0.0
+            if isinstance(started, datetime):
+                if started.tzinfo is None:
+                    started = started.replace(tzinfo=timezone.utc)
+                elapsed = (now - started).total_seconds()
+            self.schedule(
+                game["id"], game["game_type"], game["current_round"], duration - elapsed
+            )
+            scheduled += 1
+
+        logger.info(f"Round deadlines restored for {scheduled} playing games")
+        return scheduled
+
+    # ==================== INTERNALS ====================
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, game_id, round_number, game_type = heapq.heappop(self._heap)
+                if self._live.get(game_id) != round_number:
+                    self.stats["skipped"] += 1  # Superseded or cancelled
+                    continue
+                del self._live[game_id]
+                # Timeouts run concurrently; a slow one must not delay others
+                task = asyncio.get_running_loop().create_task(
+                    self._expire(game_id, game_type, round_number)
+                )
+                self._firing.add(task)
+                task.add_done_callback(self._firing.discard)
+
+    async def _expire(self, game_id: str, game_type: str, round_number: int) -> None:
+        if self.handler is None:
+            return
+        try:
+            await self.handler(game_id, game_type, round_number)
+            self.stats["fired"] += 1
+        except (HTTPException, GameOwnedElsewhere) as e:
+            # Game gone, already finished, or now owned by another instance
+            self.stats["skipped"] += 1
+            logger.debug(f"Round {round_number} timeout of {game_id} skipped: {e}")
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"Round {round_number} timeout of {game_id} failed: {e}")
+
+
+# Shared instance; games.py registers the timeout handler
+round_deadlines = RoundDeadlines(
+    grace=float(os.getenv("ROUND_DEADLINE_GRACE", "1.0")),
+)
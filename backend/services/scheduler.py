@@ -0,0 +1,349 @@
+"""
+In-process background scheduler for game lifecycle jobs
+One instance holds a Firestore leader lease and runs the periodic sweeps that
+used to depend on something calling the cleanup endpoints
+"""
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+# A job returns the number of items it processed (games, players...)
+JobFunc = Callable[[], Awaitable[int]]
+
+
+class LeaderLease:
+    """
+    Time-limited leadership stored in one Firestore document
+
+    acquire() takes the lease if it is free, expired or already ours, inside
+    a transaction so two instances never both win; holding it means renewing
+    before ttl seconds have passed.
+    """
+
+    def __init__(self, holder: str, ttl: float = 60, path: str = "scheduler/leader"):
+        self.holder = holder
+        self.ttl = ttl
+        self.path = path
+        self.expires_at = 0.0  # Local view of our own lease
+
+    @property
+    def held(self) -> bool:
+        return time.time() < self.expires_at
+
+    def acquire(self) -> bool:
+        """Take or renew the lease (blocking; run it in a thread)"""
+        from services.firestore_service import get_db
+
+        db = get_db()
+        collection, document = self.path.split("/")
+        doc_ref = db.collection(collection).document(document)
+
+        @firestore.transactional
+        def _take(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            now = time.time()
+            lease = snapshot.to_dict() if snapshot.exists else {}
+            if (
+                lease.get("holder") not in (None, self.holder)
+                and lease.get("expires_at", 0) > now
+            ):
+                return None
+            expires_at = now + self.ttl
+            transaction.set(
+                doc_ref,
+                {"holder": self.holder, "expires_at": expires_at, "renewed_at": now},
+            )
+            return expires_at
+
+        expires_at = _take(db.transaction())
+        self.expires_at = expires_at or 0.0
+        return expires_at is not None
+
+    def release(self) -> None:
+        """Give the lease up (shutdown) so another instance takes over at once"""
+        if not self.held:
+            return
+        from services.firestore_service import get_db
+
+        self.expires_at = 0.0
+        collection, document = self.path.split("/")
+        doc_ref = get_db().collection(collection).document(document)
+
+        @firestore.transactional
+        def _release(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            if snapshot.exists and snapshot.to_dict().get("holder") == self.holder:
+                transaction.delete(doc_ref)
+
+        _release(get_db().transaction())
+
+
+class ScheduledJob:
+    """A periodic job and its run statistics"""
+
+    def __init__(self, name: str, func: JobFunc, interval: float, jitter: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.next_run = time.monotonic() + self._delay()
+
+        self.runs = 0
+        self.failures = 0
+        self.last_run_at: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_items: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self.total_items = 0
+
+    def _delay(self) -> float:
+        """Interval +/- jitter, so instances and jobs do not line up"""
+        spread = self.interval * self.jitter
+        return self.interval + random.uniform(-spread, spread)
+
+    def schedule_next(self) -> None:
+        self.next_run = time.monotonic() + self._delay()
+
+    def status(self) -> Dict:
+        return {
+            "interval_seconds": self.interval,
+            "next_run_in": round(max(0.0, self.next_run - time.monotonic()), 1),
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at,
+            "last_duration_seconds": self.last_duration,
+            "last_items": self.last_items,
+            "total_items": self.total_items,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """
+    Periodic jobs run by whichever instance holds the leader lease
+
+    **Behaviour:**
+    - The lease is renewed every ttl/3 seconds (or taken over once the
+      previous leader stopped renewing it); followers run nothing
+    - Every `tick` seconds the leader runs the jobs that are due
+    - Due jobs run one after the other, then are rescheduled at their
+      interval +/- jitter; a failing job is logged and retried next time
+    - status() reports leadership and, per job, duration and item counts
+    - SCHEDULER_ENABLED=false turns the whole thing off (tests, local dev)
+
+    📝 DEFENSE JUSTIFICATION:
+    Abandoned games, stale players and presence drift were only cleaned up
+    if an external cron called the admin endpoints. Running the sweeps in
+    process removes that dependency; the lease keeps them from running N
+    times when the backend is scaled to N instances.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        lease_ttl: float = 60,
+        tick: float = 5,
+        jitter: float = 0.1,
+        instance_id: Optional[str] = None,
+    ):
+        self.enabled = enabled
+        self.tick = tick
+        self.jitter = jitter
+        self.instance_id = (
+            instance_id
+            or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        )
+        self.lease = LeaderLease(self.instance_id, ttl=lease_ttl)
+
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def add_job(
+        self, name: str, func: JobFunc, interval: float, jitter: Optional[float] = None
+    ) -> None:
+        """Register a job (interval <= 0 disables it)"""
+        if interval <= 0:
+            return
+        self._jobs[name] = ScheduledJob(
+            name, func, interval, self.jitter if jitter is None else jitter
+        )
+
+    # ==================== LIFECYCLE ====================
+
+    def start(self) -> None:
+        if not self.enabled:
+            logger.info("Scheduler disabled (SCHEDULER_ENABLED=false)")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(
+                f"Scheduler started as {self.instance_id}: "
+                f"{', '.join(self._jobs) or 'no jobs'}"
+            )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        try:
+            await asyncio.to_thread(self.lease.release)
+        except Exception as e:
+            logger.error(f"Scheduler lease release failed: {e}")
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None and not self._task.done(),
+            "instance_id": self.instance_id,
+            "leader": self.lease.held,
+            "jobs": {name: job.status() for name, job in self._jobs.items()},
+        }
+
+    # ==================== INTERNALS ====================
+
+    async def _run(self) -> None:
+        next_lease_check = 0.0
+        while True:
+            try:
+                # Renew at a third of the TTL rather than on every tick
+                if time.monotonic() >= next_lease_check:
+                    await asyncio.to_thread(self.lease.acquire)
+                    next_lease_check = time.monotonic() + self.lease.ttl / 3
+                if self.lease.held:
+                    await self._run_due_jobs()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduler tick failed: {e}")
+            await asyncio.sleep(self.tick)
+
+    async def _run_due_jobs(self) -> None:
+        for job in self._due_jobs():
+            if not self.lease.held:
+                return
+            started = time.monotonic()
+            job.last_run_at = time.time()
+            try:
+                items = await job.func()
+                job.last_items = items
+                job.total_items += items or 0
+                job.last_error = None
+            except Exception as e:
+                job.failures += 1
+                job.last_error = str(e)
+                logger.error(f"Scheduled job {job.name} failed: {e}")
+            job.runs += 1
+            job.last_duration = round(time.monotonic() - started, 3)
+            job.schedule_next()
+            if job.last_items:
+                logger.info(
+                    f"⏱️ {job.name}: {job.last_items} items in {job.last_duration}s"
+                )
+
+    def _due_jobs(self) -> List[ScheduledJob]:
+        now = time.monotonic()
+        return sorted(
+            (job for job in self._jobs.values() if job.next_run <= now),
+            key=lambda job: job.next_run,
+        )
+
+
+# ==================== LIFECYCLE JOBS ====================
+
+
+async def _active_game_ids() -> List[str]:
+    """IDs of waiting and playing games (pages of ID-only projections)"""
+    from services.firestore_service import MAX_PAGE_SIZE, FirestoreService
+
+    ids = []
+    for status in ("waiting", "playing"):
+        cursor = None
+        while True:
+            page = await asyncio.to_thread(
+                FirestoreService.get_games_page,
+                status,
+                None,
+                [],
+                page_size=MAX_PAGE_SIZE,
+                cursor=cursor,
+            )
+            ids.extend(game["id"] for game in page["games"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+    return ids
+
+
+async def cleanup_abandoned_games_job() -> int:
+    from services.presence_service import GameCleanupService
+
+    max_age = int(os.getenv("SCHEDULER_ABANDONED_MAX_AGE_MINUTES", "30"))
+    result = await GameCleanupService.cleanup_abandoned_games(max_age)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result["deleted_games"]
+
+
+async def cleanup_stale_players_job() -> int:
+    """Stale players of games whose heartbeats this instance does not track"""
+    from services.presence_service import GameCleanupService, PresenceService
+
+    removed = 0
+    for game_id in await _active_game_ids():
+        for player_id in await PresenceService.cleanup_stale_players(game_id):
+            await GameCleanupService.remove_player_from_game(game_id, player_id)
+            removed += 1
+    return removed
+
+
+async def sync_presence_job() -> int:
+    """
+    Drop lobby players whose RTDB presence went offline (opt-in: only
+    meaningful when clients call the /games/presence endpoints)
+    """
+    from services.firestore_service import FirestoreService
+    from services.presence_service import GameCleanupService
+
+    games = await asyncio.to_thread(
+        FirestoreService.get_games_by_status, "waiting", None, []
+    )
+    removed = 0
+    for game in games:
+        result = await GameCleanupService.sync_presence_to_firestore(game["id"])
+        removed += result.get("removed", 0)
+    return removed
+
+
+# Shared instance started by main.py
+scheduler = Scheduler(
+    enabled=os.getenv("SCHEDULER_ENABLED", "true").lower() == "true",
+    lease_ttl=float(os.getenv("SCHEDULER_LEASE_TTL", "60")),
+    tick=float(os.getenv("SCHEDULER_TICK", "5")),
+    jitter=float(os.getenv("SCHEDULER_JITTER", "0.1")),
+)
+scheduler.add_job(
+    "abandoned_games",
+    cleanup_abandoned_games_job,
+    interval=float(os.getenv("SCHEDULER_ABANDONED_INTERVAL", "300")),
+)
+scheduler.add_job(
+    "stale_players",
+    cleanup_stale_players_job,
+    interval=float(os.getenv("SCHEDULER_STALE_PLAYERS_INTERVAL", "60")),
+)
+scheduler.add_job(
+    "sync_presence",
+    sync_presence_job,
+    interval=float(os.getenv("SCHEDULER_SYNC_PRESENCE_INTERVAL", "0")),
+)
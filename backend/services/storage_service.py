@@ -1,20 +1,396 @@
 """
 Backend services for Firebase Storage operations
 Handles file uploads and downloads for drawings and models
+
+The storage backend is chosen by STORAGE_BACKEND: "firebase" (default, the
+Firebase Storage bucket, opened on first use) or "local" (a directory, for
+development and tests). Remote downloads go through a content-addressed disk
+cache so immutable objects (model versions, archive shards) are fetched once
+per node.
 """
 
 from firebase_admin import storage
-from typing import Optional, BinaryIO
+from typing import Dict, Optional, BinaryIO, List
+from datetime import timedelta
+import asyncio
 import base64
-import io
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Storage client, created on first use (needs an initialized Firebase app)
+_bucket = None
+
+
+def get_bucket():
+    """Lazy initialization of the Firebase Storage bucket"""
+    global _bucket
+    if _bucket is None:
+        _bucket = storage.bucket()
+    return _bucket
+
+
+# ==================== BACKENDS ====================
+# Both backends implement the same generic object interface:
+# upload_bytes / upload_file / download_range / download_to_file / list_files /
+# delete_file / file_exists / content_hash / public_url / signed_url
+# (blocking; StorageService runs them off the event loop).
+
+# Transfer chunk size (GCS resumable uploads need a multiple of 256 KB)
+CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE_MB", "8")) * 1024 * 1024
+
+
+def _part_path(dest_path: str) -> str:
+    """Partial download file; its size is the offset to resume from"""
+    return dest_path + ".part"
+
+
+def _resume_offset(part_path: str, version: str, size: int) -> int:
+    """
+    Offset to resume a partial download from (0: start over)
+
+    The object version the .part file was started from is kept next to
+    it; a .part file of another version (the object was replaced) is
+    discarded instead of being completed with bytes of the new one.
+    """
+    version_path = part_path + ".version"
+    if os.path.exists(part_path):
+        try:
+            with open(version_path) as f:
+                started_from = f.read().strip()
+        except OSError:
+            started_from = None
+        offset = os.path.getsize(part_path)
+        if started_from == version and offset <= size:
+            return offset
+        os.remove(part_path)
+
+    with open(version_path, "w") as f:
+        f.write(version)
+    return 0
+
+
+def _finish_part(part_path: str, dest_path: str) -> None:
+    os.replace(part_path, dest_path)
+    try:
+        os.remove(part_path + ".version")
+    except OSError:
+        pass
 
 
-# Initialize Storage client
-bucket = storage.bucket()
+class FirebaseStorageBackend:
+    """Objects in the Firebase Storage (GCS) bucket"""
+
+    is_local = False
+
+    def upload_bytes(
+        self,
+        storage_path: str,
+        data: bytes,
+        content_type: str = "application/octet-stream",
+    ) -> str:
+        get_bucket().blob(storage_path).upload_from_string(
+            data, content_type=content_type
+        )
+        return storage_path
+
+    def upload_file(
+        self,
+        storage_path: str,
+        file_obj: BinaryIO,
+        content_type: str = "application/octet-stream",
+        chunk_size: int = CHUNK_SIZE,
+    ) -> str:
+        # A chunk size makes this a resumable upload sent chunk by chunk
+        # (interrupted chunks are retried), never the whole file in memory
+        blob = get_bucket().blob(storage_path, chunk_size=chunk_size)
+        blob.upload_from_file(file_obj, content_type=content_type)
+        return storage_path
+
+    def download_to_file(
+        self, storage_path: str, dest_path: str, chunk_size: int = CHUNK_SIZE
+    ) -> int:
+        blob = get_bucket().get_blob(storage_path)
+        if blob is None:
+            raise FileNotFoundError(storage_path)
+
+        part_path = _part_path(dest_path)
+        offset = _resume_offset(part_path, str(blob.generation), blob.size)
+
+        with open(part_path, "ab" if offset else "wb") as f:
+            while offset < blob.size:
+                end = min(offset + chunk_size, blob.size)
+                # Pinned to one generation: a replaced object fails instead
+                # of mixing two versions in one file
+                chunk = blob.download_as_bytes(
+                    start=offset, end=end - 1, if_generation_match=blob.generation
+                )
+                f.write(chunk)
+                offset += len(chunk)
+
+        _finish_part(part_path, dest_path)
+        return blob.size
+
+    def download_range(
+        self, storage_path: str, start: int = 0, end: Optional[int] = None
+    ) -> bytes:
+        # GCS ranges are inclusive
+        return (
+            get_bucket()
+            .blob(storage_path)
+            .download_as_bytes(
+                start=start or None, end=end - 1 if end is not None else None
+            )
+        )
+
+    def list_files(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        blobs = get_bucket().list_blobs(prefix=prefix, max_results=limit)
+        return sorted(blob.name for blob in blobs)
+
+    def delete_file(self, storage_path: str) -> None:
+        get_bucket().blob(storage_path).delete()
+
+    def file_exists(self, storage_path: str) -> bool:
+        return get_bucket().blob(storage_path).exists()
+
+    def content_hash(self, storage_path: str) -> Optional[str]:
+        """MD5 of the stored object (one metadata request)"""
+        blob = get_bucket().get_blob(storage_path)
+        return blob.md5_hash if blob is not None else None
+
+    def public_url(self, storage_path: str) -> str:
+        return get_bucket().blob(storage_path).public_url
+
+    def signed_url(self, storage_path: str, expiration_minutes: int = 60) -> str:
+        return (
+            get_bucket()
+            .blob(storage_path)
+            .generate_signed_url(
+                version="v4",
+                expiration=timedelta(minutes=expiration_minutes),
+                method="GET",
+            )
+        )
+
+
+class LocalStorageBackend:
+    """
+    Objects as files under root_dir (same paths as in the bucket)
+
+    local_path() lets readers mmap files directly instead of downloading them.
+    """
+
+    is_local = True
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    def local_path(self, storage_path: str) -> str:
+        return os.path.join(self.root_dir, storage_path)
+
+    def upload_bytes(
+        self,
+        storage_path: str,
+        data: bytes,
+        content_type: str = "application/octet-stream",
+    ) -> str:
+        path = self.local_path(storage_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename: readers never see a partial file
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        return storage_path
+
+    def upload_file(
+        self,
+        storage_path: str,
+        file_obj: BinaryIO,
+        content_type: str = "application/octet-stream",
+        chunk_size: int = CHUNK_SIZE,
+    ) -> str:
+        path = self.local_path(storage_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            shutil.copyfileobj(file_obj, f, chunk_size)
+        os.replace(path + ".tmp", path)
+        return storage_path
+
+    def download_to_file(
+        self, storage_path: str, dest_path: str, chunk_size: int = CHUNK_SIZE
+    ) -> int:
+        source = self.local_path(storage_path)
+        stat = os.stat(source)
+        size = stat.st_size
+
+        part_path = _part_path(dest_path)
+        # Files are replaced by rename: mtime and size identify a version
+        offset = _resume_offset(part_path, f"{stat.st_mtime_ns}-{size}", size)
+
+        with open(source, "rb") as src, open(part_path, "ab" if offset else "wb") as f:
+            src.seek(offset)
+            shutil.copyfileobj(src, f, chunk_size)
+
+        _finish_part(part_path, dest_path)
+        return size
+
+    def download_range(
+        self, storage_path: str, start: int = 0, end: Optional[int] = None
+    ) -> bytes:
+        with open(self.local_path(storage_path), "rb") as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(end - start)
+
+    def list_files(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        base = self.local_path(prefix)
+        directory = base if prefix.endswith("/") else os.path.dirname(base)
+        if not os.path.isdir(directory):
+            return []
+
+        paths = []
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.relpath(os.path.join(dirpath, filename), self.root_dir)
+                path = path.replace(os.sep, "/")
+                if path.startswith(prefix):
+                    paths.append(path)
+        return sorted(paths)[:limit]
+
+    def delete_file(self, storage_path: str) -> None:
+        os.remove(self.local_path(storage_path))
+
+    def file_exists(self, storage_path: str) -> bool:
+        return os.path.exists(self.local_path(storage_path))
+
+    def content_hash(self, storage_path: str) -> Optional[str]:
+        return None  # Local files are read directly, never cached
+
+    def public_url(self, storage_path: str) -> str:
+        return "file://" + os.path.abspath(self.local_path(storage_path))
+
+    def signed_url(self, storage_path: str, expiration_minutes: int = 60) -> str:
+        return self.public_url(storage_path)
+
+
+# ==================== DOWNLOAD CACHE ====================
+
+
+class ContentCache:
+    """
+    Content-addressed, size-bounded disk cache for downloads
+
+    **Behaviour:**
+    - Objects are stored once under objects/{sha256 of content}; a key (an
+      immutable path + version, or a path + remote MD5) points to its object
+      through refs/{sha256 of key}
+    - Identical content downloaded under several keys is stored once
+    - When the cache grows past max_bytes, least recently used objects are
+      evicted (reads refresh the access time)
+
+    📝 DEFENSE JUSTIFICATION:
+    download_model re-downloaded the same ~10-50 MB model on every call, and
+    archive shards never change once written. Caching by content makes each
+    object one download per node; the size bound keeps disk usage fixed.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes_downloaded": 0}
+
+    @staticmethod
+    def _digest(value: bytes) -> str:
+        return hashlib.sha256(value).hexdigest()
+
+    def _ref_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, "refs", self._digest(key.encode()))
+
+    def _object_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, "objects", content_hash)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached content for a key, or None"""
+        try:
+            with open(self._ref_path(key)) as f:
+                object_path = self._object_path(f.read().strip())
+            with open(object_path, "rb") as f:
+                data = f.read()
+            os.utime(object_path)  # LRU: mark as recently used
+            self.stats["hits"] += 1
+            return data
+        except FileNotFoundError:
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store content under a key, then evict down to max_bytes"""
+        content_hash = self._digest(data)
+        object_path = self._object_path(content_hash)
+        ref_path = self._ref_path(key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+
+        with self._lock:
+            if not os.path.exists(object_path):
+                with open(object_path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(object_path + ".tmp", object_path)
+            with open(ref_path + ".tmp", "w") as f:
+                f.write(content_hash)
+            os.replace(ref_path + ".tmp", ref_path)
+            self._evict(keep=object_path)
+
+    def _evict(self, keep: str) -> None:
+        """Remove least recently used objects until under max_bytes"""
+        directory = os.path.join(self.cache_dir, "objects")
+        entries = []
+        total = 0
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp"):
+                continue
+            info = os.stat(path)
+            entries.append((info.st_mtime, info.st_size, path))
+            total += info.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)  # Dangling refs are treated as misses
+            total -= size
+            self.stats["evictions"] += 1
+
+
+def _select_backend():
+    if os.getenv("STORAGE_BACKEND", "firebase").lower() == "local":
+        return LocalStorageBackend(os.getenv("STORAGE_LOCAL_DIR", "./data/storage"))
+    return FirebaseStorageBackend()
+
+
+# Parallel downloads in StorageService.download_many
+DOWNLOAD_CONCURRENCY = int(os.getenv("STORAGE_DOWNLOAD_CONCURRENCY", "16"))
+
+# Shared backend and download cache
+storage_backend = _select_backend()
+download_cache = ContentCache(
+    cache_dir=os.getenv("STORAGE_CACHE_DIR", "./data/storage_cache"),
+    max_bytes=int(os.getenv("STORAGE_CACHE_MAX_MB", "2048")) * 1024 * 1024,
+)
 
 
 class StorageService:
-    """Service class for Firebase Storage operations"""
+    """Service class for Firebase Storage operations (on the selected backend)"""
 
     @staticmethod
     async def upload_drawing(
@@ -40,10 +416,9 @@ class StorageService:
 
         # Upload to Storage
         blob_path = f"drawings/{folder}/{drawing_id}.png"
-        blob = bucket.blob(blob_path)
-        blob.upload_from_string(image_bytes, content_type="image/png")
-
-        return blob_path
+        return await StorageService.upload_bytes(
+            blob_path, image_bytes, content_type="image/png"
+        )
 
     @staticmethod
     async def download_drawing(storage_path: str) -> bytes:
@@ -56,8 +431,7 @@ class StorageService:
         Returns:
             Raw image bytes
         """
-        blob = bucket.blob(storage_path)
-        return blob.download_as_bytes()
+        return await StorageService.download_range(storage_path)
 
     @staticmethod
     async def upload_model(
@@ -66,6 +440,9 @@ class StorageService:
         """
         Upload trained model to Firebase Storage
 
+        The file is streamed in STORAGE_CHUNK_SIZE_MB chunks (resumable
+        upload), not read into memory.
+
         Args:
             model_file: File object containing model (.h5)
             version: Model version (e.g., 'v1.0.1')
@@ -75,18 +452,23 @@ class StorageService:
             Storage path of uploaded model
         """
         blob_path = f"models/{folder}/{version}/quickdraw_{version}.h5"
-        blob = bucket.blob(blob_path)
 
         # Upload model file
-        blob.upload_from_file(model_file, content_type="application/x-hdf5")
-
-        return blob_path
+        return await asyncio.to_thread(
+            storage_backend.upload_file,
+            blob_path,
+            model_file,
+            "application/x-hdf5",
+        )
 
     @staticmethod
     async def download_model(version: str, folder: str = "production") -> bytes:
         """
         Download model from Firebase Storage
 
+        A model version is immutable, so it is served from the download cache
+        after the first fetch on this node.
+
         Args:
             version: Model version to download
             folder: Storage folder
@@ -95,9 +477,26 @@ class StorageService:
             Model file bytes
         """
         blob_path = f"models/{folder}/{version}/quickdraw_{version}.h5"
-        blob = bucket.blob(blob_path)
+        return await StorageService.download_cached(blob_path, version=version)
+
+    @staticmethod
+    async def download_model_to_file(
+        version: str, dest_path: str, folder: str = "production"
+    ) -> str:
+        """
+        Stream a model to disk in chunks (resumes an interrupted download)
 
-        return blob.download_as_bytes()
+        Args:
+            version: Model version to download
+            dest_path: Local .h5 path to write
+            folder: Storage folder
+
+        Returns:
+            dest_path
+        """
+        blob_path = f"models/{folder}/{version}/quickdraw_{version}.h5"
+        await StorageService.download_to_file(blob_path, dest_path)
+        return dest_path
 
     @staticmethod
     async def upload_model_metadata(
@@ -117,13 +516,12 @@ class StorageService:
         import json
 
         blob_path = f"models/{folder}/{version}/metadata.json"
-        blob = bucket.blob(blob_path)
 
         # Convert dict to JSON bytes
         metadata_json = json.dumps(metadata, indent=2)
-        blob.upload_from_string(metadata_json, content_type="application/json")
-
-        return blob_path
+        return await StorageService.upload_bytes(
+            blob_path, metadata_json.encode(), content_type="application/json"
+        )
 
     @staticmethod
     async def list_corrections(limit: int = 1000) -> list:
@@ -136,8 +534,204 @@ class StorageService:
         Returns:
             List of blob paths
         """
-        blobs = bucket.list_blobs(prefix="drawings/corrections/", max_results=limit)
-        return [blob.name for blob in blobs]
+        return await asyncio.to_thread(
+            storage_backend.list_files, "drawings/corrections/", limit
+        )
+
+    @staticmethod
+    async def download_corrections(
+        dest_dir: str, limit: int = 1000, concurrency: Optional[int] = None
+    ) -> Dict:
+        """
+        Download correction images into dest_dir in parallel
+
+        Args:
+            dest_dir: Local directory (one file per drawing)
+            limit: Maximum number of files
+            concurrency: Parallel downloads (STORAGE_DOWNLOAD_CONCURRENCY)
+
+        Returns:
+            Transfer statistics (see download_many)
+        """
+        paths = await StorageService.list_corrections(limit)
+        return await StorageService.download_many(
+            paths, dest_dir, prefix="drawings/corrections/", concurrency=concurrency
+        )
+
+    # ==================== STREAMING TRANSFERS ====================
+
+    @staticmethod
+    async def download_to_file(storage_path: str, dest_path: str) -> int:
+        """
+        Stream a file to disk chunk by chunk
+
+        Data goes to dest_path + ".part" and is renamed when complete; an
+        existing .part file is resumed from its current size if it was
+        started from the same object generation, otherwise discarded.
+
+        Returns:
+            Size of the file in bytes
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+        return await asyncio.to_thread(
+            storage_backend.download_to_file, storage_path, dest_path
+        )
+
+    @staticmethod
+    async def download_many(
+        paths: List[str],
+        dest_dir: str,
+        prefix: str = "",
+        concurrency: Optional[int] = None,
+    ) -> Dict:
+        """
+        Download many files with bounded concurrency
+
+        Files already present in dest_dir are skipped and partial ones
+        resumed, so an interrupted batch can simply be run again.
+
+        Args:
+            paths: Storage paths to download
+            dest_dir: Local directory; each file keeps its path below `prefix`
+            prefix: Leading part of the paths to drop locally
+            concurrency: Parallel downloads (STORAGE_DOWNLOAD_CONCURRENCY)
+
+        Returns:
+            {objects, skipped, failed, bytes, elapsed_seconds, objects_per_second}
+
+        📝 DEFENSE JUSTIFICATION:
+        Listing then downloading drawings one by one is bound by request
+        latency, not bandwidth. A semaphore keeps a fixed number of requests
+        in flight, which multiplies throughput without opening one connection
+        per file.
+        """
+        semaphore = asyncio.Semaphore(concurrency or DOWNLOAD_CONCURRENCY)
+        stats = {"objects": 0, "skipped": 0, "failed": 0, "bytes": 0}
+        start_time = time.time()
+
+        async def fetch(path: str):
+            dest_path = os.path.join(dest_dir, path[len(prefix) :].lstrip("/"))
+            if os.path.exists(dest_path):
+                stats["skipped"] += 1
+                return
+            async with semaphore:
+                try:
+                    size = await StorageService.download_to_file(path, dest_path)
+                    stats["bytes"] += size
+                    stats["objects"] += 1
+                except Exception as e:
+                    logger.warning(f"Download failed for {path}: {e}")
+                    stats["failed"] += 1
+
+        await asyncio.gather(*(fetch(path) for path in paths))
+
+        elapsed = time.time() - start_time
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["objects_per_second"] = round(stats["objects"] / max(elapsed, 1e-9), 1)
+        logger.info(
+            f"Downloaded {stats['objects']} objects ({stats['bytes']} B) in "
+            f"{elapsed:.2f}s, {stats['objects_per_second']} objects/s"
+        )
+        return stats
+
+    # ==================== GENERIC OBJECTS ====================
+    # Interface used by the drawing archive
+
+    @staticmethod
+    async def upload_bytes(
+        storage_path: str, data: bytes, content_type: str = "application/octet-stream"
+    ) -> str:
+        """
+        Upload raw bytes to a path
+
+        Returns:
+            Storage path of uploaded file
+        """
+        return await asyncio.to_thread(
+            storage_backend.upload_bytes, storage_path, data, content_type
+        )
+
+    @staticmethod
+    async def download_range(
+        storage_path: str, start: int = 0, end: Optional[int] = None
+    ) -> bytes:
+        """
+        Download bytes [start, end) of a file (the whole file by default)
+
+        Args:
+            storage_path: Path to file in Storage
+            start: First byte offset
+            end: Offset after the last byte, or None for end of file
+
+        Returns:
+            Requested bytes
+        """
+        return await asyncio.to_thread(
+            storage_backend.download_range, storage_path, start, end
+        )
+
+    @staticmethod
+    async def download_cached(
+        storage_path: str, version: Optional[str] = None
+    ) -> bytes:
+        """
+        Download a whole file through the content-addressed cache
+
+        Args:
+            storage_path: Path to file in Storage
+            version: Identifier of immutable content (e.g. model version);
+                without it the remote content hash is checked (one metadata
+                request) so a changed object is downloaded again
+
+        Returns:
+            File bytes
+        """
+        if storage_backend.is_local:
+            return await StorageService.download_range(storage_path)
+
+        if version is None:
+            version = await asyncio.to_thread(
+                storage_backend.content_hash, storage_path
+            )
+        key = f"{storage_path}@{version}" if version else None
+
+        if key is not None:
+            data = await asyncio.to_thread(download_cache.get, key)
+            if data is not None:
+                return data
+
+        data = await StorageService.download_range(storage_path)
+        download_cache.stats["bytes_downloaded"] += len(data)
+        if key is not None:
+            try:
+                await asyncio.to_thread(download_cache.put, key, data)
+            except OSError as e:
+                logger.warning(f"Could not cache {storage_path}: {e}")
+        return data
+
+    @staticmethod
+    async def list_files(prefix: str) -> List[str]:
+        """
+        List every file path under a prefix (all pages)
+
+        Args:
+            prefix: Path prefix (e.g. 'archive/drawings/')
+
+        Returns:
+            Sorted list of paths
+        """
+        return await asyncio.to_thread(storage_backend.list_files, prefix)
+
+    @staticmethod
+    def local_path(storage_path: str) -> Optional[str]:
+        """Filesystem path of a file on the local backend (None if remote)"""
+        if storage_backend.is_local:
+            return storage_backend.local_path(storage_path)
+        return None
+
+    @staticmethod
+    def cache_stats() -> Dict:
+        return dict(download_cache.stats)
 
     @staticmethod
     async def delete_file(storage_path: str) -> None:
@@ -147,8 +741,7 @@ class StorageService:
         Args:
             storage_path: Path to file in Storage
         """
-        blob = bucket.blob(storage_path)
-        blob.delete()
+        await asyncio.to_thread(storage_backend.delete_file, storage_path)
 
     @staticmethod
     async def file_exists(storage_path: str) -> bool:
@@ -161,8 +754,7 @@ class StorageService:
         Returns:
             True if file exists, False otherwise
         """
-        blob = bucket.blob(storage_path)
-        return blob.exists()
+        return await asyncio.to_thread(storage_backend.file_exists, storage_path)
 
     @staticmethod
     async def get_public_url(storage_path: str) -> str:
@@ -175,8 +767,7 @@ class StorageService:
         Returns:
             Public URL
         """
-        blob = bucket.blob(storage_path)
-        return blob.public_url
+        return storage_backend.public_url(storage_path)
 
     @staticmethod
     async def get_signed_url(storage_path: str, expiration_minutes: int = 60) -> str:
@@ -190,10 +781,6 @@ class StorageService:
         Returns:
             Signed URL
         """
-        from datetime import timedelta
-
-        blob = bucket.blob(storage_path)
-        url = blob.generate_signed_url(
-            version="v4", expiration=timedelta(minutes=expiration_minutes), method="GET"
+        return await asyncio.to_thread(
+            storage_backend.signed_url, storage_path, expiration_minutes
         )
-        return url
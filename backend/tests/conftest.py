@@ -0,0 +1,9 @@
+"""
+Shared test setup: backend modules are imported as top-level packages
+(services, routers, ...), the same way main.py runs them
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,115 @@
+"""
+DrawingArchive shards written to and read back from a local storage directory
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+import services.storage_service as storage_service
+from services.drawing_archive import DrawingArchive
+from services.drawing_codec import DRAWING_BYTES, IMAGE_SIZE
+from services.storage_service import LocalStorageBackend, StorageService
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        storage_service, "storage_backend", LocalStorageBackend(str(tmp_path))
+    )
+    return DrawingArchive(storage=StorageService, prefix="archive/test", shard_size=4)
+
+
+def make_drawings(count, start=0):
+    rng = np.random.default_rng(start)
+    drawings = []
+    for i in range(start, start + count):
+        image = rng.integers(0, 256, DRAWING_BYTES, dtype=np.uint8).tobytes()
+        data = {
+            "imageBytes": image,
+            "targetCategory": f"label{i}",
+            "gameMode": "solo",
+            "aiPrediction": f"guess{i}",
+            "aiConfidence": i / 10,
+            "wasCorrect": i % 2 == 0,
+        }
+        drawings.append((f"d{i}", data))
+    return drawings
+
+
+def images_of(drawings):
+    return np.stack(
+        [
+            np.frombuffer(data["imageBytes"], dtype=np.uint8).reshape(
+                IMAGE_SIZE, IMAGE_SIZE
+            )
+            for _, data in drawings
+        ]
+    )
+
+
+def test_full_shard_round_trip(archive):
+    drawings = make_drawings(6)
+
+    async def scenario():
+        written = await archive.append(drawings)
+        names = await archive.list_shards()
+        index = await archive.read_index(names[0])
+        mapped = await archive.read_shard(names[0])
+        loaded = await archive.read_shard(names[0], mmap=False)
+        return written, names, index, np.array(mapped), loaded
+
+    written, names, index, mapped, loaded = asyncio.run(scenario())
+
+    assert written == 1
+    assert len(names) == 1
+    assert archive.buffered == 2
+    assert index["count"] == 4
+    assert index["ids"] == ["d0", "d1", "d2", "d3"]
+    assert index["labels"] == ["label0", "label1", "label2", "label3"]
+    assert index["wasCorrect"] == [True, False, True, False]
+    np.testing.assert_array_equal(mapped, images_of(drawings[:4]))
+    np.testing.assert_array_equal(loaded, images_of(drawings[:4]))
+
+
+def test_read_range_matches_shard_slice(archive):
+    drawings = make_drawings(4)
+
+    async def scenario():
+        await archive.append(drawings)
+        (name,) = await archive.list_shards()
+        return (
+            await archive.read_range(name, 1, 3),
+            await archive.read_range(name, 3, 10),
+            await archive.read_range(name, 4, 5),
+        )
+
+    middle, tail, empty = asyncio.run(scenario())
+
+    np.testing.assert_array_equal(middle, images_of(drawings[1:3]))
+    np.testing.assert_array_equal(tail, images_of(drawings[3:4]))
+    assert empty.shape == (0, IMAGE_SIZE, IMAGE_SIZE)
+
+
+def test_flush_adds_a_shard_to_the_index(archive):
+    first, second = make_drawings(4), make_drawings(3, start=4)
+
+    async def scenario():
+        await archive.append(first)
+        await archive.append(second + [("bad", {"imageBytes": b"too short"})])
+        flushed = await archive.flush()
+        names = await archive.list_shards()
+        indexes = [await archive.read_index(name) for name in names]
+        shards = [await archive.read_shard(name) for name in names]
+        return flushed, names, indexes, shards
+
+    flushed, names, indexes, shards = asyncio.run(scenario())
+
+    assert names[-1] == flushed
+    assert [index["count"] for index in indexes] == [4, 3]
+    assert indexes[1]["ids"] == ["d4", "d5", "d6"]
+    np.testing.assert_array_equal(np.concatenate(shards), images_of(first + second))
+    assert archive.buffered == 0
+    assert archive.stats["skipped"] == 1
+    assert archive.stats["shards"] == 2
@@ -0,0 +1,106 @@
+"""
+PresenceTracker expiry against an in-memory stand-in for RTDB
+"""
+
+import asyncio
+import time
+
+import pytest
+
+import services.presence_service as presence_service
+from services.presence_service import GameCleanupService, PresenceService
+from services.presence_tracker import PresenceTracker
+
+
+class FakeRTDB:
+    """Flat path -> value store with the subset of the RTDB reference API we use"""
+
+    def __init__(self, data=None, path=""):
+        self.data = {} if data is None else data
+        self.path = path
+
+    def child(self, path):
+        return FakeRTDB(self.data, f"{self.path}/{path}".strip("/"))
+
+    def _resolve(self, value):
+        if value == {".sv": "timestamp"}:
+            return int(time.time() * 1000)
+        return value
+
+    def get(self):
+        return self.data.get(self.path)
+
+    def set(self, value):
+        for key, item in value.items():
+            self.child(key).update_value(item)
+
+    def update(self, values):
+        for key, item in values.items():
+            self.child(key).update_value(item)
+
+    def update_value(self, value):
+        self.data[self.path] = self._resolve(value)
+
+    def delete(self):
+        for key in [k for k in self.data if k.startswith(self.path)]:
+            del self.data[key]
+
+
+@pytest.fixture
+def rtdb(monkeypatch):
+    fake = FakeRTDB()
+    monkeypatch.setattr(presence_service, "get_rtdb", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def removed(monkeypatch):
+    calls = []
+
+    async def remove_player_from_game(game_id, player_id):
+        calls.append((game_id, player_id))
+        return {"success": True}
+
+    monkeypatch.setattr(
+        GameCleanupService, "remove_player_from_game", remove_player_from_game
+    )
+    return calls
+
+
+def test_player_without_heartbeats_is_removed(rtdb, removed):
+    tracker = PresenceTracker(presence_timeout=0.2, cleanup_threshold=0.4, tick=0.05)
+
+    async def scenario():
+        tracker.touch("game1", "p1")
+        await PresenceService.set_player_online("game1", "p1", "Alice")
+        await asyncio.sleep(1.0)
+        await tracker.stop()
+
+    asyncio.run(scenario())
+
+    # Marked offline first (which stamps lastSeen), then removed regardless
+    assert rtdb.data["presence/game1/p1/online"] is False
+    assert removed == [("game1", "p1")]
+    assert not tracker.tracks("game1")
+    assert tracker.stats["marked_offline"] == 1
+    assert tracker.stats["removed"] == 1
+
+
+def test_heartbeat_through_another_instance_keeps_player(rtdb, removed):
+    tracker = PresenceTracker(presence_timeout=0.2, cleanup_threshold=0.4, tick=0.05)
+
+    async def scenario():
+        tracker.touch("game1", "p1")
+        # Another instance keeps writing this player's heartbeats
+        for _ in range(10):
+            rtdb.child("presence/game1/p1").update(
+                {"lastHeartbeat": {".sv": "timestamp"}, "online": True}
+            )
+            await asyncio.sleep(0.1)
+        await tracker.stop()
+
+    asyncio.run(scenario())
+
+    assert removed == []
+    assert tracker.tracks("game1")
+    assert tracker.stats["marked_offline"] == 0
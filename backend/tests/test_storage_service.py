@@ -0,0 +1,158 @@
+"""
+Download cache, resumable downloads and parallel downloads on the local backend
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+import services.storage_service as storage_service
+from services.storage_service import (
+    ContentCache,
+    LocalStorageBackend,
+    StorageService,
+)
+
+
+class CountingBackend(LocalStorageBackend):
+    """Local backend that records how many downloads run at the same time"""
+
+    def __init__(self, root_dir):
+        super().__init__(root_dir)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def download_to_file(self, storage_path, dest_path, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(0.02)
+            return super().download_to_file(storage_path, dest_path, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    backend = CountingBackend(str(tmp_path / "bucket"))
+    monkeypatch.setattr(storage_service, "storage_backend", backend)
+    return backend
+
+
+# ==================== CONTENT CACHE ====================
+
+
+def test_cache_miss_then_hit(tmp_path):
+    cache = ContentCache(str(tmp_path))
+
+    assert cache.get("models/a.h5@v1") is None
+    cache.put("models/a.h5@v1", b"weights")
+
+    assert cache.get("models/a.h5@v1") == b"weights"
+    assert cache.get("models/a.h5@v2") is None
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 2
+
+
+def test_cache_stores_identical_content_once(tmp_path):
+    cache = ContentCache(str(tmp_path))
+    cache.put("a@1", b"same bytes")
+    cache.put("b@1", b"same bytes")
+
+    assert cache.get("b@1") == b"same bytes"
+    assert len(os.listdir(tmp_path / "objects")) == 1
+    assert len(os.listdir(tmp_path / "refs")) == 2
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ContentCache(str(tmp_path), max_bytes=25)
+    cache.put("old", b"o" * 10)
+    cache.put("used", b"u" * 10)
+    os.utime(cache._object_path(cache._digest(b"o" * 10)), (0, 0))
+
+    cache.put("new", b"n" * 10)
+
+    assert cache.get("old") is None
+    assert cache.get("used") == b"u" * 10
+    assert cache.get("new") == b"n" * 10
+    assert cache.stats["evictions"] == 1
+
+
+# ==================== RESUMABLE DOWNLOADS ====================
+
+
+def write_object(backend, path, data):
+    backend.upload_bytes(path, data)
+    stat = os.stat(backend.local_path(path))
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def test_part_file_of_same_version_is_resumed(backend, tmp_path):
+    version = write_object(backend, "models/m.h5", b"0123456789")
+    dest = str(tmp_path / "out" / "m.h5")
+    os.makedirs(os.path.dirname(dest))
+    # A marker prefix shows that the existing bytes were kept, not re-fetched
+    with open(dest + ".part", "wb") as f:
+        f.write(b"XXXX")
+    with open(dest + ".part.version", "w") as f:
+        f.write(version)
+
+    size = asyncio.run(StorageService.download_to_file("models/m.h5", dest))
+
+    assert size == 10
+    with open(dest, "rb") as f:
+        assert f.read() == b"XXXX456789"
+    assert not os.path.exists(dest + ".part")
+    assert not os.path.exists(dest + ".part.version")
+
+
+def test_part_file_of_other_version_is_discarded(backend, tmp_path):
+    write_object(backend, "models/m.h5", b"0123456789")
+    dest = str(tmp_path / "out" / "m.h5")
+    os.makedirs(os.path.dirname(dest))
+    with open(dest + ".part", "wb") as f:
+        f.write(b"XXXX")
+    with open(dest + ".part.version", "w") as f:
+        f.write("replaced-object")
+
+    asyncio.run(StorageService.download_to_file("models/m.h5", dest))
+
+    with open(dest, "rb") as f:
+        assert f.read() == b"0123456789"
+
+
+# ==================== PARALLEL DOWNLOADS ====================
+
+
+def test_download_many_is_bounded_and_skips_existing(backend, tmp_path):
+    paths = [f"drawings/corrections/d{i}.png" for i in range(12)]
+    for i, path in enumerate(paths):
+        write_object(backend, path, bytes([i]) * (i + 1))
+    dest_dir = str(tmp_path / "out")
+    os.makedirs(dest_dir)
+    with open(os.path.join(dest_dir, "d0.png"), "wb") as f:
+        f.write(b"already here")
+
+    stats = asyncio.run(
+        StorageService.download_many(
+            paths + ["drawings/corrections/missing.png"],
+            dest_dir,
+            prefix="drawings/corrections/",
+            concurrency=4,
+        )
+    )
+
+    assert stats["objects"] == 11
+    assert stats["skipped"] == 1
+    assert stats["failed"] == 1
+    assert stats["bytes"] == sum(range(2, 13))
+    assert 1 < backend.max_active <= 4
+    for i in range(1, 12):
+        with open(os.path.join(dest_dir, f"d{i}.png"), "rb") as f:
+            assert f.read() == bytes([i]) * (i + 1)
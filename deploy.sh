@@ -97,11 +97,11 @@ deploy_backend() {
     print_success "Backend déployé sur Cloud Run"
 }
 
-# Déployer Firestore rules
+# Déployer Firestore rules et index composites
 deploy_firestore() {
-    print_header "Déploiement des règles Firestore"
-    firebase deploy --only firestore:rules
-    print_success "Règles Firestore déployées"
+    print_header "Déploiement des règles et index Firestore"
+    firebase deploy --only firestore:rules,firestore:indexes
+    print_success "Règles et index Firestore déployés"
 }
 
 # Menu principal
@@ -131,7 +131,7 @@ case "${1:-all}" in
         echo "Options:"
         echo "  frontend   - Déploie uniquement le frontend (Firebase Hosting)"
         echo "  backend    - Déploie uniquement le backend (Cloud Run)"
-        echo "  firestore  - Déploie uniquement les règles Firestore"
+        echo "  firestore  - Déploie uniquement les règles et index Firestore"
         echo "  all        - Déploie tout (par défaut)"
         exit 1
         ;;
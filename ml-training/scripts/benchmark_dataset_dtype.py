@@ -0,0 +1,159 @@
+"""
+Benchmark dataset storage: float32 [0, 1] vs uint8 (0-255)
+
+Writes the same 100-class dataset in both formats (same chunking and gzip
+level as preprocess_dataset.py) and compares:
+- file size on disk
+- memory of the loaded training arrays
+- load time (HDF5 → numpy)
+- input throughput: batches of float32 [0, 1] produced per second
+  (numpy; plus the tf.data pipeline of quickdraw_data when TensorFlow is
+  installed)
+
+Uses ../data/quickdraw_100cat.h5 if it exists, otherwise synthetic drawings.
+"""
+
+import os
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+from quickdraw_data import IMAGE_SHAPE, read_images
+
+NUM_CLASSES = 100
+SAMPLES_PER_CLASS = 2000
+BATCH_SIZE = 128
+CHUNK_ROWS = 1024
+
+
+def synthetic_dataset(rng: np.random.Generator) -> tuple:
+    """Stroke-like uint8 drawings: a random template per class, jittered"""
+    templates = np.zeros((NUM_CLASSES, 28, 28), dtype=np.uint8)
+    for template in templates:
+        for _ in range(rng.integers(3, 7)):
+            y0, x0 = rng.integers(4, 24, size=2)
+            if rng.random() < 0.5:
+                template[y0, x0 : x0 + rng.integers(4, 12)] = 255
+            else:
+                template[y0 : y0 + rng.integers(4, 12), x0] = 255
+
+    labels = np.repeat(np.arange(NUM_CLASSES, dtype=np.int32), SAMPLES_PER_CLASS)
+    rng.shuffle(labels)
+    shifts = rng.integers(-2, 3, size=(len(labels), 2))
+    images = np.empty((len(labels), 28, 28), dtype=np.uint8)
+    for i, (label, (dy, dx)) in enumerate(zip(labels, shifts)):
+        images[i] = np.roll(templates[label], (dy, dx), axis=(0, 1))
+    return images.reshape((-1,) + IMAGE_SHAPE), labels
+
+
+def load_dataset() -> tuple:
+    path = "../data/quickdraw_100cat.h5"
+    if os.path.exists(path):
+        print(f"Using {path}")
+        with h5py.File(path, "r") as f:
+            return read_images(f["train/images"]), f["train/labels"][:]
+    print(f"Using synthetic drawings ({NUM_CLASSES} classes)")
+    return synthetic_dataset(np.random.default_rng(42))
+
+
+def write(path: str, images: np.ndarray, labels: np.ndarray):
+    with h5py.File(path, "w") as f:
+        f.create_dataset(
+            "train/images",
+            data=images,
+            chunks=(CHUNK_ROWS,) + IMAGE_SHAPE,
+            compression="gzip",
+            compression_opts=4,
+        )
+        f.create_dataset("train/labels", data=labels)
+
+
+def read(path: str) -> tuple:
+    start = time.perf_counter()
+    with h5py.File(path, "r") as f:
+        images = f["train/images"][:]
+    return images, time.perf_counter() - start
+
+
+def numpy_batches_per_second(images: np.ndarray, seconds: float = 2.0) -> float:
+    """Random batches gathered and converted to float32 [0, 1]"""
+    rng = np.random.default_rng(0)
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        batch = images[np.sort(rng.integers(0, len(images), BATCH_SIZE))]
+        if batch.dtype == np.uint8:
+            batch = batch.astype(np.float32) * (1.0 / 255.0)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def tf_batches_per_second(images: np.ndarray, labels: np.ndarray) -> float:
+    from quickdraw_data import make_dataset
+
+    dataset = make_dataset(images, labels, BATCH_SIZE, shuffle=True).take(2000)
+    start = time.perf_counter()
+    count = sum(1 for _ in dataset)
+    return count / (time.perf_counter() - start)
+
+
+def run_benchmark() -> dict:
+    images_u8, labels = load_dataset()
+    images_f32 = images_u8.astype(np.float32) / 255.0
+
+    results = {"samples": len(labels)}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, images in (("float32", images_f32), ("uint8", images_u8)):
+            path = os.path.join(tmp, f"{name}.h5")
+            write(path, images, labels)
+            loaded, seconds = read(path)
+            results[name] = {
+                "file_mb": os.path.getsize(path) / 1024**2,
+                "memory_mb": loaded.nbytes / 1024**2,
+                "load_seconds": seconds,
+                "numpy_batches_per_second": numpy_batches_per_second(loaded),
+            }
+
+    # Skipped without TensorFlow (make_dataset imports it lazily)
+    try:
+        results["uint8"]["tf_batches_per_second"] = tf_batches_per_second(
+            images_u8, labels
+        )
+    except ImportError:
+        pass
+
+    return results
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Dataset dtype benchmark: float32 [0,1] vs uint8")
+    print("=" * 60)
+
+    r = run_benchmark()
+    f32, u8 = r["float32"], r["uint8"]
+
+    print(f"\n📦 {r['samples']:,} training drawings")
+    print(f"{'':22}{'float32':>12}{'uint8':>12}{'uint8 gain':>12}")
+    for key, label, lower_is_better in (
+        ("file_mb", "File (MB)", True),
+        ("memory_mb", "Memory (MB)", True),
+        ("load_seconds", "Load (s)", True),
+        ("numpy_batches_per_second", "Batches/s (numpy)", False),
+    ):
+        gain = f32[key] / u8[key] if lower_is_better else u8[key] / f32[key]
+        print(f"{label:22}{f32[key]:>12.2f}{u8[key]:>12.2f}{gain:>11.1f}x")
+
+    full_size = 70000 * NUM_CLASSES * 28 * 28
+    print(
+        f"\n   Full 100-class dataset (70k/class): "
+        f"{full_size * 4 / 1024**3:.1f} GB float32 vs {full_size / 1024**3:.1f} GB uint8"
+    )
+    if "tf_batches_per_second" in u8:
+        print(
+            f"⚡ tf.data pipeline (uint8 → float32): {u8['tf_batches_per_second']:.0f} batches/s"
+        )
+    else:
+        print("   (TensorFlow not installed: tf.data pipeline not measured)")
@@ -0,0 +1,98 @@
+"""
+Benchmark storage formats for user drawings
+
+Compares the legacy imageBase64 format (28x28 PNG, base64) with imageBytes
+(784 raw uint8 bytes) on synthetic canvas drawings:
+- bytes stored per drawing
+- time to decode N drawings into an (N, 28, 28) array
+"""
+
+import base64
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def synthetic_drawing(rng: np.random.Generator) -> Image.Image:
+    """A 280x280 canvas with a few random strokes, reduced like the backend"""
+    canvas = Image.new("L", (280, 280), 255)
+    draw = ImageDraw.Draw(canvas)
+    for _ in range(rng.integers(2, 8)):
+        points = [
+            tuple(p) for p in rng.integers(20, 260, size=(rng.integers(3, 12), 2))
+        ]
+        draw.line(points, fill=0, width=8)
+    small = canvas.resize((28, 28), Image.LANCZOS)
+    return Image.fromarray(255 - np.asarray(small, dtype=np.uint8))
+
+
+def encode_png_base64(img: Image.Image) -> str:
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def decode_png_base64(blobs: list) -> np.ndarray:
+    """Legacy path: one base64 + PNG decode per drawing"""
+    images = [
+        np.array(Image.open(BytesIO(base64.b64decode(b))).convert("L"), dtype=np.uint8)
+        for b in blobs
+    ]
+    return np.stack(images)
+
+
+def decode_raw(blobs: list) -> np.ndarray:
+    """Compact path: a single np.frombuffer over the concatenated bytes"""
+    return np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(-1, 28, 28)
+
+
+def run_benchmark(n: int = 5000, seed: int = 42) -> dict:
+    rng = np.random.default_rng(seed)
+    drawings = [synthetic_drawing(rng) for _ in range(n)]
+
+    png_blobs = [encode_png_base64(img) for img in drawings]
+    raw_blobs = [np.asarray(img, dtype=np.uint8).tobytes() for img in drawings]
+
+    start = time.perf_counter()
+    png_array = decode_png_base64(png_blobs)
+    png_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    raw_array = decode_raw(raw_blobs)
+    raw_seconds = time.perf_counter() - start
+
+    assert np.array_equal(png_array, raw_array), "Formats decode differently"
+
+    return {
+        "drawings": n,
+        "png_base64_bytes": sum(len(b) for b in png_blobs) / n,
+        "raw_bytes": sum(len(b) for b in raw_blobs) / n,
+        "png_decode_seconds": png_seconds,
+        "raw_decode_seconds": raw_seconds,
+    }
+
+
+if __name__ == "__main__":
+    N_DRAWINGS = 5000
+
+    print("=" * 60)
+    print(f"Drawing storage benchmark ({N_DRAWINGS:,} synthetic drawings)")
+    print("=" * 60)
+
+    r = run_benchmark(N_DRAWINGS)
+
+    print("\n📦 Stored size per drawing")
+    print(f"   imageBase64 (PNG):  {r['png_base64_bytes']:.0f} B")
+    print(f"   imageBytes (raw):   {r['raw_bytes']:.0f} B")
+    print(f"\n⚡ Decode {r['drawings']:,} drawings into (N, 28, 28)")
+    print(
+        f"   imageBase64 (PIL):  {r['png_decode_seconds'] * 1000:.1f} ms "
+        f"({r['drawings'] / r['png_decode_seconds']:,.0f} drawings/s)"
+    )
+    print(
+        f"   imageBytes (numpy): {r['raw_decode_seconds'] * 1000:.1f} ms "
+        f"({r['drawings'] / r['raw_decode_seconds']:,.0f} drawings/s)"
+    )
+    print(f"   Speedup: {r['png_decode_seconds'] / r['raw_decode_seconds']:.0f}x")
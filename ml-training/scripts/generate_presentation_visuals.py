@@ -10,6 +10,8 @@ import json
 import os
 from pathlib import Path
 
+from quickdraw_data import gather_rows, open_raw_category
+
 # Configuration
 CATEGORIES = [
     "airplane",
@@ -48,20 +50,16 @@ def create_output_dirs(category: str):
 
 
 def load_sample_drawings(category: str, n_samples: int = NUM_EXAMPLES):
-    """Load n sample drawings from .npy file"""
-    filepath = os.path.join(RAW_DATA_DIR, f"{category}.npy")
-
-    if not os.path.exists(filepath):
-        print(f"❌ File not found: {filepath}")
+    """Load n sample drawings from .npy file (memory-mapped, only sampled rows are read)"""
+    data = open_raw_category(os.path.join(RAW_DATA_DIR, f"{category}.npy"))
+    if data is None:
         return None
 
-    # Load .npy file
-    data = np.load(filepath)
-
-    # Random sample
-    np.random.seed(RANDOM_SEED)
-    indices = np.random.choice(len(data), n_samples, replace=False)
-    samples = data[indices]
+    # Random sample (same drawings as before: seeded legacy generator)
+    indices = np.random.RandomState(RANDOM_SEED).choice(
+        len(data), n_samples, replace=False
+    )
+    samples = gather_rows(data, indices)
 
     print(f"✅ Loaded {n_samples} samples from {category}")
     return samples
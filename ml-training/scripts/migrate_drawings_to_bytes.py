@@ -0,0 +1,136 @@
+"""
+Migrate user drawings from imageBase64 (PNG) to imageBytes (raw uint8)
+
+Each legacy document gets imageBytes (784 raw bytes, 28x28, white ink on
+black) and imageFormat = "u8-28x28"; imageBase64 is removed once the bytes
+are written. Documents are processed in batched writes and the script can be
+re-run safely: already migrated documents have no imageBase64 left.
+"""
+
+import base64
+import os
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+DRAWING_FORMAT = "u8-28x28"
+BATCH_SIZE = 500  # Firestore limit per WriteBatch
+
+
+def png_base64_to_bytes(image_base64: str) -> bytes:
+    """Decode a stored 28x28 PNG into 784 raw grayscale bytes"""
+    img = Image.open(BytesIO(base64.b64decode(image_base64))).convert("L")
+    if img.size != (28, 28):
+        img = img.resize((28, 28), Image.LANCZOS)
+    return np.asarray(img, dtype=np.uint8).tobytes()
+
+
+def migrate_drawings(db, dry_run: bool = False, page_size: int = BATCH_SIZE) -> dict:
+    """
+    Convert every drawing that still has imageBase64
+
+    Args:
+        db: Firestore client
+        dry_run: Only count documents and bytes, write nothing
+        page_size: Documents per query page and per write batch
+
+    Returns:
+        Migration statistics
+    """
+    stats = {"migrated": 0, "failed": 0, "base64_bytes": 0, "raw_bytes": 0}
+    start_time = time.time()
+    collection = db.collection("user_drawings")
+    last_doc = None
+
+    while True:
+        # imageBase64 > "" matches every document that still has the field
+        query = (
+            collection.where("imageBase64", ">", "")
+            .order_by("imageBase64")
+            .select(["imageBase64"])
+            .limit(page_size)
+        )
+        if dry_run and last_doc is not None:
+            # Nothing is written, so page with a cursor instead
+            query = query.start_after(last_doc)
+
+        docs = list(query.stream())
+        if not docs:
+            break
+        last_doc = docs[-1]
+
+        batch = db.batch()
+        for doc in docs:
+            image_base64 = doc.to_dict().get("imageBase64", "")
+            try:
+                raw = png_base64_to_bytes(image_base64)
+            except Exception as e:
+                print(f"⚠️  Could not decode drawing {doc.id}: {e}")
+                stats["failed"] += 1
+                if not dry_run:
+                    # Keep the original under another name so paging moves on
+                    batch.update(
+                        doc.reference,
+                        {
+                            "imageBase64Invalid": image_base64,
+                            "imageBase64": firestore.DELETE_FIELD,
+                        },
+                    )
+                continue
+
+            stats["migrated"] += 1
+            stats["base64_bytes"] += len(image_base64)
+            stats["raw_bytes"] += len(raw)
+            if not dry_run:
+                batch.update(
+                    doc.reference,
+                    {
+                        "imageBytes": raw,
+                        "imageFormat": DRAWING_FORMAT,
+                        "imageBase64": firestore.DELETE_FIELD,
+                    },
+                )
+
+        if not dry_run:
+            batch.commit()
+
+        elapsed = time.time() - start_time
+        print(
+            f"   {stats['migrated']:,} drawings migrated "
+            f"({stats['migrated'] / max(elapsed, 1e-9):.0f} docs/s)"
+        )
+
+    stats["elapsed_seconds"] = round(time.time() - start_time, 2)
+    return stats
+
+
+if __name__ == "__main__":
+    # Configuration
+    SERVICE_ACCOUNT_PATH = "../../backend/serviceAccountKey.json"
+    DRY_RUN = True  # Set to False to write the migrated documents
+
+    if not firebase_admin._apps:
+        if os.path.exists(SERVICE_ACCOUNT_PATH):
+            cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
+        else:
+            cred = credentials.ApplicationDefault()
+        firebase_admin.initialize_app(cred)
+
+    print("=" * 60)
+    print(f"Migrating user_drawings to imageBytes{' (dry run)' if DRY_RUN else ''}")
+    print("=" * 60)
+
+    result = migrate_drawings(firestore.client(), dry_run=DRY_RUN)
+
+    print(f"\n✓ Migrated: {result['migrated']:,}  Failed: {result['failed']:,}")
+    if result["migrated"]:
+        print(
+            f"   imageBase64: {result['base64_bytes'] / result['migrated']:.0f} B/drawing"
+            f" → imageBytes: {result['raw_bytes'] / result['migrated']:.0f} B/drawing"
+        )
+    print(f"   Time: {result['elapsed_seconds']}s")
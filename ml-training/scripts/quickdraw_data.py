@@ -0,0 +1,356 @@
+"""
+Quick Draw dataset I/O shared by the preprocessing and training scripts
+Raw category files are memory-mapped and sampled by row; images stay uint8
+(0-255) on disk and in memory and are converted to float [0, 1] one batch at
+a time by the tf.data input pipelines (in-memory arrays, or streamed from
+the HDF5 file)
+
+📝 DEFENSE JUSTIFICATION:
+The source bitmaps are uint8. Storing and loading them as float32 multiplies
+file size and RAM by 4 (a 100-class, 70k/class dataset is ~22 GB in float32
+vs ~5.5 GB in uint8) for no information gain. Normalizing per batch costs a
+cast and a multiply on 128 images, which the input pipeline overlaps with
+training. The served models keep their [0, 1] input contract, so the backend
+preprocessing is unchanged.
+"""
+
+import os
+
+import h5py
+import numpy as np
+
+IMAGE_SHAPE = (28, 28, 1)
+SPLITS = ("train", "val", "test")
+
+# Rows converted at a time when reading a legacy float32 file
+CONVERT_BLOCK = 65536
+
+# Streaming: minimum rows per HDF5 read, and rows in the shuffle buffer
+STREAM_BLOCK_ROWS = 4096
+SHUFFLE_BUFFER = 16384  # ~13 MB of uint8 drawings
+
+
+# ==================== RAW CATEGORY FILES ====================
+# Quick Draw numpy bitmaps: one (N, 784) uint8 .npy file per category,
+# often hundreds of MB, of which only a sample is used
+
+
+def open_raw_category(path: str):
+    """
+    Memory-map a raw category file (nothing is read until rows are used)
+
+    Returns:
+        (N, 784) uint8 memmap, or None if the file is missing
+    """
+    if not os.path.exists(path):
+        print(f"❌ File not found: {path}")
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def gather_rows(raw: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Copy rows of a memory-mapped array, in the order given
+
+    Rows are read in increasing file order (sequential page faults, each
+    page read once) and put back in the requested order, so I/O is
+    proportional to the rows used, not to the file size.
+    """
+    order = np.argsort(rows, kind="stable")
+    out = np.empty((len(rows),) + raw.shape[1:], dtype=raw.dtype)
+    out[order] = raw[rows[order]]
+    return out
+
+
+def sample_raw_category(path: str, n_samples: int, rng: np.random.Generator):
+    """
+    Random sample of drawings from a raw category file
+
+    Returns:
+        uint8 (min(n_samples, N), 784), or None if the file is missing
+    """
+    raw = open_raw_category(path)
+    if raw is None:
+        return None
+    rows = rng.choice(len(raw), min(n_samples, len(raw)), replace=False)
+    return gather_rows(raw, rows)
+
+
+def to_uint8(images: np.ndarray) -> np.ndarray:
+    """
+    Images as uint8 (N, 28, 28, 1), whatever their stored form
+
+    Accepts uint8 0-255 or legacy float [0, 1], with or without the
+    channel dimension.
+    """
+    if images.dtype != np.uint8:
+        images = np.rint(np.asarray(images, dtype=np.float32) * 255.0).astype(np.uint8)
+    return images.reshape((-1,) + IMAGE_SHAPE)
+
+
+def read_images(dataset: h5py.Dataset) -> np.ndarray:
+    """
+    Read an images dataset into a uint8 array
+
+    Legacy float32 files are converted block by block, so the float copy is
+    never fully in memory.
+    """
+    if dataset.dtype == np.uint8:
+        return dataset[:].reshape((-1,) + IMAGE_SHAPE)
+
+    images = np.empty((len(dataset),) + IMAGE_SHAPE, dtype=np.uint8)
+    for start in range(0, len(dataset), CONVERT_BLOCK):
+        images[start : start + CONVERT_BLOCK] = to_uint8(
+            dataset[start : start + CONVERT_BLOCK]
+        )
+    return images
+
+
+def load_splits(path: str) -> tuple:
+    """
+    Load the train/val/test splits of a preprocessed HDF5 file
+
+    Returns:
+        Tuple of (X_train, y_train, X_val, y_val, X_test, y_test), images as
+        uint8 (N, 28, 28, 1)
+    """
+    arrays = []
+    with h5py.File(path, "r") as f:
+        for split in SPLITS:
+            arrays.append(read_images(f[f"{split}/images"]))
+            arrays.append(f[f"{split}/labels"][:])
+    return tuple(arrays)
+
+
+def make_dataset(
+    images: np.ndarray,
+    labels: np.ndarray,
+    batch_size: int = 128,
+    shuffle: bool = False,
+    seed: int = None,
+):
+    """
+    tf.data pipeline over in-memory uint8 images, normalized per batch
+
+    Batches are gathered from the arrays by index (no copy of the dataset
+    into a tensor) and cast to float32 [0, 1] in parallel map calls.
+
+    Args:
+        images: uint8 (N, 28, 28, 1)
+        labels: Integer labels (N,)
+        batch_size: Batch size
+        shuffle: Reshuffle the sample order every epoch
+        seed: Shuffle seed
+
+    Returns:
+        tf.data.Dataset of (float32 images, labels) batches
+    """
+    import tensorflow as tf
+
+    label_dtype = tf.as_dtype(labels.dtype)
+
+    def gather(batch_indices):
+        return images[batch_indices], labels[batch_indices]
+
+    def load_batch(batch_indices):
+        batch_images, batch_labels = tf.numpy_function(
+            gather, [batch_indices], [tf.uint8, label_dtype]
+        )
+        batch_images.set_shape((None,) + IMAGE_SHAPE)
+        batch_labels.set_shape((None,))
+        return normalize(batch_images), batch_labels
+
+    indices = tf.data.Dataset.range(len(images))
+    if shuffle:
+        indices = indices.shuffle(len(images), seed=seed, reshuffle_each_iteration=True)
+
+    return (
+        indices.batch(batch_size)
+        .map(load_batch, num_parallel_calls=tf.data.AUTOTUNE)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+
+def normalize(images):
+    """uint8 0-255 → float32 [0, 1] (the models' input range)"""
+    import tensorflow as tf
+
+    return tf.cast(images, tf.float32) * (1.0 / 255.0)
+
+
+# ==================== STREAMING FROM HDF5 ====================
+# Element datasets of (uint8 image, int32 label) rows, composed then batched
+# by batch_pipeline; nothing is loaded beyond the blocks being read, the
+# shuffle buffer and the prefetched batches
+
+_open_files = {}
+
+
+def _h5_file(path: str) -> h5py.File:
+    """One read-only handle per file, shared by the reader threads"""
+    f = _open_files.get(path)
+    if f is None:
+        f = _open_files[path] = h5py.File(path, "r")
+    return f
+
+
+def split_sizes(path: str) -> dict:
+    """Number of drawings per split, without reading any image"""
+    with h5py.File(path, "r") as f:
+        return {split: len(f[f"{split}/labels"]) for split in SPLITS}
+
+
+def hdf5_rows(
+    path: str,
+    split: str,
+    shuffle: bool = False,
+    seed: int = None,
+    cycle_length: int = 4,
+):
+    """
+    Stream a split of an HDF5 file as (image, label) rows
+
+    The split is read in blocks aligned on the HDF5 chunks. Blocks are read
+    by `cycle_length` parallel interleave calls; with shuffle, the block
+    order is reshuffled every epoch and rows of the open blocks are mixed,
+    otherwise rows come out in file order.
+
+    Args:
+        path: HDF5 file ({split}/images, {split}/labels)
+        split: "train", "val" or "test"
+        shuffle: Random block order (training)
+        seed: Block order seed
+        cycle_length: Blocks read concurrently
+
+    Returns:
+        tf.data.Dataset of (uint8 (28, 28, 1), int32) rows
+    """
+    import tensorflow as tf
+
+    with h5py.File(path, "r") as f:
+        images = f[f"{split}/images"]
+        count = len(images)
+        chunk_rows = images.chunks[0] if images.chunks else STREAM_BLOCK_ROWS
+    block_rows = chunk_rows * max(1, -(-STREAM_BLOCK_ROWS // chunk_rows))
+
+    def read_block(start):
+        f = _h5_file(path)
+        stop = min(int(start) + block_rows, count)
+        return (
+            to_uint8(f[f"{split}/images"][int(start) : stop]),
+            f[f"{split}/labels"][int(start) : stop].astype(np.int32),
+        )
+
+    def block_rows_dataset(start):
+        block_images, block_labels = tf.numpy_function(
+            read_block, [start], [tf.uint8, tf.int32]
+        )
+        block_images.set_shape((None,) + IMAGE_SHAPE)
+        block_labels.set_shape((None,))
+        return tf.data.Dataset.from_tensor_slices((block_images, block_labels))
+
+    starts = tf.data.Dataset.range(0, count, block_rows)
+    if shuffle:
+        starts = starts.shuffle(-(-count // block_rows), seed=seed)
+
+    return starts.interleave(
+        block_rows_dataset,
+        cycle_length=cycle_length,
+        # Whole blocks in order when not shuffling, row by row otherwise
+        block_length=1 if shuffle else block_rows,
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle,
+    )
+
+
+def array_rows(images: np.ndarray, labels: np.ndarray):
+    """Small in-memory arrays (e.g. user drawings) as (image, label) rows"""
+    import tensorflow as tf
+
+    return tf.data.Dataset.from_tensor_slices(
+        (to_uint8(images), labels.astype(np.int32))
+    )
+
+
+def mix_rows(datasets: list, counts: list, seed: int = None):
+    """Draw rows from several row datasets in proportion to their sizes"""
+    import tensorflow as tf
+
+    total = float(sum(counts))
+    return tf.data.Dataset.sample_from_datasets(
+        datasets, weights=[count / total for count in counts], seed=seed
+    )
+
+
+def augment_image(image, label):
+    """Random shift of up to 2 pixels, empty borders left black"""
+    import tensorflow as tf
+
+    padded = tf.pad(image, [[2, 2], [2, 2], [0, 0]])
+    return tf.image.random_crop(padded, IMAGE_SHAPE), label
+
+
+def batch_pipeline(
+    rows,
+    batch_size: int = 128,
+    shuffle_buffer: int = 0,
+    augment: bool = False,
+    seed: int = None,
+):
+    """
+    Shuffle (bounded buffer), augment, batch, normalize and prefetch rows
+
+    Args:
+        rows: Dataset of (uint8 image, label) rows
+        batch_size: Batch size
+        shuffle_buffer: Rows in the shuffle buffer (0 = keep order)
+        augment: Random shifts (training only)
+        seed: Shuffle seed
+
+    Returns:
+        tf.data.Dataset of (float32 [0, 1] images, labels) batches
+    """
+    import tensorflow as tf
+
+    if shuffle_buffer:
+        rows = rows.shuffle(shuffle_buffer, seed=seed)
+    if augment:
+        rows = rows.map(augment_image, num_parallel_calls=tf.data.AUTOTUNE)
+
+    return (
+        rows.batch(batch_size)
+        .map(
+            lambda images, labels: (normalize(images), labels),
+            num_parallel_calls=tf.data.AUTOTUNE,
+        )
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+
+def hdf5_dataset(
+    path: str,
+    split: str,
+    batch_size: int = 128,
+    shuffle: bool = False,
+    augment: bool = False,
+    seed: int = None,
+):
+    """
+    Batches of a split streamed from the HDF5 file
+
+    📝 DEFENSE JUSTIFICATION:
+    Slurping every split with [:] before model.fit delays the first step by
+    the whole read and needs the dataset to fit in RAM (not the case for
+    345 classes on a CPU box). Streaming chunk-aligned blocks through
+    parallel interleave, a bounded shuffle buffer (the file is already
+    shuffled by preprocessing) and prefetch starts training at once with
+    flat memory use.
+    """
+    rows = hdf5_rows(path, split, shuffle=shuffle, seed=seed)
+    return batch_pipeline(
+        rows,
+        batch_size,
+        shuffle_buffer=SHUFFLE_BUFFER if shuffle else 0,
+        augment=augment,
+        seed=seed,
+    )
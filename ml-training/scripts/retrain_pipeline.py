@@ -14,7 +14,6 @@ import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras.optimizers import Adam
-import h5py
 from datetime import datetime
 import json
 import base64
@@ -28,6 +27,48 @@ from firebase_admin import credentials, firestore, storage
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from quickdraw_data import (
+    SHUFFLE_BUFFER,
+    array_rows,
+    batch_pipeline,
+    hdf5_dataset,
+    hdf5_rows,
+    mix_rows,
+    split_sizes,
+    to_uint8,
+)
+
+
+def report_progress(phase: str, progress: float, **metrics):
+    """
+    Print a machine-readable progress line for the backend job manager
+
+    Format: PROGRESS {"phase": ..., "progress": 0-1, "metrics": {...}}
+    (read by backend/services/retrain_jobs.py; harmless when run by hand)
+    """
+    update = {"phase": phase, "progress": round(progress, 3), "metrics": metrics}
+    print("PROGRESS " + json.dumps(update, default=float), flush=True)
+
+
+class EpochProgress(keras.callbacks.Callback):
+    """Reports fine-tuning epochs as progress between two pipeline fractions"""
+
+    def __init__(self, epochs: int, start: float, end: float):
+        super().__init__()
+        self.epochs = epochs
+        self.start = start
+        self.end = end
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        report_progress(
+            "fine_tune",
+            self.start + (self.end - self.start) * (epoch + 1) / self.epochs,
+            epoch=epoch + 1,
+            epochs=self.epochs,
+            **{key: float(value) for key, value in logs.items()},
+        )
+
 
 class ActiveLearningPipeline:
     """
@@ -74,6 +115,9 @@ class ActiveLearningPipeline:
         # Track drawings used in this training
         self._drawings_used = []
 
+        # Training rows streamed per epoch (set when the dataset is opened)
+        self.train_size = 0
+
     def load_categories_from_metadata(self, model_version: str = "v4.0.0"):
         """Load categories from model metadata file."""
         try:
@@ -116,9 +160,11 @@ class ActiveLearningPipeline:
         print(f"\n🔍 Checking training threshold (min: {min_drawings} drawings)...")
         
         # Count new (unused) drawings
+        # Empty projection: only document keys are transferred
         query = (
             self.db.collection("user_drawings")
             .where("usedForTraining", "==", False)
+            .select([])
         )
         
         new_count = sum(1 for _ in query.stream())
@@ -171,9 +217,11 @@ class ActiveLearningPipeline:
         """
         print(f"\n📥 Fetching user drawings from Firestore (limit: {limit})...")
 
+        # Only fetch the fields used by process_user_drawings
         query = (
             self.db.collection("user_drawings")
             .where("usedForTraining", "==", False)
+            .select(["imageBytes", "imageBase64", "targetCategory"])
             .limit(limit)
         )
 
@@ -192,49 +240,55 @@ class ActiveLearningPipeline:
 
     def process_user_drawings(self, drawings: list) -> tuple:
         """
-        Process user drawings from Firestore (base64 format).
+        Process user drawings from Firestore.
+
+        Drawings in the compact format (imageBytes: 784 raw bytes) are
+        decoded together with one np.frombuffer call; older drawings stored
+        as imageBase64 PNGs are decoded one by one with PIL.
 
         Args:
             drawings: List of drawing documents from Firestore
 
         Returns:
-            Tuple of (images, labels) as numpy arrays
+            Tuple of (uint8 images, labels) as numpy arrays
         """
         print(f"\n🔄 Processing {len(drawings)} user drawings...")
 
         images = []
         labels = []
+        raw_images = []  # imageBytes drawings, decoded in bulk below
+        raw_labels = []
         category_counts = {}
 
         for i, drawing in enumerate(drawings):
             try:
-                # Get base64 image data
-                img_base64 = drawing.get("imageBase64", "")
-                if not img_base64:
-                    continue
-                
-                # Decode base64
-                img_bytes = base64.b64decode(img_base64)
-                img = Image.open(BytesIO(img_bytes)).convert("L")
-                
-                # Ensure 28x28
-                if img.size != (28, 28):
-                    img = img.resize((28, 28), Image.LANCZOS)
-                
-                # Convert to numpy array and normalize
-                img_array = np.array(img, dtype=np.float32) / 255.0
-                
                 # Get label
                 category = drawing.get("targetCategory", "").lower()
                 if category not in self.category_to_idx:
                     print(f"⚠️ Unknown category '{category}', skipping")
                     continue
-                
+
                 label_idx = self.category_to_idx[category]
-                
-                images.append(img_array)
-                labels.append(label_idx)
-                
+
+                img_bytes = drawing.get("imageBytes")
+                if img_bytes is not None and len(img_bytes) == 28 * 28:
+                    raw_images.append(bytes(img_bytes))
+                    raw_labels.append(label_idx)
+                else:
+                    # Legacy format: base64 PNG
+                    img_base64 = drawing.get("imageBase64", "")
+                    if not img_base64:
+                        continue
+
+                    img = Image.open(BytesIO(base64.b64decode(img_base64))).convert("L")
+
+                    # Ensure 28x28
+                    if img.size != (28, 28):
+                        img = img.resize((28, 28), Image.LANCZOS)
+
+                    images.append(np.array(img, dtype=np.uint8))
+                    labels.append(label_idx)
+
                 # Track category distribution
                 category_counts[category] = category_counts.get(category, 0) + 1
 
@@ -245,7 +299,12 @@ class ActiveLearningPipeline:
                 print(f"⚠️ Error processing drawing {drawing.get('id')}: {e}")
                 continue
 
-        print(f"✓ Processed {len(images)} valid drawings")
+        # One buffer, one reshape for every compact drawing
+        raw_array = np.frombuffer(b"".join(raw_images), dtype=np.uint8).reshape(-1, 28, 28)
+        legacy_array = np.array(images, dtype=np.uint8).reshape(-1, 28, 28)
+
+        print(f"✓ Processed {len(raw_images) + len(images)} valid drawings "
+              f"({len(raw_images)} compact, {len(images)} legacy PNG)")
         print(f"   Category distribution: {len(category_counts)} categories")
         
         # Show top categories
@@ -253,74 +312,73 @@ class ActiveLearningPipeline:
         for cat, count in sorted_cats:
             print(f"      {cat}: {count}")
 
-        # Convert to numpy arrays
-        X = np.array(images).reshape(-1, 28, 28, 1)
-        y = np.array(labels)
+        # Kept as uint8 like the dataset (normalized per batch during training)
+        X = to_uint8(np.concatenate([raw_array, legacy_array]))
+        y = np.array(raw_labels + labels)
 
         return X, y
 
     def load_original_dataset(self, dataset_path: str = "../data/quickdraw_50cat.h5"):
         """
-        Load original Quick Draw dataset
+        Open original Quick Draw dataset as streaming input pipelines
+
+        Images are never loaded as a whole: training rows are read from the
+        HDF5 file in shuffled chunk-aligned blocks, validation and test
+        batches in file order.
 
         Args:
             dataset_path: Path to HDF5 dataset
 
         Returns:
-            Tuple of (X_train, y_train, X_val, y_val, X_test, y_test)
+            Tuple of (train_rows, val_ds, test_ds): uint8 (image, label) rows
+            for fine-tuning, and batched val/test datasets
         """
-        print(f"\n📚 Loading original Quick Draw dataset from {dataset_path}...")
+        print(f"\n📚 Opening original Quick Draw dataset {dataset_path}...")
 
-        with h5py.File(dataset_path, "r") as f:
-            X_train = f["train/images"][:]
-            y_train = f["train/labels"][:]
-            X_val = f["val/images"][:]
-            y_val = f["val/labels"][:]
-            X_test = f["test/images"][:]
-            y_test = f["test/labels"][:]
+        sizes = split_sizes(dataset_path)
+        self.train_size = sizes["train"]
 
-        print(f"✓ Loaded dataset:")
-        print(f"   Train: {X_train.shape}")
-        print(f"   Val:   {X_val.shape}")
-        print(f"   Test:  {X_test.shape}")
+        train_rows = hdf5_rows(dataset_path, "train", shuffle=True)
+        val_ds = hdf5_dataset(dataset_path, "val")
+        test_ds = hdf5_dataset(dataset_path, "test")
 
-        return X_train, y_train, X_val, y_val, X_test, y_test
+        print(f"✓ Opened dataset (streamed from disk):")
+        print(f"   Train: {sizes['train']:,} samples")
+        print(f"   Val:   {sizes['val']:,} samples")
+        print(f"   Test:  {sizes['test']:,} samples")
 
-    def merge_datasets(self, X_original, y_original, X_user, y_user, user_weight: int = 3):
+        return train_rows, val_ds, test_ds
+
+    def merge_datasets(self, train_rows, X_user, y_user, user_weight: int = 3):
         """
         Merge original dataset with user drawings.
         User drawings are weighted more heavily to prioritize recent data.
 
         Args:
-            X_original: Original images
-            y_original: Original labels
+            train_rows: Original training rows (from load_original_dataset)
             X_user: User drawing images
             y_user: User drawing labels
-            user_weight: How many times to duplicate user drawings (default 3x)
+            user_weight: How many times to repeat user drawings (default 3x)
 
         Returns:
-            Tuple of (X_combined, y_combined)
+            Combined training rows
         """
         print(f"\n🔀 Merging datasets (user weight: {user_weight}x)...")
-        print(f"   Original:    {X_original.shape}")
+        print(f"   Original:    {self.train_size:,} samples")
         print(f"   User:        {X_user.shape}")
 
-        # Duplicate user drawings to increase their weight
-        X_user_weighted = np.tile(X_user, (user_weight, 1, 1, 1))
-        y_user_weighted = np.tile(y_user, user_weight)
+        # Repeat user drawings to increase their weight
+        user_count = len(X_user) * user_weight
+        user_rows = array_rows(X_user, y_user).repeat(user_weight).shuffle(user_count)
 
-        X_combined = np.concatenate([X_original, X_user_weighted], axis=0)
-        y_combined = np.concatenate([y_original, y_user_weighted], axis=0)
-        
-        # Shuffle the combined dataset
-        indices = np.random.permutation(len(X_combined))
-        X_combined = X_combined[indices]
-        y_combined = y_combined[indices]
+        # Interleave both sources in proportion to their sizes
+        combined = mix_rows([train_rows, user_rows], [self.train_size, user_count])
+        self.train_size += user_count
 
-        print(f"✓ Combined:     {X_combined.shape}")
-        print(f"   Added {len(X_user) * user_weight:,} weighted user samples")
+        print(f"✓ Combined:     {self.train_size:,} samples")
+        print(f"   Added {user_count:,} weighted user samples")
 
-        return X_combined, y_combined
+        return combined
 
     def load_current_model(self, model_path: str = "../../backend/models/quickdraw_v4.0.0.h5"):
         """
@@ -345,10 +403,8 @@ class ActiveLearningPipeline:
     def fine_tune_model(
         self,
         model,
-        X_train,
-        y_train,
-        X_val,
-        y_val,
+        train_rows,
+        val_ds,
         epochs: int = 5,
         batch_size: int = 128,
         learning_rate: float = 0.0001,
@@ -358,10 +414,8 @@ class ActiveLearningPipeline:
 
         Args:
             model: Keras model to fine-tune
-            X_train: Training images
-            y_train: Training labels
-            X_val: Validation images
-            y_val: Validation labels
+            train_rows: Training rows (shuffled and batched here)
+            val_ds: Validation batches
             epochs: Number of training epochs
             batch_size: Batch size
             learning_rate: Learning rate
@@ -386,36 +440,26 @@ class ActiveLearningPipeline:
         )
 
         # Train with sparse categorical (not one-hot)
+        # uint8 batches are normalized to [0, 1] in the input pipeline
         history = model.fit(
-            X_train,
-            y_train,
-            validation_data=(X_val, y_val),
-            epochs=epochs,
-            batch_size=batch_size,
-            verbose=1,
-        )
-
-        print(f"✓ Fine-tuning complete")
-
-        return model, history
-            validation_data=(X_val, y_val_cat),
+            batch_pipeline(train_rows, batch_size, shuffle_buffer=SHUFFLE_BUFFER),
+            validation_data=val_ds,
             epochs=epochs,
-            batch_size=batch_size,
-            verbose=1,
+            verbose=2,  # One line per epoch (no progress bar in job logs)
+            callbacks=[EpochProgress(epochs, start=0.45, end=0.85)],
         )
 
         print(f"✓ Fine-tuning complete")
 
         return model, history
 
-    def validate_model(self, model, X_test, y_test, current_accuracy: float):
+    def validate_model(self, model, test_ds, current_accuracy: float):
         """
         Validate model accuracy and compare with current production
 
         Args:
             model: Fine-tuned model
-            X_test: Test images
-            y_test: Test labels
+            test_ds: Test batches
             current_accuracy: Current production model accuracy
 
         Returns:
@@ -424,7 +468,7 @@ class ActiveLearningPipeline:
         print(f"\n📊 Validating model on test set...")
 
         # Evaluate with sparse labels
-        test_loss, test_acc = model.evaluate(X_test, y_test, verbose=0)
+        test_loss, test_acc = model.evaluate(test_ds, verbose=0)
 
         print(f"✓ Test Results:")
         print(f"   Loss:     {test_loss:.4f}")
@@ -589,6 +633,7 @@ class ActiveLearningPipeline:
             self.load_categories_from_metadata(current_version)
             
             # 1. Check threshold
+            report_progress("check_threshold", 0.0)
             threshold_check = self.check_training_threshold(min_drawings)
             
             if not threshold_check["ready_for_training"] and not force:
@@ -596,50 +641,61 @@ class ActiveLearningPipeline:
                 print(f"   Current: {threshold_check['new_drawings_count']}")
                 print(f"   Required: {min_drawings}")
                 print("   Use force=True to override.")
+                report_progress(
+                    "skipped", 1.0, new_drawings=threshold_check["new_drawings_count"]
+                )
                 return None
             
             # 2. Fetch user drawings
+            report_progress("fetch_drawings", 0.05)
             drawings = self.fetch_user_drawings(limit=5000)
             
             if len(drawings) < min_drawings and not force:
                 print(f"\n⏸️  Only {len(drawings)} drawings available, need {min_drawings}")
+                report_progress("skipped", 1.0, drawings=len(drawings))
                 return None
 
             # 3. Process user drawings
+            report_progress("process_drawings", 0.15, drawings=len(drawings))
             X_user, y_user = self.process_user_drawings(drawings)
 
             # 4. Load original dataset
-            X_train, y_train, X_val, y_val, X_test, y_test = (
-                self.load_original_dataset()
-            )
+            report_progress("load_dataset", 0.2, user_drawings=int(len(X_user)))
+            train_rows, val_ds, test_ds = self.load_original_dataset()
 
             # 5. Merge datasets (user drawings weighted 3x)
-            X_train_merged, y_train_merged = self.merge_datasets(
-                X_train, y_train, X_user, y_user, user_weight=3
-            )
+            train_rows = self.merge_datasets(train_rows, X_user, y_user, user_weight=3)
 
             # 6. Load current model
+            report_progress("load_model", 0.4, training_samples=int(self.train_size))
             model = self.load_current_model()
 
             # 7. Fine-tune
             model, history = self.fine_tune_model(
-                model, X_train_merged, y_train_merged, X_val, y_val, epochs=epochs
+                model, train_rows, val_ds, epochs=epochs
             )
 
             # 8. Validate
-            new_accuracy = self.validate_model(model, X_test, y_test, current_accuracy)
+            report_progress("validate", 0.85)
+            new_accuracy = self.validate_model(model, test_ds, current_accuracy)
 
             # 9. Increment version
             new_version = self.increment_version(current_version)
 
             # 10. Save model
+            report_progress(
+                "save_model",
+                0.9,
+                test_accuracy=float(new_accuracy),
+                version=new_version,
+            )
             model_path = self.save_model(model, new_version)
 
             # 11. Save metadata locally
             metadata = {
                 "test_accuracy": float(new_accuracy),
                 "test_loss": float(history.history["val_loss"][-1]),
-                "training_samples": int(len(X_train_merged)),
+                "training_samples": int(self.train_size),
                 "user_drawings_used": int(len(X_user)),
                 "epochs": epochs,
                 "previous_version": current_version,
@@ -657,6 +713,7 @@ class ActiveLearningPipeline:
             print(f"✓ Metadata saved: {metadata_path}")
 
             # 12. Upload to Firebase
+            report_progress("upload", 0.95)
             self.upload_to_storage(model_path, new_version, metadata)
             
             # 13. Mark drawings as used
@@ -678,6 +735,9 @@ class ActiveLearningPipeline:
             print(f"   Improvement: {(new_accuracy - current_accuracy) * 100:+.2f}%")
             print(f"   User Drawings Used: {len(X_user)}")
             print("=" * 60)
+            report_progress(
+                "completed", 1.0, version=new_version, test_accuracy=float(new_accuracy)
+            )
 
             return new_version, new_accuracy
 
@@ -691,13 +751,23 @@ class ActiveLearningPipeline:
 
 
 if __name__ == "__main__":
-    # Configuration
+    import argparse
+
+    # Configuration (defaults; the backend job manager passes overrides as flags)
+    parser = argparse.ArgumentParser(description="Active learning retraining")
+    parser.add_argument("--min-drawings", type=int, default=500)  # Minimum new drawings required
+    parser.add_argument("--current-version", default="v4.0.0")
+    parser.add_argument("--current-accuracy", type=float, default=0.90)  # 90%
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--force", action="store_true")  # Train even without enough drawings
+    args = parser.parse_args()
+
     SERVICE_ACCOUNT_PATH = "../../backend/serviceAccountKey.json"
-    MIN_DRAWINGS = 500  # Minimum new drawings required
-    CURRENT_VERSION = "v4.0.0"
-    CURRENT_ACCURACY = 0.90  # 90%
-    EPOCHS = 5
-    FORCE = False  # Set to True to force training even without enough drawings
+    MIN_DRAWINGS = args.min_drawings
+    CURRENT_VERSION = args.current_version
+    CURRENT_ACCURACY = args.current_accuracy
+    EPOCHS = args.epochs
+    FORCE = args.force
 
     # Run pipeline
     pipeline = ActiveLearningPipeline(service_account_path=SERVICE_ACCOUNT_PATH)
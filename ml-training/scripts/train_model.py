@@ -4,7 +4,6 @@ Train CNN Model for Quick Draw Classification
 
 import os
 import sys
-import h5py
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.metrics import confusion_matrix, classification_report
@@ -17,6 +16,8 @@ from tensorflow import keras
 from tensorflow.keras import layers
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
 
+from quickdraw_data import load_splits, make_dataset
+
 print("=" * 80)
 print("Quick Draw CNN Training")
 print("=" * 80)
@@ -56,14 +57,12 @@ CATEGORIES = [
 
 print(f"\n📂 Loading dataset from: {DATA_PATH}")
 
-# Load HDF5 dataset
-with h5py.File(DATA_PATH, "r") as f:
-    X_train = f["train/images"][:]
-    y_train = f["train/labels"][:]
-    X_val = f["val/images"][:]
-    y_val = f["val/labels"][:]
-    X_test = f["test/images"][:]
-    y_test = f["test/labels"][:]
+# Load HDF5 dataset (uint8 images, normalized per batch by the input pipeline)
+X_train, y_train, X_val, y_val, X_test, y_test = load_splits(DATA_PATH)
+
+train_ds = make_dataset(X_train, y_train, BATCH_SIZE, shuffle=True, seed=42)
+val_ds = make_dataset(X_val, y_val, BATCH_SIZE)
+test_ds = make_dataset(X_test, y_test, BATCH_SIZE)
 
 print(f"✓ Dataset loaded")
 print(f"  Train: {X_train.shape[0]:,} samples")
@@ -72,7 +71,10 @@ print(f"  Test:  {X_test.shape[0]:,} samples")
 
 # Verify data range
 print(f"\n📊 Data statistics:")
-print(f"  Train min: {X_train.min():.3f}, max: {X_train.max():.3f}")
+print(f"  Train min: {X_train.min()}, max: {X_train.max()} ({X_train.dtype})")
+print(
+    f"  Images in memory: {(X_train.nbytes + X_val.nbytes + X_test.nbytes) / 1024**2:.0f} MB"
+)
 print(f"  Labels range: {y_train.min()} - {y_train.max()}")
 
 # Build Simple CNN model
@@ -130,11 +132,9 @@ print(f"  Learning rate: {LEARNING_RATE}")
 print("=" * 80)
 
 history = model.fit(
-    X_train,
-    y_train,
-    batch_size=BATCH_SIZE,
+    train_ds,
     epochs=EPOCHS,
-    validation_data=(X_val, y_val),
+    validation_data=val_ds,
     callbacks=callbacks,
     verbose=1,
 )
@@ -145,13 +145,13 @@ print("=" * 80)
 
 # Evaluate on test set
 print("\n📊 Evaluating on test set...")
-test_loss, test_accuracy = model.evaluate(X_test, y_test, verbose=0)
+test_loss, test_accuracy = model.evaluate(test_ds, verbose=0)
 print(f"  Test Loss: {test_loss:.4f}")
 print(f"  Test Accuracy: {test_accuracy * 100:.2f}%")
 
 # Generate predictions for confusion matrix
 print("\n🔍 Generating predictions for confusion matrix...")
-y_pred_proba = model.predict(X_test, batch_size=BATCH_SIZE, verbose=0)
+y_pred_proba = model.predict(test_ds, verbose=0)
 y_pred = np.argmax(y_pred_proba, axis=1)
 
 # Classification report
@@ -30,6 +30,17 @@ from tensorflow import keras
 from tensorflow.keras import layers
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
 
+from quickdraw_data import (
+    SHUFFLE_BUFFER,
+    array_rows,
+    batch_pipeline,
+    hdf5_dataset,
+    hdf5_rows,
+    mix_rows,
+    split_sizes,
+    to_uint8,
+)
+
 # Firebase imports (optional - for loading user drawings)
 try:
     import firebase_admin
@@ -78,10 +89,12 @@ class QuickDrawTrainerV4:
         self.batch_size = 128
         self.epochs = 20
         self.learning_rate = 0.001
+        self.augment = False  # Random 2-pixel shifts of training drawings
 
         # Will be set after loading data
         self.categories = []
         self.num_classes = 0
+        self.train_size = 0
         self.model = None
 
         # Initialize Firebase if available
@@ -107,36 +120,44 @@ class QuickDrawTrainerV4:
 
     def load_dataset(self) -> tuple:
         """
-        Load the Quick Draw HDF5 dataset.
+        Open the Quick Draw HDF5 dataset as streaming input pipelines.
+
+        Nothing is read up front: training rows stream from the file in
+        chunk-aligned blocks (shuffled), validation and test batches in file
+        order, so memory stays flat whatever the number of categories.
 
         Returns:
-            Tuple of (X_train, y_train, X_val, y_val, X_test, y_test)
+            Tuple of (train_rows, val_ds, test_ds): uint8 (image, label) rows
+            for training (batched in train()), and batched val/test datasets
         """
-        print(f"\n📂 Loading dataset from: {self.data_path}")
+        print(f"\n📂 Opening dataset: {self.data_path}")
 
+        sizes = split_sizes(self.data_path)
         with h5py.File(self.data_path, "r") as f:
-            X_train = f["train/images"][:]
-            y_train = f["train/labels"][:]
-            X_val = f["val/images"][:]
-            y_val = f["val/labels"][:]
-            X_test = f["test/images"][:]
-            y_test = f["test/labels"][:]
-
             # Load categories if available in dataset
             if "categories" in f.attrs:
                 self.categories = list(f.attrs["categories"])
             elif "metadata" in f and "categories" in f["metadata"]:
                 self.categories = list(f["metadata/categories"][:])
 
-        self.num_classes = len(np.unique(y_train))
-
-        print(f"✓ Dataset loaded")
-        print(f"  Train: {X_train.shape[0]:,} samples")
-        print(f"  Val:   {X_val.shape[0]:,} samples")
-        print(f"  Test:  {X_test.shape[0]:,} samples")
+            if "num_classes" in f.attrs:
+                self.num_classes = int(f.attrs["num_classes"])
+            else:
+                # Labels only (4 bytes per drawing), no images
+                self.num_classes = len(np.unique(f["train/labels"][:]))
+
+        self.train_size = sizes["train"]
+        train_rows = hdf5_rows(self.data_path, "train", shuffle=True)
+        val_ds = hdf5_dataset(self.data_path, "val", self.batch_size)
+        test_ds = hdf5_dataset(self.data_path, "test", self.batch_size)
+
+        print(f"✓ Dataset opened (streamed from disk)")
+        print(f"  Train: {sizes['train']:,} samples")
+        print(f"  Val:   {sizes['val']:,} samples")
+        print(f"  Test:  {sizes['test']:,} samples")
         print(f"  Classes: {self.num_classes}")
 
-        return X_train, y_train, X_val, y_val, X_test, y_test
+        return train_rows, val_ds, test_ds
 
     def load_user_drawings(self, limit: int = 5000) -> tuple:
         """
@@ -146,7 +167,8 @@ class QuickDrawTrainerV4:
             limit: Maximum number of drawings to load
 
         Returns:
-            Tuple of (images, labels) as numpy arrays, or (None, None) if unavailable
+            Tuple of (uint8 images, labels) as numpy arrays, or (None, None) if
+            unavailable
         """
         if not self.db:
             print("⚠️  Firebase not available - skipping user drawings")
@@ -158,35 +180,22 @@ class QuickDrawTrainerV4:
             query = (
                 self.db.collection("user_drawings")
                 .where("usedForTraining", "==", False)
+                .select(["imageBytes", "imageBase64", "targetCategory"])
                 .limit(limit)
             )
 
             images = []
             labels = []
             drawing_ids = []
+            # Compact drawings (imageBytes, 784 raw bytes), decoded in bulk
+            raw_images = []
+            raw_labels = []
+            raw_ids = []
 
             for doc in query.stream():
                 data = doc.to_dict()
 
-                # Decode base64 image
                 try:
-                    img_base64 = data.get("imageBase64", "")
-                    if not img_base64:
-                        continue
-
-                    # Decode and convert to numpy array
-                    img_bytes = base64.b64decode(img_base64)
-                    img = Image.open(BytesIO(img_bytes)).convert("L")
-                    img_array = np.array(img, dtype=np.float32)
-
-                    # Ensure 28x28
-                    if img_array.shape != (28, 28):
-                        img = img.resize((28, 28), Image.LANCZOS)
-                        img_array = np.array(img, dtype=np.float32)
-
-                    # Normalize to [0, 1]
-                    img_array = img_array / 255.0
-
                     # Get label
                     category = data.get("targetCategory", "").lower()
                     if category in self.categories:
@@ -195,7 +204,25 @@ class QuickDrawTrainerV4:
                         # Skip unknown categories
                         continue
 
-                    images.append(img_array)
+                    img_bytes = data.get("imageBytes")
+                    if img_bytes is not None and len(img_bytes) == 28 * 28:
+                        raw_images.append(bytes(img_bytes))
+                        raw_labels.append(label_idx)
+                        raw_ids.append(doc.id)
+                        continue
+
+                    # Legacy format: base64 PNG
+                    img_base64 = data.get("imageBase64", "")
+                    if not img_base64:
+                        continue
+
+                    img = Image.open(BytesIO(base64.b64decode(img_base64))).convert("L")
+
+                    # Ensure 28x28
+                    if img.size != (28, 28):
+                        img = img.resize((28, 28), Image.LANCZOS)
+
+                    images.append(np.array(img, dtype=np.uint8))
                     labels.append(label_idx)
                     drawing_ids.append(doc.id)
 
@@ -203,15 +230,26 @@ class QuickDrawTrainerV4:
                     print(f"⚠️  Error processing drawing {doc.id}: {e}")
                     continue
 
-            if len(images) == 0:
+            if len(raw_images) + len(images) == 0:
                 print("⚠️  No valid user drawings found")
                 return None, None
 
-            # Convert to numpy arrays
-            X_user = np.array(images).reshape(-1, 28, 28, 1)
-            y_user = np.array(labels)
+            # One np.frombuffer call for all compact drawings
+            raw_array = np.frombuffer(b"".join(raw_images), dtype=np.uint8)
+            legacy_array = np.array(images, dtype=np.uint8)
+            X_user = np.concatenate(
+                [raw_array.reshape(-1, 28, 28), legacy_array.reshape(-1, 28, 28)]
+            )
+
+            # Kept as uint8 like the dataset (normalized per batch)
+            X_user = to_uint8(X_user)
+            y_user = np.array(raw_labels + labels)
+            drawing_ids = raw_ids + drawing_ids
 
-            print(f"✓ Loaded {len(images)} user drawings")
+            print(
+                f"✓ Loaded {len(y_user)} user drawings "
+                f"({len(raw_images)} compact, {len(images)} legacy PNG)"
+            )
 
             # Store drawing IDs for later marking as used
             self._user_drawing_ids = drawing_ids
@@ -224,47 +262,40 @@ class QuickDrawTrainerV4:
 
     def merge_datasets(
         self,
-        X_original: np.ndarray,
-        y_original: np.ndarray,
+        train_rows,
         X_user: np.ndarray,
         y_user: np.ndarray,
         user_weight: int = 3,
-    ) -> tuple:
+    ):
         """
-        Merge original dataset with user drawings.
-        User drawings are duplicated to increase their weight in training.
+        Merge the streamed original dataset with user drawings.
+        User drawings are repeated to increase their weight in training.
 
         Args:
-            X_original: Original training images
-            y_original: Original training labels
+            train_rows: Original training rows (from load_dataset)
             X_user: User drawing images
             y_user: User drawing labels
-            user_weight: How many times to duplicate user drawings
+            user_weight: How many times to repeat user drawings
 
         Returns:
-            Tuple of (X_merged, y_merged)
+            Merged training rows
         """
         print(f"\n🔀 Merging datasets (user weight: {user_weight}x)...")
-        print(f"   Original: {X_original.shape}")
+        print(f"   Original: {self.train_size:,} samples")
         print(f"   User:     {X_user.shape}")
 
-        # Duplicate user drawings to increase weight
-        X_user_weighted = np.tile(X_user, (user_weight, 1, 1, 1))
-        y_user_weighted = np.tile(y_user, user_weight)
+        # Repeat user drawings to increase weight
+        user_count = len(X_user) * user_weight
+        user_rows = array_rows(X_user, y_user).repeat(user_weight).shuffle(user_count)
 
-        # Merge
-        X_merged = np.concatenate([X_original, X_user_weighted], axis=0)
-        y_merged = np.concatenate([y_original, y_user_weighted], axis=0)
+        # Interleave both sources in proportion to their sizes
+        merged = mix_rows([train_rows, user_rows], [self.train_size, user_count])
+        self.train_size += user_count
 
-        # Shuffle
-        indices = np.random.permutation(len(X_merged))
-        X_merged = X_merged[indices]
-        y_merged = y_merged[indices]
+        print(f"✓ Merged:   {self.train_size:,} samples")
+        print(f"   Added {user_count:,} user samples")
 
-        print(f"✓ Merged:   {X_merged.shape}")
-        print(f"   Added {len(X_user) * user_weight:,} user samples")
-
-        return X_merged, y_merged
+        return merged
 
     def build_model(self) -> keras.Model:
         """
@@ -330,21 +361,13 @@ class QuickDrawTrainerV4:
         self.model = model
         return model
 
-    def train(
-        self,
-        X_train: np.ndarray,
-        y_train: np.ndarray,
-        X_val: np.ndarray,
-        y_val: np.ndarray,
-    ) -> keras.callbacks.History:
+    def train(self, train_rows, val_ds) -> keras.callbacks.History:
         """
         Train the model.
 
         Args:
-            X_train: Training images
-            y_train: Training labels
-            X_val: Validation images
-            y_val: Validation labels
+            train_rows: Training rows (shuffled, augmented and batched here)
+            val_ds: Validation batches
 
         Returns:
             Training history
@@ -370,11 +393,14 @@ class QuickDrawTrainerV4:
         ]
 
         history = self.model.fit(
-            X_train,
-            y_train,
-            batch_size=self.batch_size,
+            batch_pipeline(
+                train_rows,
+                self.batch_size,
+                shuffle_buffer=SHUFFLE_BUFFER,
+                augment=self.augment,
+            ),
             epochs=self.epochs,
-            validation_data=(X_val, y_val),
+            validation_data=val_ds,
             callbacks=callbacks,
             verbose=1,
         )
@@ -385,20 +411,19 @@ class QuickDrawTrainerV4:
 
         return history
 
-    def evaluate(self, X_test: np.ndarray, y_test: np.ndarray) -> dict:
+    def evaluate(self, test_ds) -> dict:
         """
         Evaluate the model on test set.
 
         Args:
-            X_test: Test images
-            y_test: Test labels
+            test_ds: Test batches
 
         Returns:
             Dictionary with evaluation metrics
         """
         print("\n📊 Evaluating on test set...")
 
-        test_loss, test_accuracy = self.model.evaluate(X_test, y_test, verbose=0)
+        test_loss, test_accuracy = self.model.evaluate(test_ds, verbose=0)
 
         print(f"  Test Loss: {test_loss:.4f}")
         print(f"  Test Accuracy: {test_accuracy * 100:.2f}%")
@@ -467,7 +492,7 @@ class QuickDrawTrainerV4:
             Dictionary with training results
         """
         # Load dataset
-        X_train, y_train, X_val, y_val, X_test, y_test = self.load_dataset()
+        train_rows, val_ds, test_ds = self.load_dataset()
 
         # Load user drawings if requested
         user_drawings_count = 0
@@ -476,18 +501,18 @@ class QuickDrawTrainerV4:
 
             if X_user is not None and len(X_user) > 0:
                 user_drawings_count = len(X_user)
-                X_train, y_train = self.merge_datasets(
-                    X_train, y_train, X_user, y_user, user_weight=3
+                train_rows = self.merge_datasets(
+                    train_rows, X_user, y_user, user_weight=3
                 )
 
         # Build model
         self.build_model()
 
         # Train
-        history = self.train(X_train, y_train, X_val, y_val)
+        history = self.train(train_rows, val_ds)
 
         # Evaluate
-        metrics = self.evaluate(X_test, y_test)
+        metrics = self.evaluate(test_ds)
 
         # Save metadata
         self.save_metadata(metrics, user_drawings_count)